@@ -13,10 +13,13 @@ from langchain_core.messages import HumanMessage
 授权商业应用请联系微信：huice666
 """
 
-from typing import Dict, Any
+import asyncio
+import time
+from typing import Dict, Any, Optional
 
-from app.core.state import SQLMessageState, UserContext
+from app.core.state import SQLMessageState, UserContext, SQLExecutionResult
 from app.agents.chat_to_db_agents.supervisor_agent import create_intelligent_sql_supervisor
+from app.services.test_to_sql.sql_fast_path import afind_fast_path_sql, record_fast_path_execution_failure
 
 
 def extract_connection_id_from_messages(messages) -> int:
@@ -49,9 +52,51 @@ class IntelligentSQLGraph:
         self.supervisor_agent = create_intelligent_sql_supervisor()
         self.graph = self.supervisor_agent.supervisor
 
+    async def _try_fast_path(self, query: str, connection_id: int) -> Optional[Dict[str, Any]]:
+        """已验证问答对几乎相同时直接执行其SQL，跳过所有LLM调用；未命中或执行失败返回None"""
+        from app.services.test_to_sql.db_service import get_db_connection_by_id, execute_query_with_connection
+
+        match = await afind_fast_path_sql(connection_id, query)
+        if match is None:
+            return None
+
+        try:
+            connection = get_db_connection_by_id(connection_id)
+            if not connection:
+                raise ValueError(f"找不到连接ID为 {connection_id} 的数据库连接")
+            start = time.perf_counter()
+            data = await asyncio.to_thread(execute_query_with_connection, connection, match.sql)
+            execution_result = SQLExecutionResult(
+                success=True,
+                data=data,
+                execution_time=time.perf_counter() - start,
+                rows_affected=len(data)
+            )
+        except Exception as e:
+            record_fast_path_execution_failure()
+            print(f"快速路径SQL执行失败，回退到supervisor: {e}")
+            return None
+
+        return {
+            "messages": [HumanMessage(query)],
+            "generated_sql": [match.sql],
+            "execution_result": [execution_result],
+            "current_stage": "completed",
+            "fast_path": match.to_dict()
+        }
+
     async def process_query(self, query: str, connection_id: int = 15) -> Dict[str, Any]:
         """处理SQL查询"""
         try:
+            # 快速路径命中时不进入supervisor
+            fast_path_result = await self._try_fast_path(query, connection_id)
+            if fast_path_result is not None:
+                return {
+                    "success": True,
+                    "result": fast_path_result,
+                    "final_stage": "completed"
+                }
+
             # 初始化状态
             initial_state = SQLMessageState(
                 messages=[HumanMessage(query)],
@@ -42,7 +42,8 @@ def analyze_user_query(query: str, runtime: ToolRuntime[SQLMessageState]) -> Com
     tool_call_id = runtime.tool_call_id
     print(f"Tool of Schema Agent({tool_call_id}): 分析用户的自然语言查询，提取关键实体和意图...")
     try:
-        query_analysis = analyze_query_with_llm(query)
+        connection_id = getattr(runtime.context, "connection_id", None)
+        query_analysis = analyze_query_with_llm(query, connection_id)
         tool_message = ToolMessage(name="analyze_user_query", content=json.dumps(query_analysis, ensure_ascii=False), tool_call_id=tool_call_id)
         return Command(update={"messages":[tool_message], "query_analysis": [query_analysis], "current_stage": "schema_analysis"})
     except Exception as e:
@@ -84,8 +85,17 @@ def retrieve_database_schema(query: str, runtime: ToolRuntime[UserContext, SQLMe
             value_mappings = get_value_mappings(db, schema_context)
             tables = schema_context.get("tables", {})
             relationships = schema_context.get("relationships", [])
-            schema_info = SchemaInfo(tables=tables, value_mappings=value_mappings, relationships=relationships)
-            tool_message = ToolMessage(name="retrieve_database_schema", content=schema_info.model_dump_json(),
+            schema_info = SchemaInfo(
+                tables=tables,
+                columns=schema_context.get("columns", []),
+                value_mappings=value_mappings,
+                relationships=relationships,
+                connection_id=schema_context.get("connection_id"),
+                schema_version=schema_context.get("schema_version")
+            )
+            # 列信息只用于渲染SQL生成提示，不写入消息历史
+            tool_message = ToolMessage(name="retrieve_database_schema",
+                                       content=schema_info.model_dump_json(exclude={"columns"}),
                                        tool_call_id=tool_call_id)
             return Command(update={"messages":[tool_message], "schema_info": schema_info, "current_stage": "schema_analysis"})
         finally:
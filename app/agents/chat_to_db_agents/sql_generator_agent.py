@@ -18,8 +18,11 @@ from typing import Dict, Any, List
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage, ToolMessage
 from langchain.agents import create_agent
-from app.core.state import SQLMessageState, UserContext
+from app.core.state import SQLMessageState, UserContext, SchemaInfo
 from app.core.llms import get_default_model
+from app.services.test_to_sql.schema_prompt import (
+    render_schema_prompt, format_value_mappings_for_prompt, estimate_tokens
+)
 
 
 @tool
@@ -45,20 +48,25 @@ def generate_sql_query(
     print(f"Tool of Sql Generator Agent({tool_call_id}): 根据用户查询和模式信息生成SQL语句")
     state = runtime.state
     schema_info = state.get("schema_info", {}) # 数据库模式信息
-    value_mappings = getattr(schema_info, "value_mappings", None)  # 值映射信息
+    if isinstance(schema_info, SchemaInfo):
+        schema_info = schema_info.model_dump()
+    schema_info = schema_info or {}
+    value_mappings = schema_info.get("value_mappings")  # 值映射信息
     try:
+        # 在token预算内渲染表结构
+        rendered = render_schema_prompt(schema_info)
+
         # 构建详细的上下文信息
         context = f"""
 数据库类型: {db_type}
 
 可用的表和字段信息:
-{schema_info}
+{rendered.text}
 """
         
         if value_mappings:
             context += f"""
-值映射信息:
-{value_mappings}
+{format_value_mappings_for_prompt(value_mappings)}
 """
 
         # 添加样本参考信息
@@ -94,6 +102,7 @@ SQL: {sample.get('sql', '')}
 7. 优先参考高成功率的样本
 """
         
+        print(f"Tool: SQL生成提示约{estimate_tokens(prompt)} tokens，表结构部分{rendered.token_count} tokens")
         llm = get_default_model()
         response = llm.invoke([HumanMessage(content=prompt)])
         
@@ -8,8 +8,10 @@
 """
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 from app.config.settings import get_settings
+from app.core.milvus_processor.load_manager import get_load_manager
 from app.api.v1.endpoints.notebook import documents
 
 settings = get_settings()
@@ -43,6 +45,25 @@ async def health_check():
         },
     }
 
+@api_router.get("/ready", tags=["health"], summary="就绪检查")
+async def readiness_check():
+    """
+    就绪检查端点，Milvus热点集合预热完成前返回503，供负载均衡/编排系统判断是否接入流量
+
+    Returns:
+        就绪状态信息
+    """
+    load_manager = get_load_manager()
+    ready = load_manager.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "code": 200 if ready else 503,
+            "message": "success" if ready else "warming up",
+            "data": {"ready": ready, "collections": load_manager.stats()},
+        },
+    )
+
 # ==================== 根路由 ====================
 # 添加API根路径处理器
 @api_router.get("/", tags=["root"], summary="根路由")
@@ -15,6 +15,8 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from app.api.dependencies import get_db
+from app.services.test_to_sql.sql_fast_path import get_fast_path_stats
+from app.services.test_to_sql.query_analysis_cache import get_query_analysis_cache_stats
 from app.services.test_to_sql.hybrid_retrieval_service import (
     HybridRetrievalEngine, QAPairWithContext, extract_tables_from_sql, extract_entities_from_question, clean_sql, generate_qa_id
 )
@@ -219,7 +221,9 @@ async def get_qa_pairs_stats(
                 "4": 0,
                 "5": 0
             },
-            "average_success_rate": 0.0
+            "average_success_rate": 0.0,
+            "fast_path": get_fast_path_stats(),
+            "query_analysis_cache": get_query_analysis_cache_stats()
         }
 
         return stats
@@ -339,12 +343,15 @@ async def batch_create_qa_pairs(
 @router.delete("/qa-pairs/{qa_id}", response_model=Dict[str, Any])
 async def delete_qa_pair(
     qa_id: str,
+    connection_id: Optional[int] = Query(None, description="数据库连接ID"),
     db: Session = Depends(get_db)
 ):
-    """删除问答对"""
+    """删除问答对（同时从Neo4j和Milvus删除，并使该连接的检索结果缓存失效）"""
     try:
-        # 这里可以添加删除逻辑
-        # 需要从Neo4j和Milvus中删除相应的数据
+        engine = await get_hybrid_engine(connection_id)
+        deleted = await engine.delete_qa_pair(qa_id, connection_id)
+        if not deleted:
+            raise HTTPException(status_code=404, detail=f"问答对 {qa_id} 不存在")
 
         logger.info(f"删除问答对: {qa_id}")
 
@@ -353,6 +360,8 @@ async def delete_qa_pair(
             "message": f"问答对 {qa_id} 删除成功"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"删除问答对失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
@@ -16,6 +16,8 @@ from app import crud, schemas
 from app.api.dependencies import get_db
 from app.schemas import SchemaTableWithRelationships, SchemaTable, SchemaTableUpdate, SchemaColumn, SchemaColumnUpdate
 from app.services.test_to_sql.schema_service import discover_schema, sync_schema_to_graph_db, save_discovered_schema
+from app.services.test_to_sql.schema_catalog import invalidate_schema_catalog
+from app.services.test_to_sql.schema_index import refresh_schema_index
 
 router = APIRouter()
 
@@ -325,6 +327,10 @@ def publish_schema(
                 # This relationship was not in the frontend data, so delete it
                 crud.schema_relationship.remove(db=db, id=rel.id)
 
+        # Invalidate cached schema catalog and rebuild the schema vector index
+        invalidate_schema_catalog(connection_id)
+        refresh_schema_index(connection_id)
+
         # Sync to Graph DB
         sync_schema_to_graph_db(connection_id)
 
@@ -490,6 +496,7 @@ def update_table(
 
     try:
         table = crud.schema_table.update(db=db, db_obj=table, obj_in=table_in)
+        invalidate_schema_catalog(table.connection_id)
         return table
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating table: {str(e)}")
@@ -511,6 +518,7 @@ def update_column(
 
     try:
         column = crud.schema_column.update(db=db, db_obj=column, obj_in=column_in)
+        invalidate_schema_catalog(column.table.connection_id)
         return column
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating column: {str(e)}")
@@ -15,6 +15,7 @@ from sqlalchemy.orm import Session
 from app import crud, schemas
 from app.api.dependencies import get_db
 from app.schemas import ValueMapping
+from app.services.test_to_sql.value_mapping_cache import invalidate_value_mappings
 
 router = APIRouter()
 
@@ -61,6 +62,7 @@ def create_value_mapping(
         raise HTTPException(status_code=400, detail="Mapping already exists for this term")
     
     mapping = crud.value_mapping.create(db=db, obj_in=mapping_in)
+    invalidate_value_mappings(column.table.connection_id)
     return mapping
 
 
@@ -105,6 +107,7 @@ def update_value_mapping(
             raise HTTPException(status_code=400, detail="Mapping already exists for this term")
     
     mapping = crud.value_mapping.update(db=db, db_obj=mapping, obj_in=mapping_in)
+    invalidate_value_mappings(mapping.column.table.connection_id)
     return mapping
 
 
@@ -120,5 +123,7 @@ def delete_value_mapping(
     mapping = crud.value_mapping.get(db=db, id=mapping_id)
     if not mapping:
         raise HTTPException(status_code=404, detail="Value mapping not found")
+    connection_id = mapping.column.table.connection_id
     mapping = crud.value_mapping.remove(db=db, id=mapping_id)
+    invalidate_value_mappings(connection_id)
     return mapping
@@ -373,6 +373,75 @@ class DynamicSettings(BaseSettings):
     def MILVUS_BATCH_SIZE(self) -> float:
         return self._get_nested("milvus", "batch_size", 32)
 
+    @property
+    def MILVUS_CLIENT_HEALTH_CHECK_INTERVAL(self) -> float:
+        return self._get_nested("milvus", "client_health_check_interval", 30)
+
+    @property
+    def MILVUS_CLIENT_MAX_RETRIES(self) -> int:
+        return self._get_nested("milvus", "client_max_retries", 3)
+
+    @property
+    def MILVUS_CLIENT_RETRY_BACKOFF(self) -> float:
+        return self._get_nested("milvus", "client_retry_backoff", 0.5)
+
+    @property
+    def MILVUS_QA_PARTITION_KEY(self) -> bool:
+        return self._get_nested("milvus", "qa_partition_key", True)
+
+    @property
+    def MILVUS_QA_NUM_PARTITIONS(self) -> int:
+        return self._get_nested("milvus", "qa_num_partitions", 64)
+
+    @property
+    def MILVUS_ASYNC_CLIENT(self) -> bool:
+        return self._get_nested("milvus", "async_client", True)
+
+    @property
+    def MILVUS_ASYNC_MAX_CONCURRENCY(self) -> int:
+        return self._get_nested("milvus", "async_max_concurrency", 32)
+
+    @property
+    def MILVUS_EXECUTOR_WORKERS(self) -> int:
+        return self._get_nested("milvus", "executor_workers", 8)
+
+    @property
+    def MILVUS_WARMUP_ENABLED(self) -> bool:
+        return self._get_nested("milvus", "warmup_enabled", True)
+
+    @property
+    def MILVUS_WARMUP_COLLECTIONS(self) -> List[str]:
+        return self._get_nested("milvus", "warmup_collections", []) or []
+
+    @property
+    def MILVUS_WARMUP_HOT_COUNT(self) -> int:
+        return self._get_nested("milvus", "warmup_hot_count", 8)
+
+    @property
+    def MILVUS_HOT_STATE_PATH(self) -> str:
+        return self._get_nested("milvus", "hot_state_path", "./data/milvus_hot_collections.json")
+
+    @property
+    def MILVUS_LOAD_MAX_COLLECTIONS(self) -> int:
+        return self._get_nested("milvus", "load_max_collections", 16)
+
+    @property
+    def MILVUS_LOAD_MEMORY_BUDGET_MB(self) -> int:
+        return self._get_nested("milvus", "load_memory_budget_mb", 4096)
+
+    @property
+    def MILVUS_LOAD_IDLE_TTL(self) -> float:
+        return self._get_nested("milvus", "load_idle_ttl", 1800)
+
+    @property
+    def MILVUS_LOAD_CHECK_INTERVAL(self) -> float:
+        return self._get_nested("milvus", "load_check_interval", 60)
+
+    @property
+    def MILVUS_INDEX_PROFILES(self) -> Dict[str, Dict[str, Any]]:
+        """按集合类型（qa_pairs / documents）配置的向量索引"""
+        return getattr(self, "milvus_index", None) or {}
+
     @property
     def REDIS_URL(self) -> str:
         env_url = os.getenv("REDIS_URL")
@@ -465,6 +534,42 @@ class DynamicSettings(BaseSettings):
         else:
             return self._get_nested("embedding", "dimension", 768)
 
+    @property
+    def EMBEDDING_BATCH_SIZE(self) -> int:
+        return self._get_nested("embedding", "batch_size", 32)
+
+    @property
+    def EMBEDDING_CONCURRENCY(self) -> int:
+        return self._get_nested("embedding", "concurrency", 4)
+
+    @property
+    def EMBEDDING_MAX_RETRIES(self) -> int:
+        return self._get_nested("embedding", "max_retries", 3)
+
+    @property
+    def EMBEDDING_DEVICE(self) -> str:
+        return self._get_nested("embedding", "device", "cpu")
+
+    @property
+    def EMBEDDING_PROVIDER(self) -> str:
+        return self._get_nested("embedding", "provider", "ollama")
+
+    @property
+    def EMBEDDING_LOCAL_MODEL(self) -> str:
+        return self._get_nested("embedding", "local_model", "BAAI/bge-small-zh-v1.5")
+
+    @property
+    def EMBEDDING_LOCAL_BACKEND(self) -> str:
+        return self._get_nested("embedding", "local_backend", "torch")
+
+    @property
+    def EMBEDDING_LOCAL_WORKERS(self) -> int:
+        return self._get_nested("embedding", "local_workers", 1)
+
+    @property
+    def EMBEDDING_HASHING_DIMENSION(self) -> int:
+        return self._get_nested("embedding", "hashing_dimension", 1024)
+
     @property
     def OPENAI_API_KEY(self) -> str:
         return os.getenv("OPENAI_API_KEY", self._get_nested("openai", "api_key", ""))
@@ -473,6 +578,18 @@ class DynamicSettings(BaseSettings):
     def OLLAMA_URI(self) -> str:
         return os.getenv("OLLAMA_URI", self._get_nested("ollama", "uri", ""))
 
+    @property
+    def OLLAMA_BASE_URL(self) -> str:
+        return self.OLLAMA_URI or self.EMBEDDING_BASE_URL
+
+    @property
+    def OLLAMA_EMBEDDING_MODEL(self) -> str:
+        return self._get_nested("ollama", "embedding_model", self.EMBEDDING_MODEL)
+
+    @property
+    def OLLAMA_TEMPERATURE(self) -> float:
+        return self._get_nested("ollama", "temperature", 0.0)
+
     @property
     def OPENAI_MODEL(self) -> str:
         return self._get_nested("openai", "model", "text-embedding-3-small")
@@ -485,6 +602,262 @@ class DynamicSettings(BaseSettings):
     def SEARCH_THRESHOLD(self) -> float:
         return self._get_nested("search", "threshold", 0.5)
 
+    @property
+    def SCHEMA_INDEX_ENABLED(self) -> bool:
+        return self._get_nested("text2sql", "schema_index_enabled", True)
+
+    @property
+    def SCHEMA_INDEX_TOP_K(self) -> int:
+        return self._get_nested("text2sql", "schema_index_top_k", 8)
+
+    @property
+    def SCHEMA_INDEX_KEYWORD_WEIGHT(self) -> float:
+        return self._get_nested("text2sql", "schema_index_keyword_weight", 0.3)
+
+    @property
+    def SCHEMA_LLM_SKIP_THRESHOLD(self) -> int:
+        return self._get_nested("text2sql", "schema_llm_skip_threshold", 3)
+
+    @property
+    def SCHEMA_PROMPT_TOKEN_BUDGET(self) -> int:
+        return self._get_nested("text2sql", "schema_prompt_token_budget", 6000)
+
+    @property
+    def QUERY_ANALYSIS_CACHE_SIZE(self) -> int:
+        return self._get_nested("text2sql", "query_analysis_cache_size", 2048)
+
+    @property
+    def QUERY_ANALYSIS_CACHE_TTL(self) -> int:
+        return self._get_nested("text2sql", "query_analysis_cache_ttl", 86400)
+
+    @property
+    def QUERY_ANALYSIS_SEMANTIC_ENABLED(self) -> bool:
+        return self._get_nested("text2sql", "query_analysis_semantic_enabled", False)
+
+    @property
+    def QUERY_ANALYSIS_SIMILARITY_THRESHOLD(self) -> float:
+        return self._get_nested("text2sql", "query_analysis_similarity_threshold", 0.95)
+
+    @property
+    def SQL_FAST_PATH_ENABLED(self) -> bool:
+        return self._get_nested("text2sql", "sql_fast_path_enabled", True)
+
+    @property
+    def SQL_FAST_PATH_SIMILARITY_THRESHOLD(self) -> float:
+        return self._get_nested("text2sql", "sql_fast_path_similarity_threshold", 0.97)
+
+    @property
+    def SQL_FAST_PATH_MIN_SUCCESS_RATE(self) -> float:
+        return self._get_nested("text2sql", "sql_fast_path_min_success_rate", 0.8)
+
+    @property
+    def SQL_FAST_PATH_CANDIDATES(self) -> int:
+        return self._get_nested("text2sql", "sql_fast_path_candidates", 3)
+
+    @property
+    def SQL_FAST_PATH_TIMEOUT_MS(self) -> float:
+        return self._get_nested("text2sql", "sql_fast_path_timeout_ms", 300)
+
+    @property
+    def SEMANTIC_WEIGHT(self) -> float:
+        return self._get_nested("hybrid_retrieval", "semantic_weight", 0.6)
+
+    @property
+    def STRUCTURAL_WEIGHT(self) -> float:
+        return self._get_nested("hybrid_retrieval", "structural_weight", 0.2)
+
+    @property
+    def PATTERN_WEIGHT(self) -> float:
+        return self._get_nested("hybrid_retrieval", "pattern_weight", 0.1)
+
+    @property
+    def QUALITY_WEIGHT(self) -> float:
+        return self._get_nested("hybrid_retrieval", "quality_weight", 0.1)
+
+    @property
+    def PARALLEL_RETRIEVAL(self) -> bool:
+        return self._get_nested("hybrid_retrieval", "parallel_retrieval", True)
+
+    @property
+    def SEMANTIC_TIMEOUT_MS(self) -> float:
+        return self._get_nested("hybrid_retrieval", "semantic_timeout_ms", 800)
+
+    @property
+    def STRUCTURAL_TIMEOUT_MS(self) -> float:
+        return self._get_nested("hybrid_retrieval", "structural_timeout_ms", 500)
+
+    @property
+    def PATTERN_TIMEOUT_MS(self) -> float:
+        return self._get_nested("hybrid_retrieval", "pattern_timeout_ms", 500)
+
+    @property
+    def RETRIEVAL_DEADLINE_MS(self) -> float:
+        return self._get_nested("hybrid_retrieval", "deadline_ms", 1000)
+
+    @property
+    def FUSION_MODE(self) -> str:
+        return self._get_nested("hybrid_retrieval", "fusion_mode", "weighted")
+
+    @property
+    def FUSION_RRF_K(self) -> int:
+        return self._get_nested("hybrid_retrieval", "rrf_k", 60)
+
+    @property
+    def RETRIEVAL_CACHE_ENABLED(self) -> bool:
+        return self._get_nested("hybrid_retrieval", "result_cache_enabled", True)
+
+    @property
+    def RETRIEVAL_CACHE_SIZE(self) -> int:
+        return self._get_nested("hybrid_retrieval", "result_cache_size", 4096)
+
+    @property
+    def RETRIEVAL_CACHE_TTL(self) -> float:
+        return self._get_nested("hybrid_retrieval", "result_cache_ttl", 3600)
+
+    @property
+    def MMR_ENABLED(self) -> bool:
+        return self._get_nested("hybrid_retrieval", "mmr_enabled", False)
+
+    @property
+    def MMR_LAMBDA(self) -> float:
+        return self._get_nested("hybrid_retrieval", "mmr_lambda", 0.7)
+
+    @property
+    def MMR_FETCH_FACTOR(self) -> int:
+        return self._get_nested("hybrid_retrieval", "mmr_fetch_factor", 3)
+
+    @property
+    def MMR_DUPLICATE_THRESHOLD(self) -> float:
+        return self._get_nested("hybrid_retrieval", "mmr_duplicate_threshold", 0.95)
+
+    @property
+    def QA_LOCAL_INDEX_ENABLED(self) -> bool:
+        return self._get_nested("qa_local_index", "enabled", True)
+
+    @property
+    def QA_LOCAL_INDEX_SMALL_TENANT_THRESHOLD(self) -> int:
+        return self._get_nested("qa_local_index", "small_tenant_threshold", 2000)
+
+    @property
+    def QA_LOCAL_INDEX_MAX_ROWS(self) -> int:
+        return self._get_nested("qa_local_index", "max_rows", 50000)
+
+    @property
+    def QA_LOCAL_INDEX_MAX_INDEXES(self) -> int:
+        return self._get_nested("qa_local_index", "max_indexes", 64)
+
+    @property
+    def QA_LOCAL_INDEX_MAX_BYTES(self) -> int:
+        return self._get_nested("qa_local_index", "max_bytes", 268435456)
+
+    @property
+    def QA_LOCAL_INDEX_HNSW_THRESHOLD(self) -> int:
+        return self._get_nested("qa_local_index", "hnsw_threshold", 5000)
+
+    @property
+    def QA_LOCAL_INDEX_HNSW_M(self) -> int:
+        return self._get_nested("qa_local_index", "hnsw_m", 16)
+
+    @property
+    def QA_LOCAL_INDEX_HNSW_EF_CONSTRUCTION(self) -> int:
+        return self._get_nested("qa_local_index", "hnsw_ef_construction", 200)
+
+    @property
+    def QA_LOCAL_INDEX_HNSW_EF(self) -> int:
+        return self._get_nested("qa_local_index", "hnsw_ef", 64)
+
+    @property
+    def QA_LOCAL_INDEX_MILVUS_TIMEOUT_MS(self) -> float:
+        return self._get_nested("qa_local_index", "milvus_timeout_ms", 500)
+
+    @property
+    def QA_LOCAL_INDEX_REFRESH_INTERVAL(self) -> float:
+        return self._get_nested("qa_local_index", "refresh_interval", 30)
+
+    @property
+    def QA_LOCAL_INDEX_SNAPSHOT_DIR(self) -> str:
+        return self._get_nested("qa_local_index", "snapshot_dir", "./data/qa_local_index")
+
+    @property
+    def VECTOR_SERVICE_TYPE(self) -> str:
+        return self._get_nested("vector", "service_type", "ollama")
+
+    @property
+    def VECTOR_CACHE_ENABLED(self) -> bool:
+        return self._get_nested("vector", "cache_enabled", True)
+
+    @property
+    def VECTOR_CACHE_TTL(self) -> int:
+        return self._get_nested("vector", "cache_ttl", 3600)
+
+    @property
+    def VECTOR_CACHE_MAX_SIZE(self) -> int:
+        return self._get_nested("vector", "cache_max_size", 10000)
+
+    @property
+    def VECTOR_CACHE_MAX_BYTES(self) -> int:
+        return self._get_nested("vector", "cache_max_bytes", 67108864)
+
+    @property
+    def VECTOR_BATCH_SIZE(self) -> int:
+        return self._get_nested("vector", "batch_size", 32)
+
+    @property
+    def VECTOR_MAX_RETRIES(self) -> int:
+        return self._get_nested("vector", "max_retries", 3)
+
+    @property
+    def VECTOR_RETRY_DELAY(self) -> float:
+        return self._get_nested("vector", "retry_delay", 1.0)
+
+    @property
+    def VECTOR_MICRO_BATCH_ENABLED(self) -> bool:
+        return self._get_nested("vector", "micro_batch_enabled", True)
+
+    @property
+    def VECTOR_MICRO_BATCH_MAX_SIZE(self) -> int:
+        return self._get_nested("vector", "micro_batch_max_size", 32)
+
+    @property
+    def VECTOR_MICRO_BATCH_MAX_WAIT_MS(self) -> float:
+        return self._get_nested("vector", "micro_batch_max_wait_ms", 5)
+
+    @property
+    def EMBEDDING_CACHE_ENABLED(self) -> bool:
+        return self._get_nested("embedding_cache", "enabled", True)
+
+    @property
+    def EMBEDDING_CACHE_BACKEND(self) -> str:
+        return self._get_nested("embedding_cache", "backend", "auto")
+
+    @property
+    def EMBEDDING_CACHE_REDIS_URL(self) -> str:
+        return os.getenv("EMBEDDING_CACHE_REDIS_URL", self.REDIS_URL)
+
+    @property
+    def EMBEDDING_CACHE_SQLITE_PATH(self) -> str:
+        return self._get_nested("embedding_cache", "sqlite_path", "./data/embedding_cache.db")
+
+    @property
+    def EMBEDDING_CACHE_MMAP_SIZE(self) -> int:
+        return self._get_nested("embedding_cache", "mmap_size", 268435456)
+
+    @property
+    def EMBEDDING_CACHE_TTL(self) -> int:
+        return self._get_nested("embedding_cache", "ttl", 2592000)
+
+    @property
+    def EMBEDDING_CACHE_MODEL_VERSION(self) -> str:
+        return str(self._get_nested("embedding_cache", "model_version", "1"))
+
+    @property
+    def EMBEDDING_CACHE_WRITE_BATCH_SIZE(self) -> int:
+        return self._get_nested("embedding_cache", "write_batch_size", 256)
+
+    @property
+    def EMBEDDING_CACHE_FLUSH_INTERVAL(self) -> float:
+        return self._get_nested("embedding_cache", "flush_interval", 0.5)
+
     @property
     def LOG_LEVEL(self) -> str:
         return self._get_nested("logging", "level", "INFO" if not self.DEBUG else "DEBUG")
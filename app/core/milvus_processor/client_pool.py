@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 14:20
+# @Author  : CongPeiQiang
+# @File    : client_pool.py
+# @Software: PyCharm
+"""
+Milvus客户端连接池
+进程内按 (uri, db_name) 共享MilvusClient，避免每个服务/请求重复握手和泄漏gRPC通道；
+超过健康检查间隔后取用时探活，失效则按指数退避重连，应用关闭时统一释放。
+异步代码通过call_milvus调用：在服务主事件循环上使用AsyncMilvusClient（应用关闭时统一关闭），
+其他事件循环（如同步代码临时创建的循环）及AsyncMilvusClient不可用时在有界线程池中执行同步客户端，
+避免按循环创建的异步客户端无人关闭；每个事件循环用信号量限制在途请求数，形成背压
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from pymilvus import MilvusClient
+
+try:
+    from pymilvus import AsyncMilvusClient
+except ImportError:  # pymilvus < 2.5.3
+    AsyncMilvusClient = None
+
+from app.config.settings import settings
+from app.utils.event_loop import on_main_loop
+from ...logger.logger import AppLogger
+
+logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
+
+DEFAULT_DB = "default"
+
+
+@dataclass
+class _PooledClient:
+    client: MilvusClient
+    created_at: float
+    checked_at: float
+    reconnects: int = 0
+
+
+class MilvusClientPool:
+    """按 (uri, db_name) 复用的MilvusClient注册表"""
+
+    def __init__(self, health_check_interval: float = 30, max_retries: int = 3, retry_backoff: float = 0.5,
+                 timeout: Optional[float] = None, use_async_client: bool = True,
+                 max_concurrency: int = 32, executor_workers: int = 8):
+        self.health_check_interval = health_check_interval
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.use_async_client = use_async_client and AsyncMilvusClient is not None
+        self.max_concurrency = max(1, max_concurrency)
+        self.executor_workers = max(1, executor_workers)
+        self._clients: Dict[Tuple[str, str], _PooledClient] = {}
+        self._lock = threading.Lock()
+        # 同一个键的建连/重连串行执行，不阻塞其他键
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # 异步客户端只在主事件循环上创建和使用
+        self._async_clients: Dict[Tuple[str, str], Any] = {}
+        # 信号量绑定事件循环，按循环分别保存
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _connect(self, uri: str, db_name: str) -> MilvusClient:
+        """建立连接，失败时按指数退避重试"""
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                kwargs: Dict[str, Any] = {"uri": uri, "db_name": db_name}
+                if self.timeout:
+                    kwargs["timeout"] = self.timeout
+                return MilvusClient(**kwargs)
+            except Exception as e:
+                last_error = e
+                if attempt < self.max_retries - 1:
+                    delay = self.retry_backoff * (2 ** attempt)
+                    logger.warning(f"连接Milvus失败({uri}, db={db_name})，{delay:.1f}s后重试: {e}")
+                    time.sleep(delay)
+        raise ConnectionError(f"连接Milvus失败({uri}, db={db_name}): {last_error}")
+
+    @staticmethod
+    def _is_healthy(client: MilvusClient) -> bool:
+        try:
+            client.get_server_version()
+            return True
+        except Exception as e:
+            logger.warning(f"Milvus客户端健康检查失败: {e}")
+            return False
+
+    @staticmethod
+    def _close_client(client: MilvusClient) -> None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def get_client(self, uri: str, db_name: Optional[str] = None) -> MilvusClient:
+        """
+        获取共享客户端
+
+        Args:
+            uri: Milvus地址
+            db_name: 数据库名称，默认库为default
+        """
+        key = (uri, db_name or DEFAULT_DB)
+        entry = self._clients.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self.health_check_interval:
+            return entry.client
+
+        with self._key_lock(key):
+            entry = self._clients.get(key)
+            now = time.monotonic()
+            if entry is not None:
+                if now - entry.checked_at < self.health_check_interval:
+                    return entry.client
+                if self._is_healthy(entry.client):
+                    entry.checked_at = now
+                    return entry.client
+                logger.info(f"重连Milvus: {uri}, db={key[1]}")
+                self._close_client(entry.client)
+
+            client = self._connect(uri, key[1])
+            reconnects = entry.reconnects + 1 if entry is not None else 0
+            self._clients[key] = _PooledClient(client=client, created_at=now, checked_at=now, reconnects=reconnects)
+            if entry is None:
+                logger.info(f"已创建共享Milvus客户端: {uri}, db={key[1]}")
+            return client
+
+    def get_async_client(self, uri: str, db_name: Optional[str] = None):
+        """获取主事件循环上的AsyncMilvusClient（只能在主事件循环上调用）"""
+        key = (uri, db_name or DEFAULT_DB)
+        client = self._async_clients.get(key)
+        if client is None:
+            kwargs: Dict[str, Any] = {"uri": uri, "db_name": key[1]}
+            if self.timeout:
+                kwargs["timeout"] = self.timeout
+            client = AsyncMilvusClient(**kwargs)
+            self._async_clients[key] = client
+            logger.info(f"已创建共享异步Milvus客户端: {uri}, db={key[1]}")
+        return client
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.executor_workers,
+                                                        thread_name_prefix="milvus-client")
+        return self._executor
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _call_sync(self, uri: str, db_name: Optional[str], method: str, kwargs: Dict[str, Any]) -> Any:
+        # 取客户端（可能探活/重连）也在线程池中执行，不阻塞事件循环
+        return getattr(self.get_client(uri, db_name), method)(**kwargs)
+
+    async def call(self, uri: str, db_name: Optional[str], method: str, **kwargs) -> Any:
+        """
+        在异步代码中调用Milvus客户端方法，如 await pool.call(uri, None, "search", collection_name=..., ...)
+        超过max_concurrency的请求在信号量上排队
+        """
+        async with self._semaphore():
+            if self.use_async_client and on_main_loop():
+                client = self.get_async_client(uri, db_name)
+                return await getattr(client, method)(**kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(self._call_sync, uri, db_name, method, kwargs)
+            )
+
+    async def aclose_async_clients(self) -> None:
+        """关闭主事件循环上的异步客户端（在主事件循环上调用）"""
+        if not on_main_loop():
+            return
+        clients, self._async_clients = self._async_clients, {}
+        for client in clients.values():
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+    def invalidate(self, uri: str, db_name: Optional[str] = None) -> None:
+        """调用方发现连接异常时标记为待检查，下次取用时探活"""
+        entry = self._clients.get((uri, db_name or DEFAULT_DB))
+        if entry is not None:
+            entry.checked_at = float("-inf")
+
+    def close_all(self) -> None:
+        """关闭所有客户端"""
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+            executor, self._executor = self._executor, None
+        for entry in entries:
+            self._close_client(entry.client)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        # 异步客户端需要在主事件循环上await关闭（aclose_async_clients），此处只丢弃引用
+        self._async_clients.clear()
+        if entries:
+            logger.info(f"已关闭 {len(entries)} 个Milvus客户端")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "async_client": self.use_async_client,
+            "max_concurrency": self.max_concurrency,
+            "clients": len(self._clients),
+            "async_clients": len(self._async_clients),
+            "connections": [
+                {
+                    "uri": uri,
+                    "db_name": db_name,
+                    "age_seconds": round(now - entry.created_at, 1),
+                    "reconnects": entry.reconnects
+                }
+                for (uri, db_name), entry in list(self._clients.items())
+            ]
+        }
+
+
+_pool: Optional[MilvusClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> MilvusClientPool:
+    """获取进程级客户端连接池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MilvusClientPool(
+                    health_check_interval=settings.MILVUS_CLIENT_HEALTH_CHECK_INTERVAL,
+                    max_retries=settings.MILVUS_CLIENT_MAX_RETRIES,
+                    retry_backoff=settings.MILVUS_CLIENT_RETRY_BACKOFF,
+                    timeout=settings.MILVUS_TIMEOUT,
+                    use_async_client=settings.MILVUS_ASYNC_CLIENT,
+                    max_concurrency=settings.MILVUS_ASYNC_MAX_CONCURRENCY,
+                    executor_workers=settings.MILVUS_EXECUTOR_WORKERS
+                )
+    return _pool
+
+
+def get_milvus_client(uri: Optional[str] = None, db_name: Optional[str] = None) -> MilvusClient:
+    """获取共享的MilvusClient，uri默认取milvus配置"""
+    return get_client_pool().get_client(uri or settings.MILVUS_URI, db_name)
+
+
+async def call_milvus(method: str, uri: Optional[str] = None, db_name: Optional[str] = None, **kwargs) -> Any:
+    """异步调用共享Milvus客户端的方法（不阻塞事件循环，带并发上限）"""
+    return await get_client_pool().call(uri or settings.MILVUS_URI, db_name, method, **kwargs)
+
+
+async def aclose_milvus_clients() -> None:
+    """关闭主事件循环上的异步客户端及所有同步客户端（应用关闭时在主事件循环上调用）"""
+    if _pool is not None:
+        await _pool.aclose_async_clients()
+    close_milvus_clients()
+
+
+def close_milvus_clients() -> None:
+    """关闭所有共享的MilvusClient（应用关闭时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close_all()
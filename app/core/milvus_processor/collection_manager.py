@@ -16,6 +16,7 @@ import time
 
 from . import MilvusConfig
 from .database_manager import DatabaseManager
+from .index_config import get_index_profile, add_vector_fields, add_vector_indexes
 from ...logger.logger import AppLogger
 
 logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
@@ -34,6 +35,7 @@ class CollectionManager:
         self.db_manager = db_manager
         self.config = config
         self.client = db_manager.client
+        self.index_profile = get_index_profile("documents")
 
     def create_default_schema(self, enable_dynamic_field: bool = None) -> Any:
         """
@@ -104,12 +106,8 @@ class CollectionManager:
             )
 
             # 4. 向量字段
-            schema.add_field(
-                field_name="content_dense",
-                datatype=DataType.FLOAT_VECTOR,
-                dim=self.config.embedding_dim,
-                description="内容密集向量"
-            )
+            add_vector_fields(schema, DataType, "content_dense", self.config.embedding_dim,
+                              self.index_profile, description="内容密集向量")
 
             schema.add_field(
                 field_name="content_sparse",
@@ -225,12 +223,8 @@ class CollectionManager:
                     params=sparse_index_params
                 )
 
-            # 3. 密集向量索引
-            index_params.add_index(
-                field_name="content_dense",
-                index_type="AUTOINDEX",
-                metric_type="COSINE"
-            )
+            # 3. 密集向量索引（按milvus_index.documents配置选择量化方式）
+            add_vector_indexes(index_params, "content_dense", self.index_profile)
 
             logger.info("默认索引参数创建成功")
             return index_params
@@ -17,7 +17,9 @@ import os
 @dataclass
 class MilvusConfig:
 
-    def __init__(self, milvus_uri:str, ollama_uri:str, timeout:float, default_db:str, default_collection:str, enable_dynamic_field:bool, chunk_size:int, chunk_overlap:int, batch_size:int, embedding_model:str, embedding_dim:int, default_search_limit:int, bm25_k1:float, bm25_b:float):
+    def __init__(self, milvus_uri:str, ollama_uri:str, timeout:float, default_db:str, default_collection:str, enable_dynamic_field:bool, chunk_size:int, chunk_overlap:int, batch_size:int, embedding_model:str, embedding_dim:int, default_search_limit:int, bm25_k1:float, bm25_b:float,
+                 embedding_batch_size:int = 32, embedding_concurrency:int = 4, embedding_max_retries:int = 3,
+                 embedding_provider:str = "ollama"):
         """Milvus配置类"""
         # 服务器配置
         self.milvus_uri: str = milvus_uri
@@ -39,6 +41,10 @@ class MilvusConfig:
         # 嵌入模型配置
         self.embedding_model: str = embedding_model
         self.embedding_dim: int = embedding_dim
+        self.embedding_batch_size: int = embedding_batch_size
+        self.embedding_concurrency: int = embedding_concurrency
+        self.embedding_max_retries: int = embedding_max_retries
+        self.embedding_provider: str = embedding_provider
 
         # 搜索配置
         self.default_search_limit: int = default_search_limit
@@ -56,6 +62,8 @@ class MilvusConfig:
             raise ValueError("chunk_overlap不能为负数")
         if self.batch_size <= 0:
             raise ValueError("batch_size必须大于0")
+        if self.embedding_batch_size <= 0 or self.embedding_concurrency <= 0:
+            raise ValueError("embedding_batch_size和embedding_concurrency必须大于0")
         return True
 
     def to_dict(self) -> Dict[str, Any]:
@@ -9,16 +9,21 @@ Milvus数据处理器
 """
 import os
 
-from langchain_ollama import OllamaEmbeddings
 from typing import List, Dict, Any, Optional, Tuple
 import logging
 import random
 import time
 import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from .config import MilvusConfig
 from .collection_manager import CollectionManager
 from ...logger.logger import AppLogger
+from ...utils.vector_utils import as_float32_vector
+from ..vectorization.embeddings import create_embedding_provider
+from ..vectorization.embedding_cache import embed_documents_cached
+from .index_config import with_binary_vectors
 
 logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
 
@@ -46,16 +51,18 @@ class DataProcessor:
         """初始化嵌入模型"""
         try:
             self.logger.info(f"初始化嵌入模型: {self.config.embedding_model}")
-            self.embeddings = OllamaEmbeddings(
-                model=self.config.embedding_model,
-                base_url=self.config.ollama_uri
+            self.embeddings = create_embedding_provider(
+                self.config.embedding_provider,
+                self.config.embedding_model,
+                base_url=self.config.ollama_uri,
+                dimension=self.config.embedding_dim
             )
             self.logger.info("嵌入模型初始化成功")
         except Exception as e:
             self.logger.error(f"初始化嵌入模型失败: {e}")
             raise
 
-    def generate_embedding(self, text: str, max_retries: int = 3) -> List[float]:
+    def generate_embedding(self, text: str, max_retries: int = 3) -> np.ndarray:
         """
         生成文本嵌入向量
 
@@ -64,16 +71,16 @@ class DataProcessor:
             max_retries: 最大重试次数
 
         Returns:
-            List[float]: 嵌入向量
+            np.ndarray: float32嵌入向量
         """
         if not text or not isinstance(text, str):
             self.logger.warning("输入文本为空，返回零向量")
-            return [0.0] * self.config.embedding_dim
+            return np.zeros(self.config.embedding_dim, dtype=np.float32)
 
         for attempt in range(max_retries):
             try:
                 embedding = self.embeddings.embed_query(text)
-                return embedding
+                return as_float32_vector(embedding)
 
             except Exception as e:
                 self.logger.warning(f"生成嵌入向量失败 (尝试 {attempt + 1}/{max_retries}): {e}")
@@ -82,8 +89,82 @@ class DataProcessor:
                     wait_time = (2 ** attempt) + random.uniform(0, 1)
                     time.sleep(wait_time)
                 else:
-                    self.logger.error("生成嵌入向量最终失败，返回随机向量")
-                    return [random.random() for _ in range(self.config.embedding_dim)]
+                    self.logger.error("生成嵌入向量最终失败")
+                    raise
+
+    def _embed_batch_with_retry(self, texts: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """
+        带指数退避重试的批量嵌入
+        整批最终失败时逐条再试一次，避免个别文本拖累同批其他文本；返回 (向量矩阵, 失败的批内下标)
+        """
+        max_retries = self.config.embedding_max_retries
+        for attempt in range(max_retries):
+            try:
+                # 重复导入的文档分块命中持久化向量缓存，不再请求嵌入服务
+                embeddings = embed_documents_cached(self.embeddings, texts)
+                if embeddings.shape != (len(texts), self.config.embedding_dim):
+                    raise ValueError(f"嵌入结果形状 {embeddings.shape} 与预期不符")
+                return embeddings, []
+            except Exception as e:
+                self.logger.warning(f"批量生成嵌入向量失败 (尝试 {attempt + 1}/{max_retries}, 批大小 {len(texts)}): {e}")
+                if attempt < max_retries - 1:
+                    time.sleep((2 ** attempt) + random.uniform(0, 1))
+
+        if len(texts) == 1:
+            return None, [0]
+        embeddings = np.zeros((len(texts), self.config.embedding_dim), dtype=np.float32)
+        failed = []
+        for idx, text in enumerate(texts):
+            try:
+                embeddings[idx] = as_float32_vector(self.embeddings.embed_query(text))
+            except Exception as e:
+                self.logger.warning(f"单条生成嵌入向量失败: {e}")
+                failed.append(idx)
+        return embeddings, failed
+
+    def generate_embeddings(self, texts: List[str], show_progress: bool = False) -> Tuple[np.ndarray, List[int]]:
+        """
+        批量生成文本嵌入向量
+        按embedding_batch_size分批，最多embedding_concurrency个批次并发请求嵌入服务
+
+        Args:
+            texts: 文本列表
+            show_progress: 是否显示进度条
+
+        Returns:
+            Tuple[np.ndarray, List[int]]: (形状为(len(texts), dim)的float32矩阵, 失败文本的下标)；
+            失败的行保持为零向量，调用方应据下标将其标记为待重试，不可写入索引
+        """
+        embeddings = np.zeros((len(texts), self.config.embedding_dim), dtype=np.float32)
+        failed: List[int] = []
+        if not texts:
+            return embeddings, failed
+
+        batch_size = self.config.embedding_batch_size
+        batches = [(start, texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+        workers = max(1, min(self.config.embedding_concurrency, len(batches)))
+        progress = tqdm(total=len(texts), desc="生成嵌入") if show_progress else None
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding") as executor:
+                futures = {executor.submit(self._embed_batch_with_retry, batch): (start, len(batch))
+                           for start, batch in batches}
+                for future in as_completed(futures):
+                    start, size = futures[future]
+                    result, batch_failed = future.result()
+                    if result is not None:
+                        embeddings[start:start + size] = result
+                    failed.extend(start + idx for idx in batch_failed)
+                    if progress is not None:
+                        progress.update(size)
+        finally:
+            if progress is not None:
+                progress.close()
+
+        failed.sort()
+        if failed:
+            self.logger.error(f"{len(failed)}/{len(texts)} 个文本嵌入失败，已标记待重试")
+        return embeddings, failed
 
     def chunk_text(self, text: str, chunk_size: int = None, overlap: int = None) -> List[str]:
         """
@@ -197,12 +278,13 @@ class DataProcessor:
 
         return len(errors) == 0, errors
 
-    def prepare_document_chunks(self, doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def prepare_document_chunks(self, doc: Dict[str, Any], embed: bool = True) -> List[Dict[str, Any]]:
         """
         准备文档分块数据
 
         Args:
             doc: 文档数据
+            embed: 是否同时生成嵌入；为False时不含content_dense，由调用方统一批量嵌入
 
         Returns:
             List[Dict[str, Any]]: 分块数据列表
@@ -224,16 +306,12 @@ class DataProcessor:
             chunks_data = []
 
             for idx, chunk in enumerate(content_chunks):
-                # 生成嵌入
-                embedding = self.generate_embedding(chunk)
-
                 # 构建块数据
                 chunk_data = {
                     "doc_id": str(doc['doc_id']),
                     "chunk_index": idx,
                     "title": str(doc['title']),
                     "content": chunk,
-                    "content_dense": embedding,
                     "url": str(doc.get('url', '')),
                     "author": str(doc.get('author', '')),
                     "source": str(doc.get('source', '')),
@@ -243,6 +321,14 @@ class DataProcessor:
 
                 chunks_data.append(chunk_data)
 
+            if embed:
+                # 生成嵌入，失败的块不返回
+                embeddings, failed = self.generate_embeddings([c["content"] for c in chunks_data])
+                failed_set = set(failed)
+                for idx, chunk_data in enumerate(chunks_data):
+                    chunk_data["content_dense"] = embeddings[idx]
+                chunks_data = [c for idx, c in enumerate(chunks_data) if idx not in failed_set]
+
             self.logger.debug(f"文档 '{doc['doc_id']}' 分割为 {len(chunks_data)} 个块")
             return chunks_data
 
@@ -292,7 +378,7 @@ class DataProcessor:
 
             for doc_idx, doc in enumerate(doc_iter):
                 try:
-                    chunks = self.prepare_document_chunks(doc)
+                    chunks = self.prepare_document_chunks(doc, embed=False)
 
                     if chunks:
                         all_chunks.extend(chunks)
@@ -323,38 +409,7 @@ class DataProcessor:
                     "failed_batches": []
                 }
 
-            # 批量插入
-            batch_size = self.config.batch_size
-            inserted_count = 0
-            failed_batches = []
-
-            batch_iter = range(0, len(all_chunks), batch_size)
-            batch_iter = tqdm(batch_iter, desc="插入数据") if show_progress else batch_iter
-
-            for i in batch_iter:
-                batch_data = all_chunks[i:i + batch_size]
-                batch_num = (i // batch_size) + 1
-
-                try:
-                    self.client.insert(
-                        collection_name=collection_name,
-                        data=batch_data
-                    )
-                    inserted_count += len(batch_data)
-
-                except Exception as e:
-                    self.logger.error(f"批次 {batch_num} 插入失败: {e}")
-                    failed_batches.append(batch_num)
-
-            # 构建结果
-            result = {
-                **stats,
-                "inserted_chunks": inserted_count,
-                "failed_batches": failed_batches,
-                "success": len(failed_batches) == 0,
-                "message": f"成功插入 {inserted_count}/{stats['total_chunks']} 个块"
-            }
-
+            result = {**stats, **self.insert_chunks(collection_name, all_chunks, show_progress)}
             self.logger.info(f"插入完成: {result['message']}")
             return result
 
@@ -368,6 +423,69 @@ class DataProcessor:
                 "failed_batches": []
             }
 
+    def insert_chunks(self,
+                      collection_name: str,
+                      chunks: List[Dict[str, Any]],
+                      show_progress: bool = True) -> Dict[str, Any]:
+        """
+        批量嵌入并插入分块
+        嵌入失败的块不会写入集合，而是原样放入返回结果的failed_chunks，可再次传入本方法重试
+
+        Args:
+            collection_name: 集合名称
+            chunks: 分块数据列表（不含或已含content_dense）
+            show_progress: 是否显示进度条
+
+        Returns:
+            Dict[str, Any]: 插入结果统计
+        """
+        pending = [c for c in chunks if c.get("content_dense") is None]
+        failed_chunks: List[Dict[str, Any]] = []
+        if pending:
+            embeddings, failed = self.generate_embeddings([c["content"] for c in pending], show_progress)
+            failed_set = set(failed)
+            for idx, chunk in enumerate(pending):
+                if idx in failed_set:
+                    failed_chunks.append(chunk)
+                else:
+                    chunk["content_dense"] = embeddings[idx]
+        ready = [c for c in chunks if c.get("content_dense") is not None]
+        if self.collection_manager.index_profile.is_binary:
+            with_binary_vectors(ready, "content_dense")
+
+        # 批量插入
+        batch_size = self.config.batch_size
+        inserted_count = 0
+        failed_batches = []
+
+        batch_iter = range(0, len(ready), batch_size)
+        batch_iter = tqdm(batch_iter, desc="插入数据") if show_progress else batch_iter
+
+        for i in batch_iter:
+            batch_data = ready[i:i + batch_size]
+            batch_num = (i // batch_size) + 1
+
+            try:
+                self.client.insert(
+                    collection_name=collection_name,
+                    data=batch_data
+                )
+                inserted_count += len(batch_data)
+
+            except Exception as e:
+                self.logger.error(f"批次 {batch_num} 插入失败: {e}")
+                failed_batches.append(batch_num)
+
+        return {
+            "total_chunks": len(chunks),
+            "inserted_chunks": inserted_count,
+            "failed_batches": failed_batches,
+            "failed_chunks": failed_chunks,
+            "success": not failed_batches and not failed_chunks,
+            "message": f"成功插入 {inserted_count}/{len(chunks)} 个块"
+                       + (f"，{len(failed_chunks)} 个块嵌入失败待重试" if failed_chunks else "")
+        }
+
     def insert_from_json_file(self,
                               collection_name: str,
                               file_path: str,
@@ -13,6 +13,7 @@ from pymilvus import MilvusClient
 from typing import Optional, List, Dict, Any
 
 from . import MilvusConfig
+from .client_pool import get_client_pool
 from ...logger.logger import AppLogger
 
 logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
@@ -31,20 +32,13 @@ class DatabaseManager:
         self.client = None
 
     def _get_root_client(self) -> MilvusClient:
-        """获取根客户端（不指定数据库）"""
-        return MilvusClient(
-            uri=self.config.milvus_uri,
-            timeout=self.config.timeout
-        )
+        """获取根客户端（不指定数据库），从进程级连接池复用"""
+        return get_client_pool().get_client(self.config.milvus_uri)
 
     def _get_db_client(self, db_name: Optional[str] = None) -> MilvusClient:
-        """获取数据库客户端"""
+        """获取数据库客户端，从进程级连接池复用"""
         db_to_use = db_name or self.config.default_db
-        return MilvusClient(
-            uri=self.config.milvus_uri,
-            db_name=db_to_use,
-            timeout=self.config.timeout
-        )
+        return get_client_pool().get_client(self.config.milvus_uri, db_to_use)
 
     def validate_db_name(self, db_name: str) -> bool:
         """验证数据库名称"""
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 10:12
+# @Author  : CongPeiQiang
+# @File    : index_config.py
+# @Software: PyCharm
+"""
+向量索引配置
+按集合（qa_pairs / documents）配置向量索引算法（ivf: nlist/nprobe，hnsw: M/efConstruction/ef）与量化方式：
+none / sq8(int8标量量化) / pq / binary(符号位二值向量, HAMMING) / auto(AUTOINDEX)；
+量化索引先多取候选，再用原始float向量精确重排
+"""
+
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config.settings import settings
+
+QUANTIZATION_AUTO = "auto"
+QUANTIZATION_NONE = "none"
+QUANTIZATION_SQ8 = "sq8"
+QUANTIZATION_PQ = "pq"
+QUANTIZATION_BINARY = "binary"
+
+ALGORITHM_IVF = "ivf"
+ALGORITHM_HNSW = "hnsw"
+
+_INDEX_TYPES = {
+    QUANTIZATION_AUTO: "AUTOINDEX",
+    QUANTIZATION_NONE: "IVF_FLAT",
+    QUANTIZATION_SQ8: "IVF_SQ8",
+    QUANTIZATION_PQ: "IVF_PQ",
+    # 二值模式下float字段只用于重排，使用SQ8索引并开启mmap，不常驻内存
+    QUANTIZATION_BINARY: "IVF_SQ8",
+}
+
+# HNSW_SQ / HNSW_PQ 需要 Milvus 2.6+
+_HNSW_INDEX_TYPES = {
+    QUANTIZATION_AUTO: "AUTOINDEX",
+    QUANTIZATION_NONE: "HNSW",
+    QUANTIZATION_SQ8: "HNSW_SQ",
+    QUANTIZATION_PQ: "HNSW_PQ",
+    QUANTIZATION_BINARY: "HNSW_SQ",
+}
+
+# 已有索引类型 -> (算法, 量化方式)，用于让配置与集合上实际建好的索引保持一致
+_EXISTING_INDEX_TYPES = {
+    "AUTOINDEX": (None, QUANTIZATION_AUTO),
+    "IVF_FLAT": (ALGORITHM_IVF, QUANTIZATION_NONE),
+    "IVF_SQ8": (ALGORITHM_IVF, QUANTIZATION_SQ8),
+    "IVF_PQ": (ALGORITHM_IVF, QUANTIZATION_PQ),
+    "HNSW": (ALGORITHM_HNSW, QUANTIZATION_NONE),
+    "HNSW_SQ": (ALGORITHM_HNSW, QUANTIZATION_SQ8),
+    "HNSW_PQ": (ALGORITHM_HNSW, QUANTIZATION_PQ),
+}
+
+
+@dataclass
+class VectorIndexProfile:
+    """单个集合的向量索引配置"""
+    quantization: str = QUANTIZATION_NONE
+    algorithm: str = ALGORITHM_IVF
+    metric_type: str = "COSINE"
+    nlist: int = 128
+    nprobe: int = 16
+    hnsw_m: int = 16
+    ef_construction: int = 200
+    ef: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+    rerank: bool = True
+    rerank_factor: int = 4
+
+    @property
+    def is_hnsw(self) -> bool:
+        return self.algorithm == ALGORITHM_HNSW and self.quantization != QUANTIZATION_AUTO
+
+    @property
+    def index_type(self) -> str:
+        return (_HNSW_INDEX_TYPES if self.algorithm == ALGORITHM_HNSW else _INDEX_TYPES)[self.quantization]
+
+    @property
+    def is_binary(self) -> bool:
+        return self.quantization == QUANTIZATION_BINARY
+
+    @property
+    def needs_rerank(self) -> bool:
+        """有损量化且开启重排时需要精确重排"""
+        return self.rerank and self.quantization in (QUANTIZATION_SQ8, QUANTIZATION_PQ, QUANTIZATION_BINARY)
+
+    def index_params(self) -> Dict[str, Any]:
+        if self.quantization == QUANTIZATION_AUTO:
+            return {}
+        if self.is_hnsw:
+            params: Dict[str, Any] = {"M": self.hnsw_m, "efConstruction": self.ef_construction}
+            if self.quantization in (QUANTIZATION_SQ8, QUANTIZATION_BINARY):
+                params["sq_type"] = "SQ8"
+        else:
+            params = {"nlist": self.nlist}
+        if self.quantization == QUANTIZATION_PQ:
+            params.update({"m": self.pq_m, "nbits": self.pq_nbits})
+        return params
+
+    def search_params(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """float字段的搜索参数，HNSW的ef不小于本次召回数量"""
+        if self.quantization == QUANTIZATION_AUTO:
+            return {"metric_type": self.metric_type}
+        if self.is_hnsw:
+            return {"metric_type": self.metric_type, "params": {"ef": max(self.ef, limit or 0)}}
+        return {"metric_type": self.metric_type, "params": {"nprobe": self.nprobe}}
+
+    def binary_search_params(self) -> Dict[str, Any]:
+        return {"metric_type": "HAMMING", "params": {"nprobe": self.nprobe}}
+
+    def anns_field(self, vector_field: str) -> str:
+        return binary_field_name(vector_field) if self.is_binary else vector_field
+
+    def ann_search_params(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """anns_field对应的搜索参数"""
+        return self.binary_search_params() if self.is_binary else self.search_params(limit)
+
+    def candidate_limit(self, top_k: int) -> int:
+        return top_k * max(1, self.rerank_factor) if self.needs_rerank else top_k
+
+    def without_binary(self) -> "VectorIndexProfile":
+        """集合缺少二值字段时退化为在float字段上检索"""
+        return replace(self, quantization=QUANTIZATION_SQ8) if self.is_binary else self
+
+    def for_existing_index(self, index_type: Optional[str]) -> "VectorIndexProfile":
+        """
+        按集合上已建好的float字段索引类型调整配置，避免修改配置后对旧索引传入不匹配的搜索参数
+        （改变索引类型需要重建索引，调参脚本只调整搜索参数）
+        """
+        algorithm, quantization = _EXISTING_INDEX_TYPES.get((index_type or "").upper(), (None, None))
+        if quantization is None:
+            return self
+        changes: Dict[str, Any] = {}
+        if algorithm and algorithm != self.algorithm:
+            changes["algorithm"] = algorithm
+        # 二值模式的float字段只用于重排，保留binary
+        if not self.is_binary and quantization != self.quantization:
+            changes["quantization"] = quantization
+        return replace(self, **changes) if changes else self
+
+
+def get_index_profile(name: str) -> VectorIndexProfile:
+    """读取milvus_index配置中指定集合类型的索引配置"""
+    raw = settings.MILVUS_INDEX_PROFILES.get(name) or {}
+    known = {f.name for f in fields(VectorIndexProfile)}
+    profile = VectorIndexProfile(**{k: v for k, v in raw.items() if k in known})
+    if profile.quantization not in _INDEX_TYPES:
+        raise ValueError(f"不支持的量化方式: {profile.quantization}")
+    if profile.algorithm not in (ALGORITHM_IVF, ALGORITHM_HNSW):
+        raise ValueError(f"不支持的索引算法: {profile.algorithm}")
+    return profile
+
+
+def binary_field_name(vector_field: str) -> str:
+    return f"{vector_field}_bin"
+
+
+def binarize(vectors: Any) -> List[bytes]:
+    """按符号位把float向量压缩为二值向量（每维1bit），维度需为8的倍数"""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return [row.tobytes() for row in np.packbits(matrix > 0, axis=1)]
+
+
+def add_vector_fields(schema: Any, data_type: Any, vector_field: str, dim: int,
+                      profile: VectorIndexProfile, **field_kwargs) -> None:
+    """
+    向schema添加向量字段；binary模式额外添加二值字段，float字段开启mmap
+
+    Args:
+        schema: 集合schema
+        data_type: pymilvus的DataType枚举
+    """
+    if profile.is_binary:
+        schema.add_field(field_name=vector_field, datatype=data_type.FLOAT_VECTOR, dim=dim,
+                         mmap_enabled=True, **field_kwargs)
+        schema.add_field(field_name=binary_field_name(vector_field), datatype=data_type.BINARY_VECTOR, dim=dim)
+    else:
+        schema.add_field(field_name=vector_field, datatype=data_type.FLOAT_VECTOR, dim=dim, **field_kwargs)
+
+
+def add_vector_indexes(index_params: Any, vector_field: str, profile: VectorIndexProfile) -> None:
+    """按配置添加向量索引"""
+    index_params.add_index(
+        field_name=vector_field,
+        index_type=profile.index_type,
+        metric_type=profile.metric_type,
+        params=profile.index_params()
+    )
+    if profile.is_binary:
+        index_params.add_index(
+            field_name=binary_field_name(vector_field),
+            index_type="BIN_IVF_FLAT",
+            metric_type="HAMMING",
+            params={"nlist": profile.nlist}
+        )
+
+
+def with_binary_vectors(rows: List[Dict[str, Any]], vector_field: str) -> List[Dict[str, Any]]:
+    """为待插入的行补充二值向量字段"""
+    if not rows:
+        return rows
+    codes = binarize(np.vstack([row[vector_field] for row in rows]))
+    field = binary_field_name(vector_field)
+    for row, code in zip(rows, codes):
+        row[field] = code
+    return rows
+
+
+def exact_scores(query_vector: np.ndarray, candidates: np.ndarray, metric_type: str) -> np.ndarray:
+    """按度量计算精确得分（L2为距离，越小越好）"""
+    query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+    if metric_type == "L2":
+        return np.linalg.norm(candidates - query, axis=1)
+    scores = candidates @ query
+    if metric_type == "COSINE":
+        norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query)
+        scores = np.divide(scores, norms, out=np.zeros_like(scores), where=norms > 0)
+    return scores
+
+
+def rerank_exact(query_vector: np.ndarray, hits: List[Dict[str, Any]], vector_field: str,
+                 top_k: int, metric_type: str = "COSINE") -> List[Dict[str, Any]]:
+    """
+    用候选的原始float向量精确重排
+    hits为MilvusClient.search的单个查询结果，实体中需包含vector_field；重排后distance替换为精确得分，
+    并从实体中移除向量字段
+    """
+    usable = [hit for hit in hits if hit.get("entity", {}).get(vector_field) is not None]
+    if not usable:
+        return list(hits)[:top_k]
+
+    candidates = np.asarray([hit["entity"].pop(vector_field) for hit in usable], dtype=np.float32)
+    scores = exact_scores(query_vector, candidates, metric_type)
+    order = np.argsort(scores) if metric_type == "L2" else np.argsort(-scores)
+    reranked = []
+    for idx in order[:top_k]:
+        hit = usable[int(idx)]
+        hit["distance"] = float(scores[idx])
+        reranked.append(hit)
+    return reranked
+
+
+def search_output_fields(output_fields: Optional[List[str]], vector_field: str,
+                         profile: VectorIndexProfile) -> Optional[List[str]]:
+    """需要重排时在输出字段中加入float向量字段"""
+    if not profile.needs_rerank:
+        return output_fields
+    return list(output_fields or []) + [vector_field]
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 15:05
+# @Author  : CongPeiQiang
+# @File    : index_tuner.py
+# @Software: PyCharm
+"""
+向量索引搜索参数调优
+从集合中抽样查询向量，流式扫描全量向量计算暴力检索的真实top-k，
+再对候选的搜索参数（HNSW的ef / IVF的nprobe / 量化重排倍数）逐一测量recall@k与p95延迟，
+选出满足目标召回率且p95延迟最低的参数
+"""
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .index_config import (
+    QUANTIZATION_AUTO, VectorIndexProfile, binarize, rerank_exact, search_output_fields
+)
+from ...logger.logger import AppLogger
+from ...utils.vector_utils import as_float32_matrix, normalize_rows
+
+logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
+
+_EF_CANDIDATES = (16, 32, 64, 96, 128, 192, 256, 384, 512)
+_NPROBE_CANDIDATES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+_RERANK_FACTORS = (1, 2, 4, 8)
+
+
+@dataclass
+class TuningResult:
+    """一组搜索参数的测量结果"""
+    profile: VectorIndexProfile
+    recall: float
+    p50_ms: float
+    p95_ms: float
+
+    @property
+    def search_settings(self) -> Dict[str, Any]:
+        """可直接写入milvus_index配置的搜索参数"""
+        key = "ef" if self.profile.is_hnsw and not self.profile.is_binary else "nprobe"
+        result: Dict[str, Any] = {key: getattr(self.profile, key)}
+        if self.profile.needs_rerank:
+            result["rerank_factor"] = self.profile.rerank_factor
+        return result
+
+    @property
+    def cost(self) -> int:
+        """搜索工作量的相对大小，延迟相近时优先选择更小的参数"""
+        return int(np.prod(list(self.search_settings.values())))
+
+
+def recall_at_k(found: Sequence[Sequence[Any]], truth: Sequence[Sequence[Any]]) -> float:
+    """平均recall@k"""
+    if not truth:
+        return 0.0
+    return float(np.mean([len(set(f) & set(t)) / len(t) if t else 1.0 for f, t in zip(found, truth)]))
+
+
+def exact_top_k(queries: np.ndarray, batches: Iterable[Tuple[List[Any], np.ndarray]], k: int,
+                metric_type: str = "COSINE") -> List[List[Any]]:
+    """
+    流式暴力检索：逐批计算得分并合并每个查询的top-k，内存只与批大小相关
+
+    Args:
+        queries: (q, dim) 查询向量
+        batches: 迭代 (主键列表, (b, dim)向量矩阵)
+    """
+    queries = as_float32_matrix(queries)
+    if metric_type == "COSINE":
+        queries = normalize_rows(queries)
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=object)
+
+    for ids, vectors in batches:
+        vectors = as_float32_matrix(vectors)
+        if not len(vectors):
+            continue
+        if metric_type == "COSINE":
+            vectors = normalize_rows(vectors)
+        if metric_type == "L2":
+            scores = -((queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ vectors.T
+                       + (vectors ** 2).sum(axis=1))
+        else:
+            scores = queries @ vectors.T
+        batch_ids = np.empty(len(ids), dtype=object)
+        batch_ids[:] = list(ids)
+        merged_scores = np.hstack([best_scores, scores.astype(np.float32)])
+        merged_ids = np.hstack([best_ids, np.broadcast_to(batch_ids, scores.shape)])
+        keep = min(k, merged_scores.shape[1])
+        idx = np.argpartition(-merged_scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(merged_scores, idx, axis=1)
+        best_ids = np.take_along_axis(merged_ids, idx, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_ids, order, axis=1).tolist()
+
+
+def candidate_profiles(profile: VectorIndexProfile, k: int) -> List[VectorIndexProfile]:
+    """按索引类型生成待测的搜索参数组合"""
+    if profile.is_hnsw and not profile.is_binary:
+        variants = [replace(profile, ef=ef) for ef in _EF_CANDIDATES if ef >= k]
+    elif profile.quantization == QUANTIZATION_AUTO:
+        variants = [profile]
+    else:
+        variants = [replace(profile, nprobe=n) for n in _NPROBE_CANDIDATES if n <= profile.nlist]
+    if profile.needs_rerank:
+        variants = [replace(v, rerank_factor=f) for v in variants for f in _RERANK_FACTORS]
+    return variants
+
+
+def choose_best(results: List[TuningResult], target_recall: float,
+                latency_tolerance: float = 0.1) -> Optional[TuningResult]:
+    """
+    满足目标召回率的结果中取p95最低者（p95在最低值的latency_tolerance以内视为相同，取工作量更小的参数）；
+    都不满足时取召回率最高者
+    """
+    if not results:
+        return None
+    qualified = [r for r in results if r.recall >= target_recall]
+    if not qualified:
+        return max(results, key=lambda r: (r.recall, -r.p95_ms))
+    fastest = min(r.p95_ms for r in qualified)
+    similar = [r for r in qualified if r.p95_ms <= fastest * (1 + latency_tolerance)]
+    return min(similar, key=lambda r: (r.cost, r.p95_ms))
+
+
+def recommended_nlist(row_count: int) -> int:
+    """IVF的nlist经验值：约4*sqrt(n)，限制在[16, 65536]"""
+    return int(min(65536, max(16, 4 * np.sqrt(max(row_count, 1)))))
+
+
+class IndexTuner:
+    """对单个集合的向量字段做搜索参数调优"""
+
+    def __init__(self, client, collection_name: str, vector_field: str, profile: VectorIndexProfile,
+                 id_field: str = "id", filter_expr: Optional[str] = None):
+        self.client = client
+        self.collection_name = collection_name
+        self.vector_field = vector_field
+        self.profile = profile
+        self.id_field = id_field
+        self.filter_expr = filter_expr or ""
+
+    def sample_queries(self, num_queries: int, seed: int = 7) -> np.ndarray:
+        """从集合中随机抽取已有向量作为查询"""
+        rows = self.client.query(
+            collection_name=self.collection_name,
+            filter=self.filter_expr,
+            output_fields=[self.vector_field],
+            limit=num_queries * 10
+        )
+        if not rows:
+            raise ValueError(f"集合 {self.collection_name} 中没有可用于抽样的数据")
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(len(rows), size=min(num_queries, len(rows)), replace=False)
+        return as_float32_matrix([rows[i][self.vector_field] for i in picked])
+
+    def _iter_vectors(self, batch_size: int) -> Iterable[Tuple[List[Any], np.ndarray]]:
+        iterator = self.client.query_iterator(
+            collection_name=self.collection_name,
+            filter=self.filter_expr,
+            output_fields=[self.id_field, self.vector_field],
+            batch_size=batch_size
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                yield [row[self.id_field] for row in rows], as_float32_matrix([row[self.vector_field] for row in rows])
+        finally:
+            iterator.close()
+
+    def ground_truth(self, queries: np.ndarray, k: int, batch_size: int = 2000) -> List[List[Any]]:
+        start = time.perf_counter()
+        truth = exact_top_k(queries, self._iter_vectors(batch_size), k, self.profile.metric_type)
+        logger.info(f"暴力检索真实top-{k}完成，耗时 {time.perf_counter() - start:.1f}s")
+        return truth
+
+    def _search_once(self, profile: VectorIndexProfile, query: np.ndarray, k: int) -> List[Any]:
+        limit = profile.candidate_limit(k)
+        results = self.client.search(
+            collection_name=self.collection_name,
+            data=binarize(query) if profile.is_binary else [query],
+            anns_field=profile.anns_field(self.vector_field),
+            limit=limit,
+            filter=self.filter_expr,
+            search_params=profile.ann_search_params(limit),
+            output_fields=search_output_fields([self.id_field], self.vector_field, profile)
+        )
+        hits = results[0]
+        if profile.needs_rerank:
+            hits = rerank_exact(query, hits, self.vector_field, k, profile.metric_type)
+        return [hit.get("id", hit.get("entity", {}).get(self.id_field)) for hit in hits[:k]]
+
+    def evaluate(self, profile: VectorIndexProfile, queries: np.ndarray, truth: List[List[Any]],
+                 k: int, warmup: int = 3) -> TuningResult:
+        """测量一组搜索参数的recall@k与延迟"""
+        for query in queries[:warmup]:
+            self._search_once(profile, query, k)
+        found, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found.append(self._search_once(profile, query, k))
+            latencies.append((time.perf_counter() - start) * 1000)
+        return TuningResult(
+            profile=profile,
+            recall=recall_at_k(found, truth),
+            p50_ms=float(np.percentile(latencies, 50)),
+            p95_ms=float(np.percentile(latencies, 95))
+        )
+
+    def tune(self, target_recall: float = 0.95, k: int = 10, num_queries: int = 100,
+             seed: int = 7) -> Tuple[Optional[TuningResult], List[TuningResult]]:
+        """
+        执行调优
+
+        Returns:
+            (最佳结果, 全部结果)
+        """
+        queries = self.sample_queries(num_queries, seed)
+        truth = self.ground_truth(queries, k)
+        results = []
+        for profile in candidate_profiles(self.profile, k):
+            result = self.evaluate(profile, queries, truth, k)
+            logger.info(f"{result.search_settings}: recall@{k}={result.recall:.3f}, "
+                        f"p50={result.p50_ms:.1f}ms, p95={result.p95_ms:.1f}ms")
+            results.append(result)
+        return choose_best(results, target_recall), results
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2026/10/19 16:40
+# @Author  : CongPeiQiang
+# @File    : load_manager.py
+# @Software: PyCharm
+"""
+Milvus集合加载管理器
+启动时预热热点集合（配置的集合 + 上次运行记录的高频集合），预热完成前就绪检查返回未就绪；
+运行中按LRU管理已加载集合：访问时按需加载，超过集合数或内存预算时释放最久未用的集合，
+空闲超时的集合由后台任务释放。
+加载状态是Milvus服务端全局的，其他进程可能释放本进程认为已加载的集合：通过call_loaded访问的请求
+遇到"集合未加载"错误时重新加载并重试一次；正在使用的集合不会被本进程的预算/空闲释放
+"""
+import asyncio
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from .client_pool import DEFAULT_DB, call_milvus
+from ...logger.logger import AppLogger
+
+logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
+
+CollectionKey = Tuple[str, str, str]
+
+# 标量字段及索引的粗略每行开销（字节）
+_ROW_OVERHEAD_BYTES = 64
+
+
+@dataclass
+class _LoadedCollection:
+    estimated_bytes: int
+    loaded_at: float
+    last_access: float
+    pinned: bool = False
+    # 正在进行的请求数，大于0时不释放
+    in_use: int = 0
+
+
+def estimate_collection_bytes(collection_info: Dict[str, Any], row_count: int) -> int:
+    """按向量字段维度和行数估算集合加载后的内存占用"""
+    per_row = _ROW_OVERHEAD_BYTES
+    for field in collection_info.get("fields", []):
+        type_name = getattr(field.get("type"), "name", str(field.get("type")))
+        dim = int((field.get("params") or {}).get("dim", 0) or 0)
+        if type_name == "BINARY_VECTOR":
+            per_row += dim // 8
+        elif type_name in ("FLOAT16_VECTOR", "BFLOAT16_VECTOR"):
+            per_row += dim * 2
+        elif type_name == "FLOAT_VECTOR":
+            per_row += dim * 4
+    return per_row * max(row_count, 0)
+
+
+def _is_loaded(load_state: Any) -> bool:
+    state = load_state.get("state") if isinstance(load_state, dict) else load_state
+    return getattr(state, "name", str(state)) == "Loaded"
+
+
+def is_not_loaded_error(error: Exception) -> bool:
+    """Milvus返回的"集合未加载"错误（错误码101，或消息中包含not loaded）"""
+    code = getattr(error, "code", None)
+    return code == 101 or "not loaded" in str(error).lower()
+
+
+class CollectionLoadManager:
+    """已加载集合的LRU与内存预算管理"""
+
+    def __init__(self, max_loaded: int = 16, memory_budget_bytes: int = 4 << 30, idle_ttl: float = 1800,
+                 state_path: Optional[str] = None, hot_count: int = 8):
+        self.max_loaded = max(1, max_loaded)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_ttl = idle_ttl
+        self.state_path = state_path
+        self.hot_count = hot_count
+        self._loaded: "OrderedDict[CollectionKey, _LoadedCollection]" = OrderedDict()
+        self._locks: Dict[CollectionKey, asyncio.Lock] = {}
+        self._access_counts: Counter = Counter()
+        self._ready = False
+        self.loads = 0
+        self.releases = 0
+        self.load_seconds = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def mark_ready(self) -> None:
+        self._ready = True
+
+    @staticmethod
+    def _key(collection_name: str, uri: Optional[str], db_name: Optional[str]) -> CollectionKey:
+        return uri or settings.MILVUS_URI, db_name or DEFAULT_DB, collection_name
+
+    @property
+    def loaded_bytes(self) -> int:
+        return sum(entry.estimated_bytes for entry in self._loaded.values())
+
+    async def ensure_loaded(self, collection_name: str, uri: Optional[str] = None, db_name: Optional[str] = None,
+                            pinned: bool = False) -> None:
+        """访问集合前调用：已加载时只更新LRU顺序，否则加载并按预算释放其他集合"""
+        key = self._key(collection_name, uri, db_name)
+        self._access_counts[key] += 1
+        entry = self._loaded.get(key)
+        if entry is not None:
+            entry.last_access = time.monotonic()
+            entry.pinned = entry.pinned or pinned
+            self._loaded.move_to_end(key)
+            return
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return
+            kwargs = {"uri": key[0], "db_name": key[1], "collection_name": collection_name}
+            start = time.perf_counter()
+            load_state = await call_milvus("get_load_state", **kwargs)
+            if not _is_loaded(load_state):
+                await call_milvus("load_collection", **kwargs)
+                self.loads += 1
+                self.load_seconds += time.perf_counter() - start
+                logger.info(f"已加载集合 {collection_name}(db={key[1]})，耗时 {time.perf_counter() - start:.2f}s")
+            estimated = await self._estimate(kwargs)
+            now = time.monotonic()
+            self._loaded[key] = _LoadedCollection(estimated_bytes=estimated, loaded_at=now, last_access=now,
+                                                  pinned=pinned)
+        await self._enforce_budget(keep=key)
+
+    def invalidate(self, collection_name: str, uri: Optional[str] = None, db_name: Optional[str] = None) -> None:
+        """集合已被其他进程释放时丢弃本地记录（不调用Milvus），下次访问重新加载"""
+        self._loaded.pop(self._key(collection_name, uri, db_name), None)
+
+    @asynccontextmanager
+    async def using(self, collection_name: str, uri: Optional[str] = None,
+                    db_name: Optional[str] = None) -> AsyncIterator[None]:
+        """确保集合已加载，并在上下文期间标记为使用中，防止被本进程释放"""
+        await self.ensure_loaded(collection_name, uri, db_name)
+        key = self._key(collection_name, uri, db_name)
+        entry = self._loaded.get(key)
+        if entry is not None:
+            entry.in_use += 1
+        try:
+            yield
+        finally:
+            if entry is not None:
+                entry.in_use -= 1
+
+    async def call_loaded(self, method: str, collection_name: str, uri: Optional[str] = None,
+                          db_name: Optional[str] = None, **kwargs) -> Any:
+        """
+        在已加载的集合上调用Milvus方法（如search/query）
+        集合被其他进程释放导致"未加载"错误时，丢弃本地记录、重新加载并重试一次
+        """
+        for attempt in range(2):
+            try:
+                async with self.using(collection_name, uri, db_name):
+                    return await call_milvus(method, uri=uri, db_name=db_name,
+                                             collection_name=collection_name, **kwargs)
+            except Exception as e:
+                if attempt or not is_not_loaded_error(e):
+                    raise
+                logger.warning(f"集合 {collection_name} 已被释放（可能来自其他进程），重新加载: {e}")
+                self.invalidate(collection_name, uri, db_name)
+
+    async def _estimate(self, kwargs: Dict[str, Any]) -> int:
+        try:
+            info = await call_milvus("describe_collection", **kwargs)
+            stats = await call_milvus("get_collection_stats", **kwargs)
+            return estimate_collection_bytes(info, int(stats.get("row_count", 0)))
+        except Exception as e:
+            logger.warning(f"估算集合 {kwargs['collection_name']} 内存失败: {e}")
+            return 0
+
+    async def _enforce_budget(self, keep: CollectionKey) -> None:
+        """超过集合数或内存预算时从最久未用的集合开始释放（固定的、使用中的和刚访问的集合除外）"""
+        while len(self._loaded) > self.max_loaded or self.loaded_bytes > self.memory_budget_bytes:
+            victim = next((k for k, e in self._loaded.items() if k != keep and not e.pinned and not e.in_use),
+                          None)
+            if victim is None:
+                break
+            uri, db_name, collection_name = victim
+            await self.release(collection_name, db_name, uri)
+
+    async def release(self, collection_name: str, db_name: Optional[str] = None, uri: Optional[str] = None) -> None:
+        """释放集合；有在途请求时跳过，留给之后的预算检查或空闲释放"""
+        key = self._key(collection_name, uri, db_name)
+        entry = self._loaded.get(key)
+        if entry is None or entry.in_use:
+            return
+        del self._loaded[key]
+        try:
+            await call_milvus("release_collection", uri=key[0], db_name=key[1], collection_name=collection_name)
+            self.releases += 1
+            logger.info(f"已释放集合 {collection_name}(db={key[1]})，空闲 {time.monotonic() - entry.last_access:.0f}s")
+        except Exception as e:
+            logger.warning(f"释放集合 {collection_name} 失败: {e}")
+
+    async def release_idle(self) -> int:
+        """释放空闲超过idle_ttl的集合"""
+        now = time.monotonic()
+        idle = [key for key, entry in self._loaded.items()
+                if not entry.pinned and not entry.in_use and now - entry.last_access > self.idle_ttl]
+        for uri, db_name, collection_name in idle:
+            await self.release(collection_name, db_name, uri)
+        return len(idle)
+
+    async def run_idle_releaser(self, interval: float) -> None:
+        """后台定期释放空闲集合，随应用关闭取消"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.release_idle()
+            except Exception as e:
+                logger.warning(f"释放空闲集合失败: {e}")
+
+    def _load_hot_keys(self) -> List[CollectionKey]:
+        if not self.state_path or not Path(self.state_path).exists():
+            return []
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return [tuple(item) for item in json.load(f).get("hot", [])]
+        except Exception as e:
+            logger.warning(f"读取热点集合记录失败: {e}")
+            return []
+
+    def save_state(self) -> None:
+        """记录访问最多的集合，下次启动时预热"""
+        if not self.state_path or not self._access_counts:
+            return
+        try:
+            Path(self.state_path).parent.mkdir(parents=True, exist_ok=True)
+            hot = [list(key) for key, _ in self._access_counts.most_common(self.hot_count)]
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump({"hot": hot, "saved_at": time.time()}, f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning(f"保存热点集合记录失败: {e}")
+
+    async def warmup(self, collections: List[str]) -> None:
+        """
+        预热集合并置为就绪
+        collections为配置的集合，格式为 "集合名" 或 "数据库/集合名"，固定常驻；另外预热上次记录的热点集合。
+        不带数据库前缀的集合名指连接池默认数据库（default，问答对集合所在的库），
+        文档集合位于milvus.database配置的库，需要写成 "数据库/集合名"
+        """
+        start = time.perf_counter()
+        targets: List[Tuple[CollectionKey, bool]] = []
+        for item in collections:
+            db_name, _, name = item.rpartition("/")
+            targets.append((self._key(name, None, db_name or DEFAULT_DB), True))
+        configured = {key for key, _ in targets}
+        targets += [(key, False) for key in self._load_hot_keys() if key not in configured]
+
+        for (uri, db_name, collection_name), pinned in targets:
+            try:
+                kwargs = {"uri": uri, "db_name": db_name, "collection_name": collection_name}
+                if not await call_milvus("has_collection", **kwargs):
+                    logger.warning(f"预热跳过不存在的集合 {collection_name}(db={db_name})")
+                    continue
+                await self.ensure_loaded(collection_name, uri, db_name, pinned=pinned)
+                # count(*)会访问全部分段，把数据和索引调入内存
+                await call_milvus("query", filter="", output_fields=["count(*)"], **kwargs)
+            except Exception as e:
+                logger.warning(f"预热集合 {collection_name}(db={db_name}) 失败: {e}")
+        self._ready = True
+        logger.info(f"集合预热完成: {len(self._loaded)} 个集合，耗时 {time.perf_counter() - start:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self._ready,
+            "loaded": [
+                {"db_name": db_name, "collection": name, "estimated_mb": round(entry.estimated_bytes / (1 << 20), 1),
+                 "idle_seconds": round(time.monotonic() - entry.last_access), "pinned": entry.pinned,
+                 "in_use": entry.in_use}
+                for (_, db_name, name), entry in self._loaded.items()
+            ],
+            "loaded_mb": round(self.loaded_bytes / (1 << 20), 1),
+            "memory_budget_mb": round(self.memory_budget_bytes / (1 << 20), 1),
+            "loads": self.loads,
+            "releases": self.releases,
+            "load_seconds": round(self.load_seconds, 2)
+        }
+
+
+_load_manager: Optional[CollectionLoadManager] = None
+
+
+def get_load_manager() -> CollectionLoadManager:
+    """获取全局集合加载管理器"""
+    global _load_manager
+    if _load_manager is None:
+        _load_manager = CollectionLoadManager(
+            max_loaded=settings.MILVUS_LOAD_MAX_COLLECTIONS,
+            memory_budget_bytes=int(settings.MILVUS_LOAD_MEMORY_BUDGET_MB) << 20,
+            idle_ttl=settings.MILVUS_LOAD_IDLE_TTL,
+            state_path=settings.MILVUS_HOT_STATE_PATH,
+            hot_count=settings.MILVUS_WARMUP_HOT_COUNT
+        )
+    return _load_manager
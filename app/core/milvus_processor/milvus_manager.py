@@ -12,6 +12,7 @@ import json
 import os
 from typing import Optional, List, Dict, Any, Union
 from pathlib import Path
+import numpy as np
 from app.logger.logger import AppLogger
 from app.config.settings import settings
 
@@ -213,6 +214,19 @@ class MilvusManager:
             show_progress=show_progress
         )
 
+    def insert_chunks(self,
+                      collection_name: str,
+                      chunks: List[Dict[str, Any]],
+                      show_progress: bool = True) -> Dict[str, Any]:
+        """插入分块，可用于重试insert_documents返回的failed_chunks"""
+        if not self.data_processor:
+            raise RuntimeError("管理器未初始化")
+        return self.data_processor.insert_chunks(
+            collection_name=collection_name,
+            chunks=chunks,
+            show_progress=show_progress
+        )
+
     def insert_from_json_file(self,
                               collection_name: str,
                               file_path: Union[str, Path],
@@ -232,8 +246,8 @@ class MilvusManager:
             raise RuntimeError("管理器未初始化")
         return self.data_processor.get_document_count(collection_name)
 
-    def generate_embedding(self, text: str, max_retries: int = 3) -> List[float]:
-        """生成文本嵌入向量"""
+    def generate_embedding(self, text: str, max_retries: int = 3) -> np.ndarray:
+        """生成文本嵌入向量（float32数组）"""
         if not self.data_processor:
             raise RuntimeError("管理器未初始化")
         return self.data_processor.generate_embedding(text, max_retries)
@@ -489,7 +503,11 @@ def create_manager() -> MilvusManager:
                           settings.MILVUS_COLLECTION_NAME, settings.MILVUS_ENABLE_DYNAMIC_FIELD,
                           settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, settings.MILVUS_BATCH_SIZE, settings.EMBEDDING_MODEL,
                           settings.EMBEDDING_DIMENSION, settings.MILVUS_LIMIT,
-                          settings.MILVUS_BM25_K1, settings.MILVUS_BM25_B)
+                          settings.MILVUS_BM25_K1, settings.MILVUS_BM25_B,
+                          embedding_batch_size=settings.EMBEDDING_BATCH_SIZE,
+                          embedding_concurrency=settings.EMBEDDING_CONCURRENCY,
+                          embedding_max_retries=settings.EMBEDDING_MAX_RETRIES,
+                          embedding_provider=settings.EMBEDDING_PROVIDER)
 
     manager = MilvusManager(config)
     if not manager.initialize():
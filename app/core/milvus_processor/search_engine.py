@@ -15,6 +15,7 @@ import logging
 from .config import MilvusConfig
 from .data_processor import DataProcessor
 from .collection_manager import CollectionManager
+from .index_config import binarize, rerank_exact, search_output_fields
 from ...logger.logger import AppLogger
 
 logger = AppLogger(name=os.path.basename(__file__), log_dir="logs", log_name="log.log").get_logger()
@@ -34,6 +35,7 @@ class SearchEngine:
         self.config = config
         self.client = data_processor.client
         self.embeddings = data_processor.embeddings
+        self.index_profile = data_processor.collection_manager.index_profile
 
     def semantic_search(self,
                         collection_name: str,
@@ -65,16 +67,19 @@ class SearchEngine:
             if output_fields is None:
                 output_fields = ["id", "title", "content", "author", "source", "url", "doc_id", "chunk_index"]
 
-            # 执行搜索
+            # 执行搜索，量化索引先多取候选再用原始向量精确重排
+            profile = self.index_profile
             results = self.client.search(
                 collection_name=collection_name,
-                anns_field="content_dense",
-                data=[query_vector],
-                limit=limit,
+                anns_field=profile.anns_field("content_dense"),
+                data=binarize(query_vector) if profile.is_binary else [query_vector],
+                limit=profile.candidate_limit(limit),
                 filter=filter_condition,
-                search_params={"metric_type": "COSINE"},
-                output_fields=output_fields
+                search_params=profile.ann_search_params(profile.candidate_limit(limit)),
+                output_fields=search_output_fields(output_fields, "content_dense", profile)
             )
+            if profile.needs_rerank and results:
+                results = [rerank_exact(query_vector, results[0], "content_dense", limit, profile.metric_type)]
 
             # 格式化结果
             return self._format_search_results(results, output_fields)
@@ -165,10 +170,11 @@ class SearchEngine:
             semantic_vector = self.data_processor.generate_embedding(query)
 
             # 创建搜索请求
+            profile = self.index_profile
             semantic_request = AnnSearchRequest(
-                data=[semantic_vector],
-                anns_field="content_dense",
-                param={"metric_type": "COSINE"},
+                data=binarize(semantic_vector) if profile.is_binary else [semantic_vector],
+                anns_field=profile.anns_field("content_dense"),
+                param=profile.ann_search_params(limit * 2),
                 limit=limit * 2
             )
 
@@ -21,8 +21,11 @@ from pydantic import BaseModel
 class SchemaInfo(BaseModel):
     """数据库模式信息"""
     tables: List[Dict[str, Any]] = Field(default_factory=list)
+    columns: List[Dict[str, Any]] = Field(default_factory=list)
     relationships: List[Dict[str, Any]] = Field(default_factory=list)
     value_mappings: Dict[str, Dict[str, str]] = Field(default_factory=dict)
+    connection_id: Optional[int] = None
+    schema_version: Optional[str] = None
 
 class SQLValidationResult(BaseModel):
     """SQL验证结果"""
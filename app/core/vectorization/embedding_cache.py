@@ -0,0 +1,309 @@
+"""
+跨进程共享的持久化向量缓存（二级缓存）
+优先使用Redis存储float32二进制向量，Redis不可用时退化为本地SQLite文件（开启mmap读取）；
+读取按批进行，写入经后台线程异步批量落盘，键按模型和模型版本划分命名空间；
+问题向量（VectorService）、文档分块向量（DataProcessor）和表结构描述向量（schema_index）共用
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import atexit
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config.settings import settings
+from app.utils.vector_utils import as_float32_matrix
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数上限以内分批查询
+_SQLITE_BATCH = 500
+
+
+class RedisEmbeddingStore:
+    """Redis存储后端"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self._client.ping()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return self._client.mget(keys)
+
+    def mset(self, items: Dict[str, bytes], ttl: Optional[int]) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for key, value in items.items():
+            if ttl:
+                pipe.setex(key, ttl, value)
+            else:
+                pipe.set(key, value)
+        pipe.execute()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class SqliteEmbeddingStore:
+    """本地SQLite存储后端，WAL模式支持多进程并发读写"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, mmap_size: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), _SQLITE_BATCH):
+                batch = list(keys[i:i + _SQLITE_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM embeddings WHERE key IN ({placeholders}) "
+                    f"AND (expires_at IS NULL OR expires_at > ?)",
+                    (*batch, now)
+                ).fetchall()
+                found.update(rows)
+        return [found.get(key) for key in keys]
+
+    def mset(self, items: Dict[str, bytes], ttl: Optional[int]) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, value, expires_at) for key, value in items.items()]
+            )
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PersistentEmbeddingCache:
+    """
+    二级向量缓存
+    get_many按批读取；put_many只入队，由后台线程合并成批写入存储后端
+    """
+
+    def __init__(self, store, namespace: str, ttl: Optional[int] = None,
+                 write_batch_size: int = 256, flush_interval: float = 0.5, queue_size: int = 10000):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl or None
+        self.write_batch_size = write_batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.dropped = 0
+        self.errors = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _full_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """批量读取，返回命中的 key -> float32向量"""
+        if not keys:
+            return {}
+        try:
+            values = self.store.mget([self._full_key(k) for k in keys])
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            logger.warning(f"读取持久化向量缓存失败: {e}")
+            return {}
+
+        result = {key: np.frombuffer(value, dtype=np.float32)
+                  for key, value in zip(keys, values) if value}
+        with self._stats_lock:
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+        return result
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        """写入后台队列，队列满时丢弃（缓存写入失败不影响主流程）"""
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            try:
+                self._queue.put_nowait((self._full_key(key), blob))
+            except queue.Full:
+                with self._stats_lock:
+                    self.dropped += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            if first is None:
+                return
+            batch = dict([first])
+            stop = False
+            while len(batch) < self.write_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch[item[0]] = item[1]
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch: Dict[str, bytes]) -> None:
+        try:
+            self.store.mset(batch, self.ttl)
+            with self._stats_lock:
+                self.writes += len(batch)
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            logger.warning(f"写入持久化向量缓存失败: {e}")
+
+    def close(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余的向量后关闭存储"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        try:
+            self.store.close()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "backend": self.store.name,
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "writes": self.writes,
+                "pending_writes": self._queue.qsize(),
+                "dropped": self.dropped,
+                "errors": self.errors
+            }
+
+
+def _create_store():
+    backend = settings.EMBEDDING_CACHE_BACKEND
+    if backend in ("auto", "redis"):
+        try:
+            return RedisEmbeddingStore(settings.EMBEDDING_CACHE_REDIS_URL)
+        except Exception as e:
+            if backend == "redis":
+                raise
+            logger.info(f"Redis不可用，持久化向量缓存改用SQLite: {e}")
+    return SqliteEmbeddingStore(settings.EMBEDDING_CACHE_SQLITE_PATH, settings.EMBEDDING_CACHE_MMAP_SIZE)
+
+
+_embedding_cache: Optional[PersistentEmbeddingCache] = None
+_embedding_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[PersistentEmbeddingCache]:
+    """获取全局二级向量缓存，未启用或初始化失败时返回None"""
+    global _embedding_cache, _embedding_cache_failed
+    if _embedding_cache is not None or _embedding_cache_failed:
+        return _embedding_cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+
+    with _cache_lock:
+        if _embedding_cache is None and not _embedding_cache_failed:
+            try:
+                store = _create_store()
+                _embedding_cache = PersistentEmbeddingCache(
+                    store=store,
+                    namespace=f"emb:v{settings.EMBEDDING_CACHE_MODEL_VERSION}",
+                    ttl=settings.EMBEDDING_CACHE_TTL,
+                    write_batch_size=settings.EMBEDDING_CACHE_WRITE_BATCH_SIZE,
+                    flush_interval=settings.EMBEDDING_CACHE_FLUSH_INTERVAL
+                )
+                atexit.register(_embedding_cache.close)
+                logger.info(f"持久化向量缓存已启用: backend={store.name}")
+            except Exception as e:
+                _embedding_cache_failed = True
+                logger.warning(f"持久化向量缓存初始化失败，仅使用进程内缓存: {e}")
+    return _embedding_cache
+
+
+def close_embedding_cache() -> None:
+    """关闭全局二级向量缓存，落盘未写入的向量"""
+    global _embedding_cache
+    with _cache_lock:
+        if _embedding_cache is not None:
+            _embedding_cache.close()
+            _embedding_cache = None
+
+
+def document_cache_key(provider, text: str) -> str:
+    """文档向量的缓存键：提供者 + 模型 + 文本内容哈希（与问题向量的键分开，部分模型两者不同）"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"doc:{provider.name}:{provider.model_name}:{digest}"
+
+
+def embed_documents_cached(provider, texts: List[str]) -> np.ndarray:
+    """
+    经二级缓存批量向量化文档：按内容哈希批量读取，只对未命中的文本调用provider.embed_documents，
+    新结果后台写回；缓存未启用时直接调用提供者
+    """
+    cache = get_embedding_cache()
+    if cache is None or not texts:
+        return as_float32_matrix(provider.embed_documents(texts))
+
+    keys = [document_cache_key(provider, text) for text in texts]
+    found = cache.get_many(list(dict.fromkeys(keys)))
+    missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in found))
+    if missing:
+        computed = dict(zip((document_cache_key(provider, text) for text in missing),
+                            as_float32_matrix(provider.embed_documents(missing))))
+        cache.put_many(computed)
+        found.update(computed)
+    return np.vstack([found[key] for key in keys])
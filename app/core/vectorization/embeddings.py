@@ -1 +1,259 @@
-# 嵌入模型管理
+"""
+嵌入模型管理
+统一的嵌入提供者接口：Ollama（HTTP）、本地进程内模型（sentence-transformers，可选ONNX后端）、
+以及基于特征哈希的确定性离线实现（无需模型和网络，用于测试、基准和小规模部署）
+所有提供者返回float32 numpy数组：embed_query为一维，embed_documents为 (n, dim) 二维
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.utils.vector_utils import as_float32_matrix, as_float32_vector, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+OLLAMA = "ollama"
+SENTENCE_TRANSFORMER = "sentence_transformer"
+HASHING = "hashing"
+
+
+class EmbeddingProvider(ABC):
+    """嵌入提供者基类"""
+
+    name: str = ""
+
+    def __init__(self, model_name: str, dimension: Optional[int] = None):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """批量向量化，返回 (len(texts), dim) 的float32矩阵"""
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return (await self.aembed_documents([text]))[0]
+
+    def close(self) -> None:
+        pass
+
+
+class OllamaEmbeddingProvider(EmbeddingProvider):
+    """Ollama HTTP嵌入服务"""
+
+    name = OLLAMA
+
+    def __init__(self, model_name: str, base_url: Optional[str] = None, temperature: Optional[float] = None):
+        super().__init__(model_name)
+        from langchain_ollama import OllamaEmbeddings
+
+        self._client = OllamaEmbeddings(
+            model=model_name,
+            base_url=base_url or settings.EMBEDDING_BASE_URL,
+            temperature=temperature,
+        )
+
+    def _track_dimension(self, matrix: np.ndarray) -> np.ndarray:
+        if self.dimension is None and matrix.size:
+            self.dimension = matrix.shape[1]
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._track_dimension(as_float32_matrix(self._client.embed_documents(texts), self.dimension))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return as_float32_vector(self._client.embed_query(text))
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._track_dimension(as_float32_matrix(await self._client.aembed_documents(texts), self.dimension))
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return as_float32_vector(await self._client.aembed_query(text))
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """
+    进程内本地模型（CPU），依赖可选包sentence-transformers
+    backend为onnx时使用ONNX Runtime推理；max_workers大于1时大批量输入按批拆分到线程池并行编码
+    """
+
+    name = SENTENCE_TRANSFORMER
+
+    def __init__(self, model_name: str, device: str = "cpu", backend: str = "torch",
+                 batch_size: int = 32, max_workers: int = 1, normalize: bool = True):
+        super().__init__(model_name)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("本地嵌入模型需要安装sentence-transformers（ONNX后端另需onnxruntime）") from e
+
+        kwargs = {"device": device}
+        if backend and backend != "torch":
+            kwargs["backend"] = backend
+        self._model = SentenceTransformer(model_name, **kwargs)
+        self.dimension = self._model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="local-embedding")
+        logger.info(f"本地嵌入模型已加载: {model_name}, backend={backend}, dimension={self.dimension}")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return as_float32_matrix(self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize,
+            show_progress_bar=False
+        ), self.dimension)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return as_float32_matrix([], self.dimension)
+        if self.max_workers == 1 or len(texts) <= self.batch_size:
+            return self._encode(texts)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(list(self._executor.map(self._encode, batches)))
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_documents, texts)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+|[一-鿿]")
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    基于特征哈希的确定性嵌入
+    英文/数字按词及其3-gram、中文按单字和相邻双字取特征，用blake2b散列到固定维度；
+    同一文本在任何进程中结果一致，词面重叠越多余弦相似度越高
+    """
+
+    name = HASHING
+
+    def __init__(self, dimension: int = 1024):
+        super().__init__(f"hashing-{dimension}", dimension)
+
+    @staticmethod
+    def _features(text: str) -> List[Tuple[str, float]]:
+        tokens = _TOKEN_PATTERN.findall((text or "").lower())
+        features: List[Tuple[str, float]] = []
+        previous_cjk = None
+        for token in tokens:
+            if len(token) == 1 and "一" <= token <= "鿿":
+                features.append((token, 1.0))
+                if previous_cjk is not None:
+                    features.append((previous_cjk + token, 1.0))
+                previous_cjk = token
+                continue
+            previous_cjk = None
+            features.append((token, 1.0))
+            padded = f"#{token}#"
+            features.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+        return features
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += weight if digest[4] & 1 else -weight
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return as_float32_matrix([], self.dimension)
+        return normalize_rows(np.vstack([self._embed(t) for t in texts])).astype(np.float32, copy=False)
+
+    async def aembed_documents(self, texts: List[str]) -> np.ndarray:
+        # 纯计算且很快，直接在事件循环中执行
+        return self.embed_documents(texts)
+
+
+def default_model_name(provider: str) -> str:
+    """各提供者的默认模型名"""
+    if provider == OLLAMA:
+        return settings.OLLAMA_EMBEDDING_MODEL
+    if provider == SENTENCE_TRANSFORMER:
+        return settings.EMBEDDING_LOCAL_MODEL
+    if provider == HASHING:
+        return f"hashing-{settings.EMBEDDING_HASHING_DIMENSION}"
+    return settings.EMBEDDING_MODEL
+
+
+def create_embedding_provider(provider: Optional[str] = None, model_name: Optional[str] = None,
+                              base_url: Optional[str] = None, dimension: Optional[int] = None,
+                              temperature: Optional[float] = None) -> EmbeddingProvider:
+    """
+    创建嵌入提供者
+
+    Args:
+        provider: ollama / sentence_transformer / hashing，默认取embedding.provider
+        model_name: 模型名，默认按提供者取配置
+        base_url: Ollama服务地址
+        dimension: 哈希嵌入的维度（其他提供者由模型决定）
+        temperature: Ollama参数
+    """
+    provider = provider or settings.EMBEDDING_PROVIDER
+    if provider == HASHING:
+        dimension = dimension or settings.EMBEDDING_HASHING_DIMENSION
+        return HashingEmbeddingProvider(dimension=dimension)
+
+    model_name = model_name or default_model_name(provider)
+    if provider == OLLAMA:
+        return OllamaEmbeddingProvider(model_name, base_url=base_url, temperature=temperature)
+    if provider == SENTENCE_TRANSFORMER:
+        return SentenceTransformerEmbeddingProvider(
+            model_name,
+            device=settings.EMBEDDING_DEVICE,
+            backend=settings.EMBEDDING_LOCAL_BACKEND,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_workers=settings.EMBEDDING_LOCAL_WORKERS
+        )
+    raise ValueError(f"不支持的嵌入提供者: {provider}")
+
+
+_providers: Dict[Tuple[str, str], EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(provider: Optional[str] = None, model_name: Optional[str] = None) -> EmbeddingProvider:
+    """获取共享的嵌入提供者实例（按提供者和模型名缓存）"""
+    provider = provider or settings.EMBEDDING_PROVIDER
+    if provider == OLLAMA and model_name is None:
+        # 通用嵌入默认沿用embedding配置的模型和地址
+        model_name = settings.EMBEDDING_MODEL
+    key = (provider, model_name or default_model_name(provider))
+    instance = _providers.get(key)
+    if instance is None:
+        with _providers_lock:
+            instance = _providers.get(key)
+            if instance is None:
+                instance = create_embedding_provider(provider, key[1])
+                _providers[key] = instance
+    return instance
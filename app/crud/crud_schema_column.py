@@ -28,6 +28,18 @@ class CRUDSchemaColumn(CRUDBase[SchemaColumn, SchemaColumnCreate, SchemaColumnUp
             .all()
         )
 
+    def get_by_table_ids(
+        self, db: Session, *, table_ids: List[int]
+    ) -> List[SchemaColumn]:
+        if not table_ids:
+            return []
+        return (
+            db.query(SchemaColumn)
+            .filter(SchemaColumn.table_id.in_(table_ids))
+            .order_by(SchemaColumn.table_id, SchemaColumn.id)
+            .all()
+        )
+
     def get_by_name_and_table(
         self, db: Session, *, column_name: str, table_id: int
     ) -> Optional[SchemaColumn]:
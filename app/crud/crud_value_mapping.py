@@ -12,6 +12,8 @@ from typing import List, Optional
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
+from app.models.schema_column import SchemaColumn
+from app.models.schema_table import SchemaTable
 from app.models.value_mapping import ValueMapping
 from app.schemas.test_to_sql.value_mapping import ValueMappingCreate, ValueMappingUpdate
 
@@ -30,6 +32,28 @@ class CRUDValueMapping(CRUDBase[ValueMapping, ValueMappingCreate, ValueMappingUp
         )
 # pylint: disable  MS8yOmFIVnBZMlhrdUp2bG43bmx2TG82WkVoNlZRPT06ZmE5MjRmOWU=
 
+    def get_by_column_ids(
+        self, db: Session, *, column_ids: List[int]
+    ) -> List[ValueMapping]:
+        if not column_ids:
+            return []
+        return (
+            db.query(ValueMapping)
+            .filter(ValueMapping.column_id.in_(column_ids))
+            .all()
+        )
+
+    def get_by_connection(
+        self, db: Session, *, connection_id: int
+    ) -> List[ValueMapping]:
+        return (
+            db.query(ValueMapping)
+            .join(SchemaColumn, ValueMapping.column_id == SchemaColumn.id)
+            .join(SchemaTable, SchemaColumn.table_id == SchemaTable.id)
+            .filter(SchemaTable.connection_id == connection_id)
+            .all()
+        )
+
     def get_by_column_and_term(
         self, db: Session, *, column_id: int, nl_term: str
     ) -> Optional[ValueMapping]:
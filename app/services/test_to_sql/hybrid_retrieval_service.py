@@ -9,24 +9,37 @@
 
 # 混合检索服务 - 核心实现
 
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import asyncio
+import hashlib
 import json
 import uuid
 import re
 import logging
 import time
+import weakref
+from collections import deque
 from functools import lru_cache
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Query
 from pymilvus import MilvusClient, DataType
-# from sentence_transformers import SentenceTransformer
-from langchain_ollama import OllamaEmbeddings
 
 import numpy as np
 
 from app.config.settings import settings
+from app.core.milvus_processor.client_pool import call_milvus, get_client_pool, get_milvus_client
+from app.core.milvus_processor.load_manager import get_load_manager
+from app.core.milvus_processor.index_config import (
+    get_index_profile, add_vector_fields, add_vector_indexes, binarize, binary_field_name,
+    with_binary_vectors, rerank_exact, search_output_fields
+)
+from app.core.vectorization.embedding_cache import get_embedding_cache
+from app.core.vectorization.embeddings import EmbeddingProvider, create_embedding_provider, default_model_name
+from app.services.test_to_sql.qa_local_index import get_local_qa_indexes
+from app.services.test_to_sql.retrieval_cache import get_retrieval_cache
+from app.utils.lru_cache import LRUTTLCache
+from app.utils.vector_utils import as_float32_matrix, frozen_copy, mmr_select
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
@@ -80,8 +93,8 @@ class QAPairWithContext:
     query_pattern: str
     mentioned_entities: List[str]
 
-    # 向量表示
-    embedding_vector: Optional[List[float]] = None
+    # 向量表示（float32一维数组）
+    embedding_vector: Optional[np.ndarray] = None
 
 @dataclass
 class RetrievalResult:
@@ -96,35 +109,122 @@ class RetrievalResult:
 
 # ===== 向量化服务 =====
 
+class EmbeddingMicroBatcher:
+    """
+    问题向量化的请求合并与微批处理
+    在max_wait_ms内收集并发请求，相同文本只计算一次，凑够max_batch_size或超时后发起一次批量嵌入，
+    再把结果分发给各自等待的future；一个实例只服务于一个事件循环
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self._embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._loop = asyncio.get_running_loop()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.requests = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+    async def submit(self, text: str) -> np.ndarray:
+        """提交一个文本，等待所在批次的结果"""
+        self.requests += 1
+        future = self._pending.get(text) or self._inflight.get(text)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._loop.create_future()
+            self._pending[text] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = self._loop.call_later(self.max_wait, self._flush)
+        # shield: 单个调用方被取消时不影响同批次其他等待者
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        self._loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: Dict[str, asyncio.Future]):
+        texts = list(batch)
+        self.batches += 1
+        self.batched_texts += len(texts)
+        try:
+            embeddings = await self._embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise RuntimeError(f"Batch embedding returned {len(embeddings)} vectors for {len(texts)} texts")
+            for text, embedding in zip(texts, embeddings):
+                if not batch[text].done():
+                    batch[text].set_result(embedding)
+        except Exception as e:
+            self._fail(batch, e)
+        finally:
+            # 任务被取消等情况下仍有未完成的future时也要结束，否则等待者（无超时）会永远挂起
+            self._fail(batch, RuntimeError("Batch embedding did not complete"))
+            for text in texts:
+                if self._inflight.get(text) is batch[text]:
+                    del self._inflight[text]
+
+    @staticmethod
+    def _fail(batch: Dict[str, asyncio.Future], error: BaseException):
+        for future in batch.values():
+            if not future.done():
+                future.set_exception(error)
+                # 标记异常已读取，避免所有等待者都已取消时输出告警
+                future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "average_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else 0.0
+        }
+
+
 class VectorService:
-    """优化的向量化服务 - 支持Ollama和SentenceTransformer"""
+    """优化的向量化服务 - 支持Ollama、本地模型和确定性哈希嵌入"""
 
     def __init__(self, service_type: str = None, model_name: str = None):
         self.service_type = service_type or settings.VECTOR_SERVICE_TYPE
-        self.model_name = model_name or (
-            settings.OLLAMA_EMBEDDING_MODEL if self.service_type == "ollama"
-            else settings.EMBEDDING_MODEL
-        )
-        self.model = None
+        self.model_name = model_name or default_model_name(self.service_type)
+        self.model: Optional[EmbeddingProvider] = None
         self.dimension = None
         self._initialized = False
-        self._cache = {} if settings.VECTOR_CACHE_ENABLED else None
-        self._cache_timestamps = {} if settings.VECTOR_CACHE_ENABLED else None
+        # 按条数和内存双重限制的LRU缓存，向量以float32存储
+        self._cache = LRUTTLCache(
+            max_size=settings.VECTOR_CACHE_MAX_SIZE,
+            ttl=settings.VECTOR_CACHE_TTL,
+            max_bytes=settings.VECTOR_CACHE_MAX_BYTES,
+            sizeof=lambda vector: vector.nbytes
+        ) if settings.VECTOR_CACHE_ENABLED else None
 
         # 性能配置
         self.batch_size = settings.VECTOR_BATCH_SIZE
         self.max_retries = settings.VECTOR_MAX_RETRIES
         self.retry_delay = settings.VECTOR_RETRY_DELAY
 
+        # 每个事件循环一个微批处理器
+        self._batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, EmbeddingMicroBatcher]" = (
+            weakref.WeakKeyDictionary()
+        )
+
     async def initialize(self):
         """初始化模型"""
         if not self._initialized:
             try:
-                if self.service_type == "ollama":
-                    await self._initialize_ollama()
-                else:
-                    pass
-                    # await self._initialize_sentence_transformer()
+                await self._initialize_provider()
 
                 self._initialized = True
                 logger.info(f"Vector service initialized successfully with {self.service_type}")
@@ -134,13 +234,15 @@ class VectorService:
                 raise
 # fmt: off  MS80OmFIVnBZMlhrdUp2bG43bmx2TG82ZUhORVp3PT06OTMzZTE5MjU=
 
-    async def _initialize_ollama(self):
-        """初始化Ollama嵌入模型"""
+    async def _initialize_provider(self):
+        """初始化嵌入提供者"""
 
-        logger.info(f"Initializing Ollama embedding model: {self.model_name}")
+        logger.info(f"Initializing {self.service_type} embedding model: {self.model_name}")
 
-        self.model = OllamaEmbeddings(
-            model=self.model_name,
+        self.model = await asyncio.to_thread(
+            create_embedding_provider,
+            self.service_type,
+            self.model_name,
             base_url=settings.OLLAMA_BASE_URL,
             temperature=settings.OLLAMA_TEMPERATURE,
         )
@@ -150,24 +252,10 @@ class VectorService:
         test_embedding = await self._embed_with_retry(test_text)
         self.dimension = len(test_embedding)
 
-        logger.info(f"Ollama model loaded, dimension: {self.dimension}")
-
-    async def _initialize_sentence_transformer(self):
-        """初始化SentenceTransformer模型"""
-        # logger.info(f"Initializing SentenceTransformer model: {self.model_name}")
-        #
-        # # 使用配置的缓存路径或默认路径
-        # cache_folder = getattr(settings, 'SENTENCE_TRANSFORMER_CACHE', None)
-        # if not cache_folder:
-        #     cache_folder = r"C:\Users\86134\.cache\huggingface\hub"
-        #
-        # self.model = SentenceTransformer(self.model_name, cache_folder=cache_folder)
-        # self.dimension = self.model.get_sentence_embedding_dimension()
-        #
-        # logger.info(f"SentenceTransformer model loaded, dimension: {self.dimension}")
-
-    async def embed_question(self, question: str) -> List[float]:
-        """将问题转换为向量"""
+        logger.info(f"Embedding model loaded, dimension: {self.dimension}")
+
+    async def embed_question(self, question: str) -> np.ndarray:
+        """将问题转换为float32向量"""
         if not self._initialized:
             await self.initialize()
 
@@ -177,17 +265,24 @@ class VectorService:
             if cached_result is not None:
                 return cached_result
 
+        # 检查跨进程共享的二级缓存
+        persisted = await self._get_from_persistent([question])
+        if question in persisted:
+            return persisted[question]
+
         processed_question = self._preprocess_question(question)
 
         try:
-            if self.service_type == "ollama":
-                embedding = await self._embed_with_retry(processed_question)
+            if settings.VECTOR_MICRO_BATCH_ENABLED:
+                # 与并发请求合并成一次批量嵌入
+                embedding = await self._get_batcher().submit(processed_question)
             else:
-                embedding = self.model.encode(processed_question).tolist()
+                embedding = await self._embed_with_retry(processed_question)
 
             # 存储到缓存
             if self._cache is not None:
                 self._store_to_cache(question, embedding)
+            self._store_to_persistent({question: embedding})
 
             return embedding
 
@@ -195,14 +290,13 @@ class VectorService:
             logger.error(f"Failed to embed question: {str(e)}")
             raise
 
-    async def batch_embed(self, questions: List[str]) -> List[List[float]]:
-        """批量向量化"""
+    async def batch_embed(self, questions: List[str]) -> np.ndarray:
+        """批量向量化，返回 (len(questions), dim) 的float32矩阵"""
         if not self._initialized:
             await self.initialize()
 
         if not questions:
-            return []
-# pylint: disable  Mi80OmFIVnBZMlhrdUp2bG43bmx2TG82ZUhORVp3PT06OTMzZTE5MjU=
+            return as_float32_matrix([], self.dimension)
 
         # 检查缓存中的结果
         cached_results = {}
@@ -218,55 +312,74 @@ class VectorService:
         else:
             uncached_questions = list(enumerate(questions))
 
+        # 一级缓存未命中的问题批量查询二级缓存
+        if uncached_questions:
+            persisted = await self._get_from_persistent([q for _, q in uncached_questions])
+            if persisted:
+                for i, question in uncached_questions:
+                    if question in persisted:
+                        cached_results[i] = persisted[question]
+                uncached_questions = [(i, q) for i, q in uncached_questions if q not in persisted]
+
         # 处理未缓存的问题
         if uncached_questions:
             uncached_indices, uncached_texts = zip(*uncached_questions)
             processed_questions = [self._preprocess_question(q) for q in uncached_texts]
 
             try:
-                if self.service_type == "ollama":
-                    # Ollama批量处理
-                    embeddings = await self._batch_embed_ollama(processed_questions)
-                else:
-                    # SentenceTransformer批量处理
-                    embeddings = self.model.encode(processed_questions).tolist()
+                embeddings = await self._batch_embed(processed_questions)
 
                 # 存储到缓存并合并结果
+                new_embeddings = {}
                 for i, (original_idx, original_question) in enumerate(uncached_questions):
                     embedding = embeddings[i]
                     if self._cache is not None:
                         self._store_to_cache(original_question, embedding)
+                    new_embeddings[original_question] = embedding
                     cached_results[original_idx] = embedding
+                self._store_to_persistent(new_embeddings)
 
             except Exception as e:
                 logger.error(f"Failed to batch embed questions: {str(e)}")
                 raise
 
         # 按原始顺序返回结果
-        return [cached_results[i] for i in range(len(questions))]
+        return np.vstack([cached_results[i] for i in range(len(questions))])
+
+    def _get_batcher(self) -> EmbeddingMicroBatcher:
+        """获取当前事件循环的微批处理器"""
+        loop = asyncio.get_running_loop()
+        batcher = self._batchers.get(loop)
+        if batcher is None:
+            batcher = EmbeddingMicroBatcher(
+                self._embed_texts,
+                max_batch_size=settings.VECTOR_MICRO_BATCH_MAX_SIZE,
+                max_wait_ms=settings.VECTOR_MICRO_BATCH_MAX_WAIT_MS
+            )
+            self._batchers[loop] = batcher
+        return batcher
+
+    async def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """对已预处理的文本做一次批量嵌入"""
+        return await self._batch_embed(texts)
 
-    async def _batch_embed_ollama(self, questions: List[str]) -> List[List[float]]:
-        """Ollama批量嵌入"""
+    async def _batch_embed(self, questions: List[str]) -> np.ndarray:
+        """分批嵌入"""
         embeddings = []
 
         # 分批处理以避免超时
         for i in range(0, len(questions), self.batch_size):
             batch = questions[i:i + self.batch_size]
             batch_embeddings = await self._embed_batch_with_retry(batch)
-            embeddings.extend(batch_embeddings)
+            embeddings.append(batch_embeddings)
 
-        return embeddings
+        return np.vstack(embeddings)
 
-    async def _embed_with_retry(self, text: str) -> List[float]:
+    async def _embed_with_retry(self, text: str) -> np.ndarray:
         """带重试的单个文本嵌入"""
         for attempt in range(self.max_retries):
             try:
-                if self.service_type == "ollama":
-                    # 使用异步方法
-                    embedding = await self.model.aembed_query(text)
-                    return embedding
-                else:
-                    return self.model.encode(text).tolist()
+                return await self.model.aembed_query(text)
 
             except Exception as e:
                 if attempt == self.max_retries - 1:
@@ -275,16 +388,11 @@ class VectorService:
                 logger.warning(f"Embedding attempt {attempt + 1} failed: {str(e)}, retrying...")
                 await asyncio.sleep(self.retry_delay * (2 ** attempt))  # 指数退避
 
-    async def _embed_batch_with_retry(self, texts: List[str]) -> List[List[float]]:
+    async def _embed_batch_with_retry(self, texts: List[str]) -> np.ndarray:
         """带重试的批量文本嵌入"""
         for attempt in range(self.max_retries):
             try:
-                if self.service_type == "ollama":
-                    # Ollama批量嵌入
-                    embeddings = await self.model.aembed_documents(texts)
-                    return embeddings
-                else:
-                    return self.model.encode(texts).tolist()
+                return await self.model.aembed_documents(texts)
 
             except Exception as e:
                 if attempt == self.max_retries - 1:
@@ -311,41 +419,51 @@ class VectorService:
 
         return processed
 
-    def _get_from_cache(self, question: str) -> Optional[List[float]]:
-        """从缓存获取结果"""
+    def _get_from_cache(self, question: str) -> Optional[np.ndarray]:
+        """从缓存获取结果（只读数组）"""
         if self._cache is None:
             return None
 
-        cache_key = self._get_cache_key(question)
-
-        # 检查是否过期
-        if cache_key in self._cache_timestamps:
-            if time.time() - self._cache_timestamps[cache_key] > settings.VECTOR_CACHE_TTL:
-                # 清理过期缓存
-                del self._cache[cache_key]
-                del self._cache_timestamps[cache_key]
-                return None
-
-        return self._cache.get(cache_key)
+        return self._cache.get(self._get_cache_key(question))
 
-    def _store_to_cache(self, question: str, embedding: List[float]):
-        """存储到缓存"""
+    def _store_to_cache(self, question: str, embedding: np.ndarray):
+        """存储到缓存，复制为独立的只读数组，避免持有批量结果矩阵的引用"""
         if self._cache is None:
             return
 
-        cache_key = self._get_cache_key(question)
-        self._cache[cache_key] = embedding
-        self._cache_timestamps[cache_key] = time.time()
+        self._cache.set(self._get_cache_key(question), frozen_copy(embedding))
+
+    async def _get_from_persistent(self, questions: List[str]) -> Dict[str, np.ndarray]:
+        """批量读取二级缓存，命中的结果同时回填一级缓存"""
+        persistent = get_embedding_cache()
+        if persistent is None or not questions:
+            return {}
+
+        keys = {self._get_cache_key(q): q for q in questions}
+        found = await asyncio.to_thread(persistent.get_many, list(keys))
+        result = {}
+        for key, vector in found.items():
+            question = keys[key]
+            if self._cache is not None:
+                self._cache.set(key, vector)
+            result[question] = vector
+        return result
+
+    def _store_to_persistent(self, embeddings: Dict[str, np.ndarray]):
+        """写入二级缓存（后台批量落盘）"""
+        persistent = get_embedding_cache()
+        if persistent is not None and embeddings:
+            persistent.put_many({self._get_cache_key(q): e for q, e in embeddings.items()})
 
     def _get_cache_key(self, question: str) -> str:
-        """生成缓存键"""
-        return f"{self.service_type}:{self.model_name}:{hash(question)}"
+        """生成缓存键：按预处理后文本的内容哈希，跨进程稳定"""
+        digest = hashlib.sha256(self._preprocess_question(question).encode("utf-8")).hexdigest()
+        return f"{self.service_type}:{self.model_name}:{digest}"
 
     def clear_cache(self):
         """清理缓存"""
         if self._cache is not None:
             self._cache.clear()
-            self._cache_timestamps.clear()
             logger.info("Vector service cache cleared")
 
     def get_cache_stats(self) -> Dict[str, Any]:
@@ -353,17 +471,19 @@ class VectorService:
         if self._cache is None:
             return {"cache_enabled": False}
 
-        current_time = time.time()
-        valid_entries = sum(
-            1 for timestamp in self._cache_timestamps.values()
-            if current_time - timestamp <= settings.VECTOR_CACHE_TTL
-        )
-
+        self._cache.purge_expired()
+        stats = self._cache.stats()
+        persistent = get_embedding_cache()
+        batcher_stats = [batcher.stats() for batcher in list(self._batchers.values())]
         return {
             "cache_enabled": True,
-            "total_entries": len(self._cache),
-            "valid_entries": valid_entries,
-            "cache_hit_rate": getattr(self, '_cache_hits', 0) / max(getattr(self, '_cache_requests', 1), 1)
+            "micro_batch": batcher_stats[0] if len(batcher_stats) == 1 else batcher_stats,
+            "persistent_cache": persistent.stats() if persistent is not None else None,
+            "total_entries": stats["size"],
+            "cache_hits": stats["hits"],
+            "cache_misses": stats["misses"],
+            "cache_hit_rate": round(stats["hit_rate"], 4),
+            **stats
         }
 
     async def health_check(self) -> Dict[str, Any]:
@@ -407,10 +527,7 @@ class VectorServiceFactory:
     async def create_service(cls, service_type: str = None, model_name: str = None) -> VectorService:
         """创建或获取向量服务实例"""
         service_type = service_type or settings.VECTOR_SERVICE_TYPE
-        model_name = model_name or (
-            settings.OLLAMA_EMBEDDING_MODEL if service_type == "ollama"
-            else settings.EMBEDDING_MODEL
-        )
+        model_name = model_name or default_model_name(service_type)
 
         instance_key = f"{service_type}:{model_name}"
 
@@ -446,25 +563,14 @@ class VectorServiceMonitor:
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
-            "total_response_time": 0.0,
-            "cache_hits": 0,
-            "cache_misses": 0
+            "total_response_time": 0.0
         }
 
-    async def embed_with_monitoring(self, question: str) -> List[float]:
+    async def embed_with_monitoring(self, question: str) -> np.ndarray:
         """带监控的嵌入"""
         start_time = time.time()
         self.metrics["total_requests"] += 1
 
-        # 检查缓存
-        if self.service._cache is not None:
-            cached_result = self.service._get_from_cache(question)
-            if cached_result is not None:
-                self.metrics["cache_hits"] += 1
-                return cached_result
-            else:
-                self.metrics["cache_misses"] += 1
-
         try:
             result = await self.service.embed_question(question)
             self.metrics["successful_requests"] += 1
@@ -488,17 +594,17 @@ class VectorServiceMonitor:
             self.metrics["successful_requests"] / max(self.metrics["total_requests"], 1)
         )
 
-        cache_hit_rate = (
-            self.metrics["cache_hits"] / max(
-                self.metrics["cache_hits"] + self.metrics["cache_misses"], 1
-            )
-        )
+        # 缓存命中数据直接取自向量服务的缓存统计
+        cache_stats = self.service.get_cache_stats()
 
         return {
             **self.metrics,
+            "cache_hits": cache_stats.get("cache_hits", 0),
+            "cache_misses": cache_stats.get("cache_misses", 0),
+            "cache_evictions": cache_stats.get("evictions", 0),
             "average_response_time_ms": round(avg_response_time * 1000, 2),
             "success_rate": round(success_rate, 4),
-            "cache_hit_rate": round(cache_hit_rate, 4)
+            "cache_hit_rate": cache_stats.get("cache_hit_rate", 0.0)
         }
 
 # ===== Milvus服务 =====
@@ -523,8 +629,11 @@ class MilvusService:
 
         # 构建连接URI
         self.uri = f"http://{self.host}:{self.port}"
-        self.client = None
         self._initialized = False
+        # 向量索引与量化配置
+        self.index_profile = get_index_profile("qa_pairs")
+        # 集合是否以connection_id为分区键（initialize时按实际schema确定）
+        self.partition_key_enabled = False
 
     def _generate_collection_name(self, database_name: str = None) -> str:
         """根据数据库名称生成集合名称"""
@@ -545,15 +654,20 @@ class MilvusService:
             # 默认集合名称
             return "default_qa_pairs"
 
+    @property
+    def client(self) -> MilvusClient:
+        """进程内按URI共享的客户端，连接失效时由连接池重连"""
+        return get_milvus_client(self.uri)
+
     async def initialize(self, dimension: int):
         """初始化Milvus连接和集合"""
         try:
-            # 创建MilvusClient连接
-            self.client = MilvusClient(uri=self.uri)
+            # 从连接池获取共享的MilvusClient（首次取用时建立连接）
+            client = self.client
             logger.info(f"Connected to Milvus at {self.uri}")
 
             # 检查集合是否存在
-            if self.client.has_collection(collection_name=self.collection_name):
+            if client.has_collection(collection_name=self.collection_name):
                 logger.info(f"Collection {self.collection_name} exists, checking schema compatibility...")
                 # 检查现有集合的schema是否兼容
                 try:
@@ -562,7 +676,13 @@ class MilvusService:
                     logger.info(f"Existing collection schema: {collection_info}")
 
                     # 检查是否有vector字段
-                    has_vector_field = any(field.get('name') == 'vector' for field in collection_info.get('fields', []))
+                    field_names = {field.get('name') for field in collection_info.get('fields', [])}
+                    has_vector_field = 'vector' in field_names
+                    if has_vector_field and self.index_profile.is_binary and binary_field_name('vector') not in field_names:
+                        # 已有集合未建二值字段，不重建集合，改为在float字段上检索
+                        logger.warning(f"Collection {self.collection_name} has no binary vector field, "
+                                       f"searching the float field instead")
+                        self.index_profile = self.index_profile.without_binary()
                     if not has_vector_field:
                         logger.warning(f"Collection {self.collection_name} missing vector field, recreating...")
                         # 删除旧集合并重新创建
@@ -571,6 +691,14 @@ class MilvusService:
                         await self._create_new_collection(dimension)
                     else:
                         logger.info(f"Using existing compatible collection: {self.collection_name}")
+                        self._align_profile_with_index()
+                        self.partition_key_enabled = any(
+                            f.get('name') == 'connection_id' and f.get('is_partition_key')
+                            for f in collection_info.get('fields', [])
+                        )
+                        if settings.MILVUS_QA_PARTITION_KEY and not self.partition_key_enabled:
+                            logger.warning(f"Collection {self.collection_name} has no connection_id partition key, "
+                                           f"searches scan all tenants; run scripts/migrate_qa_partition_key.py")
                 except Exception as e:
                     logger.warning(f"Failed to check collection schema: {e}, recreating collection...")
                     # 如果无法检查schema，删除并重新创建
@@ -590,8 +718,24 @@ class MilvusService:
             logger.error(f"Failed to initialize Milvus service: {str(e)}")
             raise
 
-    async def _create_new_collection(self, dimension: int):
-        """创建新的集合"""
+    def _align_profile_with_index(self):
+        """已有集合的向量索引类型与配置不一致时（配置修改后未重建索引），按实际索引调整搜索参数"""
+        try:
+            index_info = self.client.describe_index(collection_name=self.collection_name, index_name="vector")
+        except Exception as e:
+            logger.warning(f"Failed to describe vector index of {self.collection_name}: {e}")
+            return
+        index_type = (index_info or {}).get("index_type")
+        profile = self.index_profile.for_existing_index(index_type)
+        if profile != self.index_profile:
+            logger.warning(f"Collection {self.collection_name} uses {index_type} while config expects "
+                           f"{self.index_profile.index_type}, rebuild the index to apply the new config")
+            self.index_profile = profile
+
+    async def _create_new_collection(self, dimension: int, collection_name: str = None):
+        """创建新的集合，connection_id作为分区键时按连接哈希分区，检索只扫描对应分区"""
+        collection_name = collection_name or self.collection_name
+        partition_key = settings.MILVUS_QA_PARTITION_KEY
         try:
             # 创建新集合 - 使用MilvusClient.create_schema方法
             schema = self.client.create_schema(
@@ -604,34 +748,101 @@ class MilvusService:
             schema.add_field(field_name="id", datatype=DataType.VARCHAR, max_length=100, is_primary=True)
             schema.add_field(field_name="question", datatype=DataType.VARCHAR, max_length=2000)
             schema.add_field(field_name="sql", datatype=DataType.VARCHAR, max_length=5000)
-            schema.add_field(field_name="connection_id", datatype=DataType.INT64)
+            schema.add_field(field_name="connection_id", datatype=DataType.INT64, is_partition_key=partition_key)
             schema.add_field(field_name="difficulty_level", datatype=DataType.INT64)
             schema.add_field(field_name="query_type", datatype=DataType.VARCHAR, max_length=50)
             schema.add_field(field_name="success_rate", datatype=DataType.FLOAT)
             schema.add_field(field_name="verified", datatype=DataType.BOOL)
-            schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=dimension)
+            add_vector_fields(schema, DataType, "vector", dimension, self.index_profile)
 
-            # 创建索引参数
+            # 创建索引参数（按milvus_index.qa_pairs配置选择量化方式）
             index_params = self.client.prepare_index_params()
-            index_params.add_index(
-                field_name="vector",
-                index_type="IVF_FLAT",
-                metric_type="COSINE",
-                params={"nlist": 128}
-            )
+            add_vector_indexes(index_params, "vector", self.index_profile)
 
             # 创建集合
+            create_kwargs = {"num_partitions": settings.MILVUS_QA_NUM_PARTITIONS} if partition_key else {}
             self.client.create_collection(
-                collection_name=self.collection_name,
+                collection_name=collection_name,
                 schema=schema,
-                index_params=index_params
+                index_params=index_params,
+                **create_kwargs
             )
-            logger.info(f"Created new collection: {self.collection_name}")
+            self.partition_key_enabled = partition_key
+            logger.info(f"Created new collection: {collection_name} (partition_key={partition_key})")
 
         except Exception as e:
-            logger.error(f"Failed to create collection {self.collection_name}: {str(e)}")
+            logger.error(f"Failed to create collection {collection_name}: {str(e)}")
             raise
 
+    async def migrate_to_partition_key(self, batch_size: int = 1000, drop_old: bool = False) -> Dict[str, Any]:
+        """
+        把未启用分区键的已有集合迁移为以connection_id为分区键的新集合
+        先复制数据到临时集合并核对行数，再通过改名切换，原集合保留为备份（drop_old时删除）；
+        迁移期间应暂停问答对写入
+        """
+        source = self.collection_name
+        collection_info = self.client.describe_collection(collection_name=source)
+        fields = collection_info.get('fields', [])
+        if any(f.get('name') == 'connection_id' and f.get('is_partition_key') for f in fields):
+            return {"migrated": False, "reason": "partition key already enabled", "collection": source}
+
+        vector_field = next(f for f in fields if f.get('name') == 'vector')
+        dimension = int(vector_field.get('params', {}).get('dim'))
+        copy_fields = [f['name'] for f in fields if f.get('name') != binary_field_name('vector')]
+
+        target = f"{source}_pk"
+        if self.client.has_collection(collection_name=target):
+            # 上次迁移中断留下的临时集合
+            self.client.drop_collection(collection_name=target)
+        await self._create_new_collection(dimension, collection_name=target)
+
+        copied = 0
+        start = time.time()
+        iterator = self.client.query_iterator(
+            collection_name=source, filter="", output_fields=copy_fields, batch_size=batch_size
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                rows = [{name: row[name] for name in copy_fields} for row in rows]
+                if self.index_profile.is_binary:
+                    with_binary_vectors(rows, "vector")
+                self.client.insert(collection_name=target, data=rows)
+                copied += len(rows)
+        finally:
+            iterator.close()
+
+        self.client.flush(collection_name=target)
+        # get_collection_stats的row_count包含已删除但未压缩的行，用count(*)统计实际可见行数
+        source_count = self._count_rows(source)
+        target_count = self._count_rows(target)
+        if not copied == source_count == target_count:
+            raise RuntimeError(f"Row count mismatch after copy: copied={copied}, "
+                               f"{source}={source_count}, {target}={target_count}")
+
+        backup = f"{source}_bak_{int(start)}"
+        self.client.rename_collection(old_name=source, new_name=backup)
+        self.client.rename_collection(old_name=target, new_name=source)
+        if drop_old:
+            self.client.drop_collection(collection_name=backup)
+        logger.info(f"Migrated {copied} QA pairs of {source} to partition key collection "
+                    f"in {time.time() - start:.1f}s")
+        return {
+            "migrated": True,
+            "collection": source,
+            "rows": copied,
+            "backup": None if drop_old else backup,
+            "seconds": round(time.time() - start, 1)
+        }
+
+    def _count_rows(self, collection_name: str) -> int:
+        """集合中未删除的行数（强一致读，包含刚刷盘的数据）"""
+        counted = self.client.query(collection_name=collection_name, filter="",
+                                    output_fields=["count(*)"], consistency_level="Strong")
+        return int(counted[0]["count(*)"]) if counted else 0
+
     async def insert_qa_pair(self, qa_pair: QAPairWithContext) -> str:
         """插入问答对"""
         if not self._initialized:
@@ -650,12 +861,19 @@ class MilvusService:
                 "verified": qa_pair.verified,
                 "vector": qa_pair.embedding_vector
             }
+            if self.index_profile.is_binary:
+                with_binary_vectors([data], "vector")
 
-            # 插入数据
-            self.client.insert(
+            # 插入数据（异步客户端/有界线程池，不阻塞事件循环）
+            await call_milvus(
+                "insert",
+                uri=self.uri,
                 collection_name=self.collection_name,
                 data=[data]
             )
+            if settings.QA_LOCAL_INDEX_ENABLED:
+                get_local_qa_indexes().add(self.collection_name, qa_pair.connection_id, data,
+                                           qa_pair.embedding_vector)
 
             logger.info(f"Inserted QA pair: {qa_pair.id}")
             return qa_pair.id
@@ -664,41 +882,91 @@ class MilvusService:
             logger.error(f"Failed to insert QA pair: {str(e)}")
             raise
 
+    async def delete_qa_pair(self, qa_id: str) -> None:
+        """按主键删除问答对"""
+        if not self._initialized:
+            raise RuntimeError("Milvus service not initialized")
+
+        try:
+            await call_milvus(
+                "delete",
+                uri=self.uri,
+                collection_name=self.collection_name,
+                ids=[qa_id]
+            )
+            if settings.QA_LOCAL_INDEX_ENABLED:
+                get_local_qa_indexes().remove(self.collection_name, qa_id)
+            logger.info(f"Deleted QA pair: {qa_id}")
+
+        except Exception as e:
+            logger.error(f"Failed to delete QA pair: {str(e)}")
+            raise
+
     async def search_similar(self,
-                           query_vector: List[float],
+                           query_vector: np.ndarray,
                            top_k: int = 5,
                            connection_id: Optional[int] = None) -> List[Dict]:
-        """搜索相似的问答对"""
+        """
+        搜索相似的问答对
+        启用本地索引时：已与Milvus核对且未过期的小租户索引直接在进程内检索；其他情况走Milvus，Milvus出错或超时时降级到本地索引；
+        没有可降级的本地索引时异常向上抛出，由调用方区分"检索失败"与"没有结果"
+        """
         if not self._initialized:
             raise RuntimeError("Milvus service not initialized")
 
+        local_index = None
+        if settings.QA_LOCAL_INDEX_ENABLED and connection_id:
+            local_indexes = get_local_qa_indexes()
+            local_index = local_indexes.get(self.collection_name, connection_id)
+            # 未加载或超过核对间隔时后台加载/与Milvus核对；只有核对未过期的小租户索引代替Milvus检索
+            local_indexes.schedule_load(self.collection_name, connection_id, self.uri, len(query_vector))
+            if local_indexes.is_small(local_index) and local_indexes.is_fresh(self.collection_name, connection_id):
+                local_indexes.local_searches += 1
+                return local_index.search(query_vector, top_k)
+
         try:
-            # 构建过滤表达式
-            filter_expr = None
-            if connection_id:
-                filter_expr = f"connection_id == {connection_id}"
-
-            # 使用MilvusClient进行搜索
-            search_params = {
-                "metric_type": "COSINE",
-                "params": {"nprobe": 10}
-            }
+            if local_index is None:
+                return await self._search_milvus(query_vector, top_k, connection_id)
+            return await asyncio.wait_for(self._search_milvus(query_vector, top_k, connection_id),
+                                          timeout=settings.QA_LOCAL_INDEX_MILVUS_TIMEOUT_MS / 1000)
+        except Exception as e:
+            if local_index is not None:
+                logger.warning(f"Milvus search failed or timed out, using local QA index: {str(e) or type(e).__name__}")
+                get_local_qa_indexes().fallback_searches += 1
+                return local_index.search(query_vector, top_k)
+            raise
 
-            results = self.client.search(
-                collection_name=self.collection_name,
-                data=[query_vector],
-                limit=top_k,
-                search_params=search_params,
-                filter=filter_expr,
-                output_fields=["id", "question", "sql", "connection_id",
-                              "difficulty_level", "query_type", "success_rate", "verified"]
-            )
+    async def _search_milvus(self, query_vector: np.ndarray, top_k: int,
+                             connection_id: Optional[int]) -> List[Dict]:
+        """在Milvus中检索，出错时抛出异常"""
+        # 构建过滤表达式（分区键集合中Milvus据此只检索该连接所在的分区）
+        filter_expr = ""
+        if connection_id:
+            filter_expr = f"connection_id == {int(connection_id)}"
+
+        # 使用MilvusClient进行搜索，量化索引先多取候选再精确重排
+        profile = self.index_profile
+        output_fields = ["id", "question", "sql", "connection_id",
+                         "difficulty_level", "query_type", "success_rate", "verified"]
+
+        # 集合可能因空闲、内存预算或被其他进程释放，由加载管理器确保已加载并在检索期间防止释放
+        results = await get_load_manager().call_loaded(
+            "search",
+            self.collection_name,
+            uri=self.uri,
+            data=binarize(query_vector) if profile.is_binary else [query_vector],
+            anns_field=profile.anns_field("vector"),
+            limit=profile.candidate_limit(top_k),
+            search_params=profile.ann_search_params(profile.candidate_limit(top_k)),
+            filter=filter_expr,
+            output_fields=search_output_fields(output_fields, "vector", profile)
+        )
 
-            return self._format_search_results(results[0])
+        hits = results[0]
+        if profile.needs_rerank:
+            hits = rerank_exact(query_vector, hits, "vector", top_k, profile.metric_type)
 
-        except Exception as e:
-            logger.error(f"Failed to search similar QA pairs: {str(e)}")
-            return []
+        return self._format_search_results(hits)
 
     def _format_search_results(self, results) -> List[Dict]:
         """格式化搜索结果"""
@@ -869,22 +1137,29 @@ class EnhancedNeo4jService:
             """, qa_id=qa_pair.id, entity_id=entity_id)
 
     async def structural_search(self, schema_context: Dict[str, Any],
-                              connection_id: int, top_k: int = 20) -> List[RetrievalResult]:
-        """基于schema结构的检索"""
+                              connection_id: int, top_k: int = 20,
+                              timeout: Optional[float] = None) -> List[RetrievalResult]:
+        """
+        基于schema结构的检索
+        同步驱动的查询在线程中执行，不阻塞事件循环；timeout(秒)作为Neo4j事务超时，超时后由服务端终止查询
+        """
         if not self._initialized:
             await self.initialize()
+        return await asyncio.to_thread(self._structural_search_sync, schema_context, connection_id, top_k, timeout)
 
+    def _structural_search_sync(self, schema_context: Dict[str, Any], connection_id: int, top_k: int,
+                                timeout: Optional[float]) -> List[RetrievalResult]:
         table_names = [table.get('name') for table in schema_context.get('tables', [])]
 
         with self.driver.session() as session:
-            result = session.run("""
+            result = session.run(Query("""
                 MATCH (qa:QAPair)-[:USES_TABLES]->(t:Table)
                 WHERE t.name IN $table_names AND qa.connection_id = $connection_id
                 WITH qa, count(t) as table_overlap, collect(t.name) as used_tables
                 ORDER BY table_overlap DESC, qa.success_rate DESC
                 LIMIT $top_k
                 RETURN qa, table_overlap, used_tables
-            """, table_names=table_names, connection_id=connection_id, top_k=top_k)
+            """, timeout=timeout or None), table_names=table_names, connection_id=connection_id, top_k=top_k)
 
             results = []
             for record in result:
@@ -905,13 +1180,18 @@ class EnhancedNeo4jService:
             return results
 
     async def pattern_search(self, query_type: str, difficulty_level: int,
-                           connection_id: int, top_k: int = 20) -> List[RetrievalResult]:
-        """基于查询模式的检索"""
+                           connection_id: int, top_k: int = 20,
+                           timeout: Optional[float] = None) -> List[RetrievalResult]:
+        """基于查询模式的检索（在线程中执行，timeout同structural_search）"""
         if not self._initialized:
             await self.initialize()
+        return await asyncio.to_thread(self._pattern_search_sync, query_type, difficulty_level,
+                                       connection_id, top_k, timeout)
 
+    def _pattern_search_sync(self, query_type: str, difficulty_level: int, connection_id: int, top_k: int,
+                             timeout: Optional[float]) -> List[RetrievalResult]:
         with self.driver.session() as session:
-            result = session.run("""
+            result = session.run(Query("""
                 MATCH (qa:QAPair)-[:FOLLOWS_PATTERN]->(p:QueryPattern)
                 WHERE p.name = $query_type
                 AND p.difficulty_level <= $difficulty_level + 1
@@ -919,7 +1199,7 @@ class EnhancedNeo4jService:
                 RETURN qa, p.usage_count
                 ORDER BY qa.success_rate DESC, p.usage_count DESC
                 LIMIT $top_k
-            """, query_type=query_type, difficulty_level=difficulty_level,
+            """, timeout=timeout or None), query_type=query_type, difficulty_level=difficulty_level,
                 connection_id=connection_id, top_k=top_k)
 
             results = []
@@ -939,6 +1219,22 @@ class EnhancedNeo4jService:
 
             return results
 
+    async def delete_qa_pair(self, qa_id: str) -> Optional[int]:
+        """删除问答对节点及其关系，返回其connection_id（不存在时返回None）"""
+        if not self._initialized:
+            await self.initialize()
+        return await asyncio.to_thread(self._delete_qa_pair_sync, qa_id)
+
+    def _delete_qa_pair_sync(self, qa_id: str) -> Optional[int]:
+        with self.driver.session() as session:
+            record = session.run("""
+                MATCH (qa:QAPair {id: $qa_id})
+                WITH qa, qa.connection_id AS connection_id
+                DETACH DELETE qa
+                RETURN connection_id
+            """, qa_id=qa_id).single()
+        return record["connection_id"] if record else None
+
     def _build_qa_pair_from_record(self, qa_data, used_tables=None) -> QAPairWithContext:
         """从Neo4j记录构建QAPair对象"""
         return QAPairWithContext(
@@ -965,147 +1261,117 @@ class EnhancedNeo4jService:
 # ===== 融合排序器 =====
 
 class FusionRanker:
-    """多维度融合排序器"""
+    """
+    多维度融合排序器
+    按QA id把三路检索结果映射到数组下标，用numpy批量计算分数：
+    weighted模式按语义分所在区间选择动态权重加权；rrf模式按各路排名做倒数排名融合，无需分数归一化
+    """
+
+    # 语义分区间边界及对应的 [语义, 结构, 模式, 质量] 权重，第二档(0.5~0.7)使用配置的基础权重
+    _SEMANTIC_BANDS = np.array([0.5, 0.7, 0.9])
 
-    def __init__(self):
+    def __init__(self, mode: str = None, rrf_k: int = None):
         self.weights = {
             'semantic': settings.SEMANTIC_WEIGHT,
             'structural': settings.STRUCTURAL_WEIGHT,
             'pattern': settings.PATTERN_WEIGHT,
             'quality': settings.QUALITY_WEIGHT
         }
+        self.mode = mode or settings.FUSION_MODE
+        if self.mode not in ("weighted", "rrf"):
+            raise ValueError(f"Unsupported fusion mode: {self.mode}")
+        self.rrf_k = rrf_k or settings.FUSION_RRF_K
+        self._base_weights = np.array([self.weights['semantic'], self.weights['structural'],
+                                       self.weights['pattern'], self.weights['quality']], dtype=np.float64)
+        # 动态权重表只在初始化时构建一次，行号即语义分区间
+        self._band_weights = np.array([
+            [0.40, 0.35, 0.20, 0.05],   # 语义匹配较差时，更多依赖结构和模式
+            self._base_weights,         # 语义中等匹配时，使用基础权重
+            [0.70, 0.15, 0.10, 0.05],   # 语义较好匹配时，适度提升语义权重
+            [0.80, 0.10, 0.05, 0.05],   # 语义高度匹配时，大幅提升语义权重
+        ], dtype=np.float64)
 
     def fuse_and_rank(self, semantic_results: List[RetrievalResult],
                      structural_results: List[RetrievalResult],
-                     pattern_results: List[RetrievalResult]) -> List[RetrievalResult]:
-        """融合多个检索结果并排序"""
-
-        # 1. 收集所有唯一的QA对
-        all_qa_pairs = {}
-
-        # 处理语义检索结果
-        for result in semantic_results:
-            qa_id = result.qa_pair.id
-            if qa_id not in all_qa_pairs:
-                all_qa_pairs[qa_id] = result
-            else:
-                all_qa_pairs[qa_id].semantic_score = max(
-                    all_qa_pairs[qa_id].semantic_score, result.semantic_score
-                )
-
-        # 处理结构检索结果
-        for result in structural_results:
-            qa_id = result.qa_pair.id
-            if qa_id not in all_qa_pairs:
-                all_qa_pairs[qa_id] = result
-            else:
-                all_qa_pairs[qa_id].structural_score = max(
-                    all_qa_pairs[qa_id].structural_score, result.structural_score
-                )
-
-        # 处理模式检索结果
-        for result in pattern_results:
-            qa_id = result.qa_pair.id
-            if qa_id not in all_qa_pairs:
-                all_qa_pairs[qa_id] = result
-            else:
-                all_qa_pairs[qa_id].pattern_score = max(
-                    all_qa_pairs[qa_id].pattern_score, result.pattern_score
-                )
-
-        # 2. 计算质量分数和最终分数
-        final_results = []
-        for qa_id, result in all_qa_pairs.items():
-            # 计算质量分数
-            quality_score = self._calculate_quality_score(result.qa_pair)
-            result.quality_score = quality_score
-
-            # 计算最终分数 - 使用动态权重调整
-            final_score = self._calculate_dynamic_final_score(
-                result.semantic_score,
-                result.structural_score,
-                result.pattern_score,
-                quality_score
-            )
-            result.final_score = final_score
+                     pattern_results: List[RetrievalResult],
+                     top_k: Optional[int] = None) -> List[RetrievalResult]:
+        """融合多个检索结果并排序，top_k为None时返回全部"""
+        # 1. 按QA id去重，记录每个id的下标；同一id取各路分数的最大值
+        index: Dict[str, int] = {}
+        results: List[RetrievalResult] = []
+        rows: List[int] = []
+        branch_scores: List[Tuple[float, float, float]] = []
+        branch_of: List[int] = []
+        for branch, branch_results in enumerate((semantic_results, structural_results, pattern_results)):
+            for result in branch_results:
+                qa_id = result.qa_pair.id
+                idx = index.get(qa_id)
+                if idx is None:
+                    idx = index[qa_id] = len(results)
+                    results.append(result)
+                rows.append(idx)
+                branch_of.append(branch)
+                branch_scores.append((result.semantic_score, result.structural_score, result.pattern_score))
+
+        n = len(results)
+        if n == 0:
+            return []
+        rows_arr = np.asarray(rows, dtype=np.intp)
+        scores = np.zeros((n, 3), dtype=np.float64)
+        np.maximum.at(scores, rows_arr, np.asarray(branch_scores, dtype=np.float64))
+
+        # 2. 质量分数与最终分数
+        quality = self._quality_scores(results)
+        if self.mode == "rrf":
+            final = self._rrf_scores(scores, quality, rows_arr, np.asarray(branch_of, dtype=np.intp))
+        else:
+            features = np.column_stack([scores, quality])
+            bands = np.searchsorted(self._SEMANTIC_BANDS, scores[:, 0], side="right")
+            final = (features * self._band_weights[bands]).sum(axis=1)
 
-            # 生成解释
+        # 3. top-k：先argpartition再对前k个排序
+        k = n if top_k is None else min(top_k, n)
+        if k <= 0:
+            return []
+        order = np.argpartition(-final, k - 1)[:k] if k < n else np.arange(n)
+        order = order[np.argsort(-final[order], kind="stable")]
+
+        ranked = []
+        for idx in order:
+            result = results[idx]
+            result.semantic_score, result.structural_score, result.pattern_score = (float(v) for v in scores[idx])
+            result.quality_score = float(quality[idx])
+            result.final_score = float(final[idx])
             result.explanation = self._generate_explanation(result)
-
-            final_results.append(result)
-
-        # 3. 按最终分数排序
-        return sorted(final_results, key=lambda x: x.final_score, reverse=True)
-
-    def _calculate_quality_score(self, qa_pair: QAPairWithContext) -> float:
-        """计算问答对的质量分数"""
-        quality_score = 0.0
-
-        # 验证状态加分
-        if qa_pair.verified:
-            quality_score += 0.3
-
-        # 成功率加分
-        quality_score += qa_pair.success_rate * 0.5
-
-        # 难度适中加分（难度2-3的问答对通常质量较高）
-        if 2 <= qa_pair.difficulty_level <= 3:
-            quality_score += 0.2
-
-        return min(1.0, quality_score)
-
-    def _calculate_dynamic_final_score(self, semantic_score: float, structural_score: float,
-                                     pattern_score: float, quality_score: float) -> float:
+            ranked.append(result)
+        return ranked
+
+    @staticmethod
+    def _quality_scores(results: List[RetrievalResult]) -> np.ndarray:
+        """问答对质量分数：已验证+0.3，成功率*0.5，难度2-3加0.2，上限1"""
+        verified = np.fromiter((r.qa_pair.verified for r in results), dtype=np.float64, count=len(results))
+        success = np.fromiter((r.qa_pair.success_rate for r in results), dtype=np.float64, count=len(results))
+        difficulty = np.fromiter((r.qa_pair.difficulty_level for r in results), dtype=np.float64,
+                                 count=len(results))
+        quality = 0.3 * verified + 0.5 * success + 0.2 * ((difficulty >= 2) & (difficulty <= 3))
+        return np.minimum(1.0, quality)
+
+    def _rrf_scores(self, scores: np.ndarray, quality: np.ndarray, rows: np.ndarray,
+                    branches: np.ndarray) -> np.ndarray:
         """
-        动态权重计算最终分数
-        当语义相似度很高时，增加其权重；当语义相似度较低时，更多依赖结构和模式匹配
+        倒数排名融合：sum(w / (k + rank))，rank为候选在各路结果中按该路分数的排名（从1开始），
+        未出现在某路结果中的候选该路不计分；质量分作为覆盖全部候选的第四路排名
         """
-        # 基础权重
-        base_weights = {
-            'semantic': self.weights['semantic'],
-            'structural': self.weights['structural'],
-            'pattern': self.weights['pattern'],
-            'quality': self.weights['quality']
-        }
-
-        # 动态调整权重
-        if semantic_score >= 0.9:
-            # 语义高度匹配时，大幅提升语义权重
-            adjusted_weights = {
-                'semantic': 0.80,
-                'structural': 0.10,
-                'pattern': 0.05,
-                'quality': 0.05
-            }
-        elif semantic_score >= 0.7:
-            # 语义较好匹配时，适度提升语义权重
-            adjusted_weights = {
-                'semantic': 0.70,
-                'structural': 0.15,
-                'pattern': 0.10,
-                'quality': 0.05
-            }
-        elif semantic_score >= 0.5:
-            # 语义中等匹配时，使用调整后的基础权重
-            adjusted_weights = base_weights
-        else:
-            # 语义匹配较差时，更多依赖结构和模式
-            adjusted_weights = {
-                'semantic': 0.40,
-                'structural': 0.35,
-                'pattern': 0.20,
-                'quality': 0.05
-            }
-
-        # 计算最终分数
-        final_score = (
-            semantic_score * adjusted_weights['semantic'] +
-            structural_score * adjusted_weights['structural'] +
-            pattern_score * adjusted_weights['pattern'] +
-            quality_score * adjusted_weights['quality']
-        )
-
-        return final_score
+        final = np.zeros(len(scores), dtype=np.float64)
+        for branch in range(3):
+            members = np.unique(rows[branches == branch])
+            if not len(members):
+                continue
+            order = members[np.argsort(-scores[members, branch], kind="stable")]
+            final[order] += self._base_weights[branch] / (self.rrf_k + np.arange(1, len(order) + 1))
+        quality_order = np.argsort(-quality, kind="stable")
+        final[quality_order] += self._base_weights[3] / (self.rrf_k + np.arange(1, len(quality_order) + 1))
+        return final
 
     def _generate_explanation(self, result: RetrievalResult) -> str:
         """生成推荐解释"""
@@ -1141,6 +1407,55 @@ class FusionRanker:
 
         return "; ".join(explanations) if explanations else "相关示例"
 
+# ===== 检索分支指标 =====
+
+class RetrievalBranchMetrics:
+    """混合检索各分支的耗时、超时和失败统计（最近window次调用的延迟分位数）"""
+
+    BRANCHES = ("semantic", "structural", "pattern")
+
+    def __init__(self, window: int = 1000):
+        self._latencies = {name: deque(maxlen=window) for name in self.BRANCHES}
+        self._calls = {name: 0 for name in self.BRANCHES}
+        self._timeouts = {name: 0 for name in self.BRANCHES}
+        self._errors = {name: 0 for name in self.BRANCHES}
+        self.requests = 0
+        self.partial_requests = 0
+
+    def record(self, branch: str, seconds: float, timed_out: bool = False, failed: bool = False):
+        self._calls[branch] += 1
+        self._latencies[branch].append(seconds * 1000)
+        if timed_out:
+            self._timeouts[branch] += 1
+        if failed:
+            self._errors[branch] += 1
+
+    def record_request(self, partial: bool):
+        self.requests += 1
+        if partial:
+            self.partial_requests += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        branches = {}
+        for name in self.BRANCHES:
+            samples = np.fromiter(self._latencies[name], dtype=np.float64)
+            calls = self._calls[name]
+            branches[name] = {
+                "calls": calls,
+                "timeouts": self._timeouts[name],
+                "errors": self._errors[name],
+                "timeout_rate": round(self._timeouts[name] / calls, 4) if calls else 0.0,
+                "p50_ms": round(float(np.percentile(samples, 50)), 2) if samples.size else 0.0,
+                "p95_ms": round(float(np.percentile(samples, 95)), 2) if samples.size else 0.0,
+                "p99_ms": round(float(np.percentile(samples, 99)), 2) if samples.size else 0.0,
+            }
+        return {
+            "requests": self.requests,
+            "partial_requests": self.partial_requests,
+            "partial_rate": round(self.partial_requests / self.requests, 4) if self.requests else 0.0,
+            "branches": branches
+        }
+
 # ===== 混合检索引擎 =====
 
 class HybridRetrievalEngine:
@@ -1152,6 +1467,8 @@ class HybridRetrievalEngine:
         self.milvus_service = MilvusService(connection_id=connection_id)
         self.neo4j_service = EnhancedNeo4jService()
         self.fusion_ranker = FusionRanker()
+        self.branch_metrics = RetrievalBranchMetrics()
+        self.result_cache = get_retrieval_cache()
         self.monitor = None
         self._initialized = False
         self._milvus_services = {}  # 缓存不同连接的MilvusService实例
@@ -1184,8 +1501,10 @@ class HybridRetrievalEngine:
 
     async def get_milvus_service_for_connection(self, connection_id: int) -> MilvusService:
         """根据连接ID获取或创建对应的MilvusService实例"""
+        if connection_id == self.connection_id and self._initialized:
+            return self.milvus_service
         if connection_id not in self._milvus_services:
-            # 创建新的MilvusService实例
+            # 创建新的MilvusService实例（底层客户端按URI共享）
             milvus_service = MilvusService(connection_id=connection_id)
             await milvus_service.initialize(self.vector_service.dimension)
             self._milvus_services[connection_id] = milvus_service
@@ -1195,76 +1514,127 @@ class HybridRetrievalEngine:
 
     async def hybrid_retrieve(self, query: str, schema_context: Dict[str, Any],
                             connection_id: int, top_k: int = 5) -> List[RetrievalResult]:
-        """混合检索主函数"""
+        """混合检索主函数，相同问题命中结果缓存时直接返回"""
+        cache_key, cached = self.result_cache.get(query, connection_id, schema_context, top_k)
+        if cached is not None:
+            return cached
+
         if not self._initialized:
             await self.initialize()
 
         try:
-            # 并行执行多种检索
-            if settings.PARALLEL_RETRIEVAL:
-                semantic_task = self._semantic_search(query, connection_id)
-                structural_task = self._structural_search(schema_context, connection_id)
-                pattern_task = self._pattern_search(query, connection_id)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.RETRIEVAL_DEADLINE_MS / 1000
+            branch_timeouts = {
+                "semantic": settings.SEMANTIC_TIMEOUT_MS / 1000,
+                "structural": settings.STRUCTURAL_TIMEOUT_MS / 1000,
+                "pattern": settings.PATTERN_TIMEOUT_MS / 1000,
+            }
 
-                # 等待所有检索完成
-                semantic_results, structural_results, pattern_results = await asyncio.gather(
-                    semantic_task, structural_task, pattern_task, return_exceptions=True
-                )
+            def branch_coroutine(name: str, timeout: float):
+                if name == "semantic":
+                    return self._semantic_search(query, connection_id)
+                if name == "structural":
+                    return self._structural_search(schema_context, connection_id, timeout=timeout)
+                return self._pattern_search(query, connection_id, timeout=timeout)
 
-                # 处理异常结果
-                semantic_results = semantic_results if not isinstance(semantic_results, Exception) else []
-                structural_results = structural_results if not isinstance(structural_results, Exception) else []
-                pattern_results = pattern_results if not isinstance(pattern_results, Exception) else []
+            # 各分支超时取 min(分支超时, 剩余总预算)；超时的分支返回空结果，融合只使用已到达的结果
+            if settings.PARALLEL_RETRIEVAL:
+                budget = max(0.0, deadline - loop.time())
+                timeouts = {name: min(t, budget) for name, t in branch_timeouts.items()}
+                semantic_results, structural_results, pattern_results = await asyncio.gather(*[
+                    self._run_branch(name, branch_coroutine(name, timeout), timeout)
+                    for name, timeout in timeouts.items()
+                ])
             else:
-                # 串行执行
-                # 从向量数据库检索样本案例数据
-                semantic_results = await self._semantic_search(query, connection_id)
-                structural_results = await self._structural_search(schema_context, connection_id)
-                pattern_results = await self._pattern_search(query, connection_id)
-
-            # 融合排序
-            final_results = self.fusion_ranker.fuse_and_rank(
-                semantic_results, structural_results, pattern_results
+                # 串行执行，后面的分支只能使用剩余预算
+                branch_results = []
+                for name, branch_timeout in branch_timeouts.items():
+                    timeout = min(branch_timeout, max(0.0, deadline - loop.time()))
+                    branch_results.append(await self._run_branch(name, branch_coroutine(name, timeout), timeout))
+                semantic_results, structural_results, pattern_results = branch_results
+            partial = self._is_partial(semantic_results, structural_results, pattern_results)
+            self.branch_metrics.record_request(partial=partial)
+
+            # 融合排序（启用MMR时多取候选再做多样化选择）
+            fetch_k = top_k * max(1, settings.MMR_FETCH_FACTOR) if settings.MMR_ENABLED else top_k
+            results = self.fusion_ranker.fuse_and_rank(
+                semantic_results or [], structural_results or [], pattern_results or [], top_k=fetch_k
             )
-
-            return final_results[:top_k]
+            if settings.MMR_ENABLED:
+                results = await self._diversify(results, top_k)
+            # 有分支超时或失败的部分结果不缓存
+            if not partial:
+                self.result_cache.set(cache_key, results)
+            return results
 
         except Exception as e:
             logger.error(f"Error in hybrid retrieval: {str(e)}")
             return []
 
-    async def _semantic_search(self, query: str, connection_id: int) -> List[RetrievalResult]:
-        """语义检索"""
+    async def _diversify(self, results: List[RetrievalResult], top_k: int) -> List[RetrievalResult]:
+        """按问题向量做MMR选择，去掉近似重复的示例；向量化失败时退回按分数截断"""
+        if len(results) <= 1:
+            return results[:top_k]
         try:
-            # 使用监控的向量化查询
-            if self.monitor:
-                query_vector = await self.monitor.embed_with_monitoring(query)
-            else:
-                query_vector = await self.vector_service.embed_question(query)
+            embeddings = await self.vector_service.batch_embed([r.qa_pair.question for r in results])
+        except Exception as e:
+            logger.warning(f"MMR embedding failed, falling back to score order: {str(e)}")
+            return results[:top_k]
+        relevance = np.fromiter((r.final_score for r in results), dtype=np.float32, count=len(results))
+        # 分数归一化到[0, 1]，与余弦相似度同一量纲（RRF分数远小于1）
+        if relevance.max() > 0:
+            relevance = relevance / relevance.max()
+        selected = mmr_select(embeddings, relevance, top_k, settings.MMR_LAMBDA, settings.MMR_DUPLICATE_THRESHOLD)
+        return [results[i] for i in selected]
+
+    async def _run_branch(self, name: str, coroutine: Awaitable[List[RetrievalResult]],
+                          timeout: float) -> Optional[List[RetrievalResult]]:
+        """执行单个检索分支并记录耗时；超时或出错返回None（融合时按空结果处理）"""
+        start = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(coroutine, timeout=timeout)
+            self.branch_metrics.record(name, time.perf_counter() - start)
+            return results
+        except asyncio.TimeoutError:
+            self.branch_metrics.record(name, time.perf_counter() - start, timed_out=True)
+            logger.warning(f"{name} retrieval exceeded its deadline ({timeout * 1000:.0f}ms), using partial results")
+        except Exception as e:
+            self.branch_metrics.record(name, time.perf_counter() - start, failed=True)
+            logger.error(f"Error in {name} retrieval: {str(e)}")
+        return None
 
-            # 获取对应连接的Milvus服务
-            milvus_service = await self.get_milvus_service_for_connection(connection_id)
+    @staticmethod
+    def _is_partial(*branch_results: Optional[List[RetrievalResult]]) -> bool:
+        return any(results is None for results in branch_results)
 
-            # Milvus检索
-            milvus_results = await milvus_service.search_similar(
-                query_vector, top_k=5, connection_id=connection_id
-            )
+    async def _semantic_search(self, query: str, connection_id: int) -> List[RetrievalResult]:
+        """语义检索（出错时抛出异常，由_run_branch记为失败分支）"""
+        # 使用监控的向量化查询
+        if self.monitor:
+            query_vector = await self.monitor.embed_with_monitoring(query)
+        else:
+            query_vector = await self.vector_service.embed_question(query)
 
-            # 转换为RetrievalResult
-            results = []
-            for result in milvus_results:
-                qa_pair = self._build_qa_pair_from_milvus_result(result)
-                results.append(RetrievalResult(
-                    qa_pair=qa_pair,
-                    semantic_score=result['similarity_score'],
-                    explanation=f"语义相似度: {result['similarity_score']:.3f}"
-                ))
+        # 获取对应连接的Milvus服务
+        milvus_service = await self.get_milvus_service_for_connection(connection_id)
 
-            return results
+        # Milvus检索
+        milvus_results = await milvus_service.search_similar(
+            query_vector, top_k=5, connection_id=connection_id
+        )
 
-        except Exception as e:
-            logger.error(f"Error in semantic search: {str(e)}")
-            return []
+        # 转换为RetrievalResult
+        results = []
+        for result in milvus_results:
+            qa_pair = self._build_qa_pair_from_milvus_result(result)
+            results.append(RetrievalResult(
+                qa_pair=qa_pair,
+                semantic_score=result['similarity_score'],
+                explanation=f"语义相似度: {result['similarity_score']:.3f}"
+            ))
+
+        return results
 
     def _build_qa_pair_from_milvus_result(self, result: Dict) -> QAPairWithContext:
         """从Milvus结果构建QAPair对象"""
@@ -1285,29 +1655,22 @@ class HybridRetrievalEngine:
         )
 
     async def _structural_search(self, schema_context: Dict[str, Any],
-                               connection_id: int) -> List[RetrievalResult]:
-        """结构检索"""
-        try:
-            return await self.neo4j_service.structural_search(
-                schema_context, connection_id, top_k=20
-            )
-        except Exception as e:
-            logger.error(f"Error in structural search: {str(e)}")
-            return []
+                               connection_id: int, timeout: Optional[float] = None) -> List[RetrievalResult]:
+        """结构检索（出错时抛出异常，由_run_branch记为失败分支）"""
+        return await self.neo4j_service.structural_search(
+            schema_context, connection_id, top_k=20, timeout=timeout
+        )
 
-    async def _pattern_search(self, query: str, connection_id: int) -> List[RetrievalResult]:
-        """模式检索"""
-        try:
-            # 简单的查询类型识别
-            query_type = self._classify_query_type(query)
-            difficulty_level = self._estimate_difficulty(query)
+    async def _pattern_search(self, query: str, connection_id: int,
+                              timeout: Optional[float] = None) -> List[RetrievalResult]:
+        """模式检索（出错时抛出异常，由_run_branch记为失败分支）"""
+        # 简单的查询类型识别
+        query_type = self._classify_query_type(query)
+        difficulty_level = self._estimate_difficulty(query)
 
-            return await self.neo4j_service.pattern_search(
-                query_type, difficulty_level, connection_id, top_k=20
-            )
-        except Exception as e:
-            logger.error(f"Error in pattern search: {str(e)}")
-            return []
+        return await self.neo4j_service.pattern_search(
+            query_type, difficulty_level, connection_id, top_k=20, timeout=timeout
+        )
 
     def _classify_query_type(self, query: str) -> str:
         """分类查询类型"""
@@ -1347,7 +1710,7 @@ class HybridRetrievalEngine:
 
         try:
             # 向量化问题
-            if not qa_pair.embedding_vector:
+            if qa_pair.embedding_vector is None:
                 qa_pair.embedding_vector = await self.vector_service.embed_question(qa_pair.question)
 
             # 存储到Neo4j
@@ -1356,6 +1719,7 @@ class HybridRetrievalEngine:
             # 获取对应连接的Milvus服务并存储
             milvus_service = await self.get_milvus_service_for_connection(qa_pair.connection_id)
             await milvus_service.insert_qa_pair(qa_pair)
+            self.result_cache.invalidate_connection(qa_pair.connection_id)
 
             logger.info(f"Successfully stored QA pair: {qa_pair.id}")
 
@@ -1363,12 +1727,38 @@ class HybridRetrievalEngine:
             logger.error(f"Failed to store QA pair: {str(e)}")
             raise
 
+    async def delete_qa_pair(self, qa_id: str, connection_id: Optional[int] = None) -> bool:
+        """从Neo4j和Milvus删除问答对，返回是否找到该问答对"""
+        if not self._initialized:
+            await self.initialize()
+
+        try:
+            stored_connection_id = await self.neo4j_service.delete_qa_pair(qa_id)
+            connection_id = stored_connection_id if stored_connection_id is not None else connection_id
+            if connection_id is None:
+                logger.warning(f"QA pair not found: {qa_id}")
+                return False
+
+            milvus_service = await self.get_milvus_service_for_connection(connection_id)
+            await milvus_service.delete_qa_pair(qa_id)
+            self.result_cache.invalidate_connection(connection_id)
+
+            logger.info(f"Successfully deleted QA pair: {qa_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to delete QA pair: {str(e)}")
+            raise
+
     async def get_service_status(self) -> Dict[str, Any]:
         """获取服务状态"""
         status = {
             "initialized": self._initialized,
             "vector_service": None,
-            "milvus_service": {"initialized": self.milvus_service._initialized},
+            "milvus_service": {"initialized": self.milvus_service._initialized,
+                               "client_pool": get_client_pool().stats(),
+                               "collections": get_load_manager().stats(),
+                               "local_index": get_local_qa_indexes().stats()},
             "neo4j_service": {"initialized": self.neo4j_service._initialized}
         }
 
@@ -1378,12 +1768,16 @@ class HybridRetrievalEngine:
         if self.monitor:
             status["monitoring_metrics"] = self.monitor.get_metrics()
 
+        status["retrieval_branches"] = self.branch_metrics.get_metrics()
+        status["result_cache"] = self.result_cache.stats()
+
         return status
 
     async def clear_caches(self):
         """清理所有缓存"""
         if self.vector_service:
             self.vector_service.clear_cache()
+        self.result_cache.clear()
         logger.info("All caches cleared")
 
     def close(self):
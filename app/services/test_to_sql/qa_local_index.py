@@ -0,0 +1,426 @@
+"""
+问答对本地向量索引模块
+在进程内按连接维护问答对向量的副本：数据量小时用numpy暴力检索，超过阈值且安装了hnswlib时使用HNSW。
+小租户直接在本地检索，省去一次Milvus网络往返；Milvus不可用或超时时作为语义检索的降级方案。
+索引随本进程的问答对写入/删除同步更新，并每隔refresh_interval秒在后台按id集合与Milvus核对
+（其他进程、脚本或迁移的写入/删除在一个核对周期内可见）；超过核对间隔未核对成功的索引只用于降级。
+所有连接的索引共享一个内存上限（max_bytes），超出时按LRU淘汰最久未使用的连接，下次使用时重新加载。
+应用关闭时保存快照，下次启动从快照恢复后同样先与Milvus核对
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.core.milvus_processor.client_pool import get_milvus_client
+from app.utils.lru_cache import LRUTTLCache
+from app.utils.vector_utils import as_float32_matrix, as_float32_vector, normalize, normalize_rows
+
+try:
+    import hnswlib
+except ImportError:  # 未安装时只使用暴力检索
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# 与Milvus集合中问答对的标量字段一致
+QA_FIELDS = ["id", "question", "sql", "connection_id", "difficulty_level", "query_type", "success_rate", "verified"]
+# 核对时按id补拉缺失行的批大小
+_FETCH_BATCH = 500
+
+
+class LocalQAIndex:
+    """单个连接的问答对本地向量索引（向量按行归一化，相似度为余弦）"""
+
+    def __init__(self, dimension: int, hnsw_threshold: int = 5000, hnsw_m: int = 16,
+                 ef_construction: int = 200, ef: int = 64):
+        self.dimension = dimension
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._rows: List[Optional[Dict[str, Any]]] = []
+        self._live = np.empty(0, dtype=bool)
+        self._slots: Dict[str, int] = {}
+        self._hnsw = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def ids(self) -> set:
+        with self._lock:
+            return set(self._slots)
+
+    @property
+    def uses_hnsw(self) -> bool:
+        return self._hnsw is not None
+
+    @property
+    def nbytes(self) -> int:
+        """估算占用内存：向量矩阵（含预留容量）、HNSW图中的向量和邻接表、问题与SQL文本"""
+        with self._lock:
+            total = self._vectors.nbytes + self._live.nbytes
+            if self._hnsw is not None:
+                total += self._hnsw.get_max_elements() * (4 * self.dimension + 8 * self.hnsw_m)
+            total += sum(len(row["question"] or "") + len(row["sql"] or "") for row in self._rows if row)
+            return total
+
+    def _reserve(self, extra: int) -> None:
+        """按倍数扩容向量矩阵，避免每次写入都复制"""
+        needed = len(self._rows) + extra
+        if needed <= len(self._vectors):
+            return
+        capacity = max(needed, 2 * len(self._vectors), 64)
+        vectors = np.empty((capacity, self.dimension), dtype=np.float32)
+        vectors[:len(self._rows)] = self._vectors[:len(self._rows)]
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._rows)] = self._live[:len(self._rows)]
+        self._vectors, self._live = vectors, live
+
+    def add(self, rows: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        """写入问答对（id已存在时覆盖）"""
+        if not rows:
+            return
+        vectors = normalize_rows(as_float32_matrix(vectors, self.dimension))
+        with self._lock:
+            for row in rows:
+                self._remove_locked(row["id"])
+            self._reserve(len(rows))
+            start = len(self._rows)
+            slots = np.arange(start, start + len(rows))
+            self._vectors[slots] = vectors
+            self._live[slots] = True
+            for slot, row in zip(slots, rows):
+                self._rows.append({name: row.get(name) for name in QA_FIELDS})
+                self._slots[row["id"]] = int(slot)
+            if self._hnsw is not None:
+                self._hnsw_add(vectors, slots)
+            elif hnswlib is not None and len(self) >= self.hnsw_threshold:
+                self._build_hnsw()
+
+    def remove(self, qa_id: str) -> bool:
+        with self._lock:
+            removed = self._remove_locked(qa_id)
+            # 删除过半时压缩，回收空间并重建HNSW
+            if removed and len(self._rows) > 64 and len(self) < len(self._rows) // 2:
+                self._compact()
+            return removed
+
+    def _remove_locked(self, qa_id: str) -> bool:
+        slot = self._slots.pop(qa_id, None)
+        if slot is None:
+            return False
+        self._live[slot] = False
+        self._rows[slot] = None
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(slot)
+        return True
+
+    def _compact(self) -> None:
+        slots = np.flatnonzero(self._live[:len(self._rows)])
+        rows = [self._rows[slot] for slot in slots]
+        vectors = self._vectors[slots].copy()
+        self._vectors = np.empty((0, self.dimension), dtype=np.float32)
+        self._rows, self._live, self._slots, self._hnsw = [], np.empty(0, dtype=bool), {}, None
+        self.add(rows, vectors)
+
+    def _build_hnsw(self) -> None:
+        count = len(self._rows)
+        self._hnsw = hnswlib.Index(space="ip", dim=self.dimension)
+        self._hnsw.init_index(max_elements=max(2 * count, 1024), ef_construction=self.ef_construction,
+                              M=self.hnsw_m)
+        self._hnsw.set_ef(self.ef)
+        slots = np.flatnonzero(self._live[:count])
+        self._hnsw_add(self._vectors[slots], slots)
+        logger.info(f"本地问答对索引切换为HNSW: {len(self)} 条")
+
+    def _hnsw_add(self, vectors: np.ndarray, slots: np.ndarray) -> None:
+        if len(self._rows) > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(2 * len(self._rows))
+        self._hnsw.add_items(vectors, slots)
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5) -> List[Dict]:
+        """返回与MilvusService.search_similar相同格式的结果"""
+        query = normalize(as_float32_vector(query_vector))
+        with self._lock:
+            count = len(self)
+            if count == 0:
+                return []
+            k = min(top_k, count)
+            if self._hnsw is not None:
+                self._hnsw.set_ef(max(self.ef, k))
+                labels, distances = self._hnsw.knn_query(query, k=k)
+                slots, scores = labels[0], 1.0 - distances[0]
+            else:
+                # 暴力检索：一次矩阵乘法 + argpartition取top-k
+                scores = self._vectors[:len(self._rows)] @ query
+                scores[~self._live[:len(self._rows)]] = -np.inf
+                slots = np.argpartition(-scores, k - 1)[:k]
+                slots = slots[np.argsort(-scores[slots])]
+                scores = scores[slots]
+            return [dict(self._rows[slot], similarity_score=float(score)) for slot, score in zip(slots, scores)]
+
+    def save(self, path: Path) -> None:
+        """保存快照：向量存npy，标量字段存同名json"""
+        with self._lock:
+            slots = np.flatnonzero(self._live[:len(self._rows)])
+            rows = [self._rows[slot] for slot in slots]
+            vectors = self._vectors[slots]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path.with_suffix(".npy"), vectors)
+        with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "dimension": self.dimension, "saved_at": time.time()}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> Optional["LocalQAIndex"]:
+        vectors_path, rows_path = path.with_suffix(".npy"), path.with_suffix(".json")
+        if not vectors_path.exists() or not rows_path.exists():
+            return None
+        with open(rows_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dimension"], **kwargs)
+        index.add(meta["rows"], np.load(vectors_path))
+        return index
+
+
+class LocalQAIndexRegistry:
+    """
+    按 (集合, 连接) 管理本地索引：首次使用时从快照或Milvus加载，超过max_rows的连接不建本地索引；
+    每隔refresh_interval秒与Milvus核对一次，只有核对未过期的索引才用于小租户的本地检索。
+    已加载的索引总数不超过max_indexes、估算内存不超过max_bytes，超出时淘汰最久未使用的索引
+    """
+
+    def __init__(self, snapshot_dir: Optional[str], max_rows: int = 50000, small_tenant_threshold: int = 2000,
+                 hnsw_threshold: int = 5000, hnsw_m: int = 16, ef_construction: int = 200, ef: int = 64,
+                 refresh_interval: float = 30, max_indexes: int = 64, max_bytes: Optional[int] = None):
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.max_rows = max_rows
+        self.small_tenant_threshold = small_tenant_threshold
+        self.refresh_interval = refresh_interval
+        self._index_kwargs = {"hnsw_threshold": hnsw_threshold, "hnsw_m": hnsw_m,
+                              "ef_construction": ef_construction, "ef": ef}
+        self._indexes = LRUTTLCache(max_size=max_indexes, max_bytes=max_bytes, sizeof=lambda index: index.nbytes)
+        # 行数超过max_rows、不建本地索引的连接
+        self._oversized: set = set()
+        self._locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        self._loading: Dict[Tuple[str, int], asyncio.Task] = {}
+        # 最近一次核对成功/尝试核对的时间（monotonic）
+        self._verified_at: Dict[Tuple[str, int], float] = {}
+        self._checked_at: Dict[Tuple[str, int], float] = {}
+        self.local_searches = 0
+        self.fallback_searches = 0
+        self.refreshes = 0
+
+    def _snapshot_path(self, key: Tuple[str, int]) -> Optional[Path]:
+        if self.snapshot_dir is None:
+            return None
+        return self.snapshot_dir / f"{key[0]}_{key[1]}"
+
+    def get(self, collection_name: str, connection_id: int) -> Optional[LocalQAIndex]:
+        """已加载的索引，未加载时返回None"""
+        return self._indexes.get((collection_name, connection_id))
+
+    def is_small(self, index: Optional[LocalQAIndex]) -> bool:
+        return index is not None and len(index) <= self.small_tenant_threshold
+
+    def _is_fresh(self, key: Tuple[str, int]) -> bool:
+        verified_at = self._verified_at.get(key)
+        if verified_at is None or time.monotonic() - verified_at >= self.refresh_interval:
+            return False
+        # 核对后被LRU淘汰的索引需要重新加载
+        return key in self._indexes
+
+    def is_fresh(self, collection_name: str, connection_id: int) -> bool:
+        """索引在refresh_interval内与Milvus核对过（可以代替Milvus直接检索）"""
+        return self._is_fresh((collection_name, connection_id))
+
+    def schedule_load(self, collection_name: str, connection_id: int, uri: str, dimension: int) -> None:
+        """未加载或超过核对间隔时在后台加载/核对索引，不阻塞当前检索"""
+        key = (collection_name, connection_id)
+        if key in self._oversized or key in self._loading or self._is_fresh(key):
+            return
+        # 核对失败（如Milvus不可用）后同样等一个间隔再重试
+        checked_at = self._checked_at.get(key)
+        if checked_at is not None and time.monotonic() - checked_at < self.refresh_interval:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self.ensure_loaded(collection_name, connection_id, uri, dimension)
+        )
+        self._loading[key] = task
+        task.add_done_callback(lambda _: self._loading.pop(key, None))
+
+    async def ensure_loaded(self, collection_name: str, connection_id: int, uri: str,
+                            dimension: int) -> Optional[LocalQAIndex]:
+        """
+        加载并核对连接的本地索引：已加载的索引或快照与Milvus按id集合核对（删除多余行、补拉缺失行），
+        没有时从Milvus全量拉取；Milvus不可用时保留未核对的索引，只用于降级
+        """
+        key = (collection_name, connection_id)
+        if key in self._oversized or self._is_fresh(key):
+            return self._indexes.get(key)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key in self._oversized or self._is_fresh(key):
+                return self._indexes.get(key)
+            self._checked_at[key] = time.monotonic()
+            index = self._indexes.get(key)
+            first_load = index is None
+            if index is None:
+                index = await asyncio.to_thread(self._load_snapshot, key)
+            try:
+                synced = await asyncio.to_thread(self._sync_with_milvus, uri, collection_name, connection_id,
+                                                 dimension, index)
+            except Exception as e:
+                logger.warning(f"与Milvus核对本地问答对索引失败，索引只用于降级: {e}")
+                if index is not None:
+                    self._indexes.set(key, index)
+                return index
+            if synced is None:
+                self._indexes.pop(key, None)
+                self._oversized.add(key)
+                return None
+            # 重新写入以按核对后的大小更新内存占用，超出上限时淘汰其他连接的索引
+            self._indexes.set(key, synced)
+            self._verified_at[key] = time.monotonic()
+            self.refreshes += 1
+            if first_load:
+                logger.info(f"本地问答对索引已加载: {collection_name}, connection_id={connection_id}, "
+                            f"{len(synced)} 条, hnsw={synced.uses_hnsw}")
+            return synced
+
+    def _load_snapshot(self, key: Tuple[str, int]) -> Optional[LocalQAIndex]:
+        path = self._snapshot_path(key)
+        if path is None:
+            return None
+        try:
+            return LocalQAIndex.load(path, **self._index_kwargs)
+        except Exception as e:
+            logger.warning(f"读取本地问答对快照失败 {path}: {e}")
+            return None
+
+    def _sync_with_milvus(self, uri: str, collection_name: str, connection_id: int, dimension: int,
+                          index: Optional[LocalQAIndex]) -> Optional[LocalQAIndex]:
+        """
+        按id集合把索引与Milvus对齐：只扫描id列，删除Milvus中已不存在的行，按id批量补拉缺失行（含向量）
+        连接行数超过max_rows时返回None
+        """
+        client = get_milvus_client(uri)
+        filter_expr = f"connection_id == {int(connection_id)}"
+        milvus_ids = set()
+        iterator = client.query_iterator(collection_name=collection_name, filter=filter_expr,
+                                         output_fields=["id"], batch_size=1000)
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                milvus_ids.update(row["id"] for row in rows)
+                if len(milvus_ids) > self.max_rows:
+                    return None
+        finally:
+            iterator.close()
+
+        if index is None:
+            index = LocalQAIndex(dimension, **self._index_kwargs)
+        local_ids = index.ids()
+        for qa_id in local_ids - milvus_ids:
+            index.remove(qa_id)
+        missing = sorted(milvus_ids - local_ids)
+        for start in range(0, len(missing), _FETCH_BATCH):
+            batch = missing[start:start + _FETCH_BATCH]
+            rows = client.query(collection_name=collection_name, filter=f"id in {json.dumps(batch)}",
+                                output_fields=QA_FIELDS + ["vector"])
+            if rows:
+                index.add(rows, np.asarray([row["vector"] for row in rows], dtype=np.float32))
+        return index
+
+    def add(self, collection_name: str, connection_id: int, row: Dict[str, Any], vector: np.ndarray) -> None:
+        """问答对写入Milvus后同步到已加载的本地索引"""
+        index = self.get(collection_name, connection_id)
+        if index is not None:
+            index.add([row], vector)
+            key = (collection_name, connection_id)
+            if len(index) > self.max_rows:
+                self._indexes.pop(key, None)
+                self._oversized.add(key)
+            else:
+                self._indexes.set(key, index)
+
+    def remove(self, collection_name: str, qa_id: str) -> None:
+        for (name, _), index in self._indexes.items():
+            if name == collection_name:
+                index.remove(qa_id)
+
+    def save_all(self) -> None:
+        """保存所有已加载索引的快照（应用关闭时调用）"""
+        if self.snapshot_dir is None:
+            return
+        for key, index in self._indexes.items():
+            path = self._snapshot_path(key)
+            try:
+                index.save(path)
+            except Exception as e:
+                logger.warning(f"保存本地问答对快照失败 {path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.QA_LOCAL_INDEX_ENABLED,
+            "hnswlib_available": hnswlib is not None,
+            "indexes": [
+                {"collection": name, "connection_id": connection_id, "rows": len(index), "hnsw": index.uses_hnsw}
+                for (name, connection_id), index in self._indexes.items()
+            ],
+            "memory": {name: value for name, value in self._indexes.stats().items()
+                       if name in ("size", "max_size", "bytes", "max_bytes", "evictions")},
+            "oversized_connections": len(self._oversized),
+            "refresh_interval": self.refresh_interval,
+            "stale_indexes": sum(1 for key, _ in self._indexes.items() if not self._is_fresh(key)),
+            "refreshes": self.refreshes,
+            "local_searches": self.local_searches,
+            "fallback_searches": self.fallback_searches
+        }
+
+
+_registry: Optional[LocalQAIndexRegistry] = None
+
+
+def get_local_qa_indexes() -> LocalQAIndexRegistry:
+    """获取全局本地问答对索引注册表"""
+    global _registry
+    if _registry is None:
+        _registry = LocalQAIndexRegistry(
+            snapshot_dir=settings.QA_LOCAL_INDEX_SNAPSHOT_DIR,
+            max_rows=settings.QA_LOCAL_INDEX_MAX_ROWS,
+            small_tenant_threshold=settings.QA_LOCAL_INDEX_SMALL_TENANT_THRESHOLD,
+            hnsw_threshold=settings.QA_LOCAL_INDEX_HNSW_THRESHOLD,
+            hnsw_m=settings.QA_LOCAL_INDEX_HNSW_M,
+            ef_construction=settings.QA_LOCAL_INDEX_HNSW_EF_CONSTRUCTION,
+            ef=settings.QA_LOCAL_INDEX_HNSW_EF,
+            refresh_interval=settings.QA_LOCAL_INDEX_REFRESH_INTERVAL,
+            max_indexes=settings.QA_LOCAL_INDEX_MAX_INDEXES,
+            max_bytes=settings.QA_LOCAL_INDEX_MAX_BYTES
+        )
+    return _registry
+
+
+def save_local_qa_indexes() -> None:
+    """保存本地问答对索引快照"""
+    if _registry is not None:
+        _registry.save_all()
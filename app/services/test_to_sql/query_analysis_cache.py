@@ -0,0 +1,141 @@
+"""
+查询分析缓存模块
+按"规范化问题 + 连接ID"缓存LLM查询分析结果，可选地通过向量相似度命中同义改写的问题
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.utils.lru_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_PUNCTUATION = "?？。.!！;；,，"
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题：全半角统一、小写、合并空白、去掉结尾标点"""
+    text = unicodedata.normalize("NFKC", question or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION).strip()
+
+
+class QueryAnalysisCache:
+    """查询分析结果缓存"""
+
+    def __init__(self, max_size: int, ttl: float, semantic_enabled: bool = False,
+                 similarity_threshold: float = 0.95):
+        self._cache = LRUTTLCache(max_size=max_size, ttl=ttl)
+        self.semantic_enabled = semantic_enabled
+        self.similarity_threshold = similarity_threshold
+        self._max_vectors = max_size
+        # connection_id -> (缓存键列表, 归一化向量矩阵)
+        self._vectors: Dict[Any, Tuple[List[Tuple[Any, str]], np.ndarray]] = {}
+        self._vector_lock = threading.Lock()
+        self.semantic_hits = 0
+
+    @staticmethod
+    def make_key(question: str, connection_id: Optional[int]) -> Tuple[Any, str]:
+        return connection_id, normalize_question(question)
+
+    def get(self, question: str, connection_id: Optional[int] = None,
+            query_vector: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """精确匹配优先，其次在同一连接内按向量相似度查找"""
+        key = self.make_key(question, connection_id)
+        analysis = self._cache.get(key)
+        if analysis is not None:
+            return analysis
+        if query_vector is None:
+            return None
+
+        with self._vector_lock:
+            entry = self._vectors.get(connection_id)
+            if entry is None:
+                return None
+            keys, matrix = entry
+            similarities = matrix @ query_vector
+            best = int(np.argmax(similarities))
+            best_key, best_score = keys[best], float(similarities[best])
+        if best_score < self.similarity_threshold:
+            return None
+        analysis = self._cache.peek(best_key)
+        if analysis is not None:
+            with self._vector_lock:
+                self.semantic_hits += 1
+            logger.debug(f"查询分析缓存相似命中: score={best_score:.3f}, cached_question={best_key[1]}")
+        return analysis
+
+    def set(self, question: str, analysis: Dict[str, Any], connection_id: Optional[int] = None,
+            query_vector: Optional[np.ndarray] = None) -> None:
+        key = self.make_key(question, connection_id)
+        self._cache.set(key, analysis)
+        if query_vector is None:
+            return
+        with self._vector_lock:
+            keys, matrix = self._vectors.get(connection_id, ([], None))
+            if key in keys:
+                return
+            row = query_vector.reshape(1, -1).astype(np.float32)
+            matrix = row if matrix is None else np.vstack([matrix, row])
+            keys = keys + [key]
+            # 超出容量时丢弃最早写入的向量
+            if len(keys) > self._max_vectors:
+                keys = keys[-self._max_vectors:]
+                matrix = matrix[-self._max_vectors:]
+            self._vectors[connection_id] = (keys, matrix)
+
+    def clear(self, connection_id: Optional[int] = None) -> None:
+        """清空缓存；指定连接时只清理该连接的相似度索引"""
+        with self._vector_lock:
+            if connection_id is None:
+                self._vectors.clear()
+            else:
+                self._vectors.pop(connection_id, None)
+        if connection_id is None:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        with self._vector_lock:
+            stats["semantic_enabled"] = self.semantic_enabled
+            stats["semantic_hits"] = self.semantic_hits
+            stats["indexed_vectors"] = sum(len(keys) for keys, _ in self._vectors.values())
+        return stats
+
+
+_query_analysis_cache: Optional[QueryAnalysisCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_analysis_cache() -> QueryAnalysisCache:
+    """获取全局查询分析缓存"""
+    global _query_analysis_cache
+    if _query_analysis_cache is None:
+        with _cache_lock:
+            if _query_analysis_cache is None:
+                _query_analysis_cache = QueryAnalysisCache(
+                    max_size=settings.QUERY_ANALYSIS_CACHE_SIZE,
+                    ttl=settings.QUERY_ANALYSIS_CACHE_TTL,
+                    semantic_enabled=settings.QUERY_ANALYSIS_SEMANTIC_ENABLED,
+                    similarity_threshold=settings.QUERY_ANALYSIS_SIMILARITY_THRESHOLD
+                )
+    return _query_analysis_cache
+
+
+def get_query_analysis_cache_stats() -> Dict[str, Any]:
+    """获取查询分析缓存统计"""
+    return get_query_analysis_cache().stats()
@@ -0,0 +1,104 @@
+"""
+混合检索结果缓存模块
+按"规范化问题 + 连接ID + schema版本 + top_k"缓存hybrid_retrieve的融合结果；
+每个连接维护一个版本号，问答对增删时递增，旧版本的条目不再命中并随LRU淘汰
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import threading
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.services.test_to_sql.query_analysis_cache import normalize_question
+from app.utils.lru_cache import LRUTTLCache
+
+
+def schema_cache_token(schema_context: Optional[Dict[str, Any]]) -> Hashable:
+    """schema上下文的缓存标识：优先使用schema_version，没有时退化为参与检索的表名集合"""
+    schema_context = schema_context or {}
+    version = schema_context.get("schema_version")
+    if version is not None:
+        return version
+    return tuple(sorted(str(table.get("name")) for table in schema_context.get("tables", [])))
+
+
+class RetrievalResultCache:
+    """混合检索结果缓存"""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, enabled: bool = True):
+        self._cache = LRUTTLCache(max_size=max_size, ttl=ttl)
+        self.enabled = enabled
+        # connection_id -> 问答对数据版本号
+        self._generations: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def _generation(self, connection_id: Any) -> int:
+        with self._lock:
+            return self._generations.get(connection_id, 0)
+
+    def make_key(self, question: str, connection_id: Any, schema_context: Optional[Dict[str, Any]],
+                 top_k: int) -> Tuple[Any, ...]:
+        return (connection_id, self._generation(connection_id), schema_cache_token(schema_context),
+                top_k, normalize_question(question))
+
+    def get(self, question: str, connection_id: Any, schema_context: Optional[Dict[str, Any]],
+            top_k: int) -> Tuple[Optional[Tuple[Any, ...]], Optional[List[Any]]]:
+        """
+        返回 (缓存键, 缓存结果)，未命中时结果为None
+        缓存键在检索前生成（含当时的数据版本号），检索完成后用同一个键写入：
+        检索期间问答对增删导致版本号递增时，旧结果写入旧版本的键，不会被新版本命中
+        """
+        if not self.enabled:
+            return None, None
+        key = self.make_key(question, connection_id, schema_context, top_k)
+        results = self._cache.get(key)
+        # 返回列表副本，调用方增删元素不影响缓存
+        return key, (list(results) if results is not None else None)
+
+    def set(self, key: Optional[Tuple[Any, ...]], results: List[Any]) -> None:
+        """用get()返回的缓存键写入结果"""
+        if not self.enabled or key is None:
+            return
+        self._cache.set(key, tuple(results))
+
+    def invalidate_connection(self, connection_id: Any) -> None:
+        """连接的问答对发生增删时调用，该连接已缓存的结果全部失效"""
+        with self._lock:
+            self._generations[connection_id] = self._generations.get(connection_id, 0) + 1
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        with self._lock:
+            stats["enabled"] = self.enabled
+            stats["invalidations"] = self.invalidations
+        return stats
+
+
+_retrieval_cache: Optional[RetrievalResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalResultCache:
+    """获取全局混合检索结果缓存（各引擎实例共享，保证失效对所有实例可见）"""
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        with _cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalResultCache(
+                    max_size=settings.RETRIEVAL_CACHE_SIZE,
+                    ttl=settings.RETRIEVAL_CACHE_TTL,
+                    enabled=settings.RETRIEVAL_CACHE_ENABLED
+                )
+    return _retrieval_cache
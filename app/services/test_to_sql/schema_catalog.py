@@ -0,0 +1,267 @@
+"""
+表结构目录缓存模块
+按连接在进程内缓存表、列、关系元数据，并建立按ID/名称的索引，供表结构检索和提示构建使用
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SchemaCatalog:
+    """单个连接的表结构目录"""
+    connection_id: int
+    version: int
+    fingerprint: str
+    tables: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    columns: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    relationships: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    table_columns: Dict[int, List[int]] = field(default_factory=dict)
+    table_name_index: Dict[str, int] = field(default_factory=dict)
+    column_name_index: Dict[str, List[int]] = field(default_factory=dict)
+    column_search_text: Dict[int, Tuple[str, str]] = field(default_factory=dict)
+    outgoing: Dict[int, List[int]] = field(default_factory=dict)
+    incoming: Dict[int, List[int]] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def table_count(self) -> int:
+        return len(self.tables)
+
+    def table_list(self) -> List[Dict[str, Any]]:
+        """按ID顺序返回所有表"""
+        return [self.tables[tid] for tid in sorted(self.tables)]
+
+    def get_table(self, table_id: int) -> Optional[Dict[str, Any]]:
+        return self.tables.get(table_id)
+
+    def get_table_by_name(self, table_name: str) -> Optional[Dict[str, Any]]:
+        table_id = self.table_name_index.get(table_name.lower())
+        return self.tables.get(table_id) if table_id is not None else None
+
+    def get_column(self, column_id: int) -> Optional[Dict[str, Any]]:
+        return self.columns.get(column_id)
+
+    def columns_for_tables(self, table_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """按给定表顺序返回这些表的全部列"""
+        result = []
+        for table_id in table_ids:
+            for column_id in self.table_columns.get(table_id, []):
+                result.append(self.columns[column_id])
+        return result
+
+    def search_columns(self, keyword: str) -> List[Dict[str, Any]]:
+        """查找名称或描述中包含关键词的列（不区分大小写）"""
+        keyword = (keyword or "").lower()
+        if not keyword:
+            return []
+        return [
+            self.columns[column_id]
+            for column_id, (name_lower, description_lower) in self.column_search_text.items()
+            if keyword in name_lower or keyword in description_lower
+        ]
+
+    def expand_foreign_keys(self, table_ids: Iterable[int]) -> List[Tuple[int, int]]:
+        """
+        沿外键向外扩展1跳
+        返回(目标表ID, 源表ID)列表，不包含已在集合中的表
+        """
+        table_id_set = set(table_ids)
+        expanded = []
+        for source_table_id in table_id_set:
+            for rel_id in self.outgoing.get(source_table_id, []):
+                target_table_id = self.relationships[rel_id]["target_table_id"]
+                if target_table_id not in table_id_set:
+                    expanded.append((target_table_id, source_table_id))
+        return expanded
+
+    def relationships_between(self, table_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """返回两端都在给定表集合中的关系"""
+        table_id_set = set(table_ids)
+        result = []
+        for table_id in table_id_set:
+            for rel_id in self.outgoing.get(table_id, []):
+                rel = self.relationships[rel_id]
+                if rel["target_table_id"] in table_id_set:
+                    result.append(rel)
+        result.sort(key=lambda r: r["id"])
+        return result
+
+
+def _build_catalog(db: Session, connection_id: int, version: int) -> SchemaCatalog:
+    """从元数据库加载一个连接的完整表结构（固定3次查询）"""
+    db_tables = crud.schema_table.get_by_connection(db=db, connection_id=connection_id, limit=None)
+    table_ids = [table.id for table in db_tables]
+    db_columns = crud.schema_column.get_by_table_ids(db=db, table_ids=table_ids)
+    db_relationships = crud.schema_relationship.get_by_connection(
+        db=db, connection_id=connection_id, limit=None
+    )
+
+    tables: Dict[int, Dict[str, Any]] = {}
+    table_name_index: Dict[str, int] = {}
+    for table in db_tables:
+        tables[table.id] = {
+            "id": table.id,
+            "name": table.table_name,
+            "description": table.description or ""
+        }
+        table_name_index[table.table_name.lower()] = table.id
+
+    columns: Dict[int, Dict[str, Any]] = {}
+    table_columns: Dict[int, List[int]] = {table_id: [] for table_id in tables}
+    column_name_index: Dict[str, List[int]] = {}
+    column_search_text: Dict[int, Tuple[str, str]] = {}
+    for column in db_columns:
+        table = tables.get(column.table_id)
+        if not table:
+            continue
+        columns[column.id] = {
+            "id": column.id,
+            "name": column.column_name,
+            "type": column.data_type,
+            "description": column.description,
+            "is_primary_key": column.is_primary_key,
+            "is_foreign_key": column.is_foreign_key,
+            "table_id": column.table_id,
+            "table_name": table["name"]
+        }
+        column_search_text[column.id] = (column.column_name.lower(), (column.description or "").lower())
+        table_columns[column.table_id].append(column.id)
+        column_name_index.setdefault(column.column_name.lower(), []).append(column.id)
+
+    relationships: Dict[int, Dict[str, Any]] = {}
+    outgoing: Dict[int, List[int]] = {}
+    incoming: Dict[int, List[int]] = {}
+    for rel in db_relationships:
+        source_column = columns.get(rel.source_column_id)
+        target_column = columns.get(rel.target_column_id)
+        if rel.source_table_id not in tables or rel.target_table_id not in tables:
+            continue
+        if not source_column or not target_column:
+            continue
+        relationships[rel.id] = {
+            "id": rel.id,
+            "source_table_id": rel.source_table_id,
+            "source_column_id": rel.source_column_id,
+            "target_table_id": rel.target_table_id,
+            "target_column_id": rel.target_column_id,
+            "source_table": tables[rel.source_table_id]["name"],
+            "source_column": source_column["name"],
+            "target_table": tables[rel.target_table_id]["name"],
+            "target_column": target_column["name"],
+            "relationship_type": rel.relationship_type
+        }
+        outgoing.setdefault(rel.source_table_id, []).append(rel.id)
+        incoming.setdefault(rel.target_table_id, []).append(rel.id)
+
+    return SchemaCatalog(
+        connection_id=connection_id,
+        version=version,
+        fingerprint=_compute_fingerprint(tables, columns, relationships),
+        tables=tables,
+        columns=columns,
+        relationships=relationships,
+        table_columns=table_columns,
+        table_name_index=table_name_index,
+        column_name_index=column_name_index,
+        column_search_text=column_search_text,
+        outgoing=outgoing,
+        incoming=incoming
+    )
+
+
+def _compute_fingerprint(tables: Dict[int, Dict[str, Any]],
+                         columns: Dict[int, Dict[str, Any]],
+                         relationships: Dict[int, Dict[str, Any]]) -> str:
+    """根据表结构内容计算指纹，内容不变则跨进程保持一致"""
+    digest = hashlib.sha1()
+    for table_id in sorted(tables):
+        table = tables[table_id]
+        digest.update(f"T|{table_id}|{table['name']}|{table['description']}\n".encode("utf-8"))
+    for column_id in sorted(columns):
+        column = columns[column_id]
+        digest.update(
+            f"C|{column_id}|{column['table_id']}|{column['name']}|{column['type']}|"
+            f"{column['description'] or ''}|{column['is_primary_key']}|{column['is_foreign_key']}\n".encode("utf-8")
+        )
+    for rel_id in sorted(relationships):
+        rel = relationships[rel_id]
+        digest.update(
+            f"R|{rel_id}|{rel['source_column_id']}|{rel['target_column_id']}|{rel['relationship_type']}\n".encode("utf-8")
+        )
+    return digest.hexdigest()[:16]
+
+
+# 进程内目录缓存：connection_id -> SchemaCatalog
+_catalog_cache: Dict[int, SchemaCatalog] = {}
+# 每个连接的版本号，失效时单调递增
+_catalog_versions: Dict[int, int] = {}
+_catalog_lock = threading.Lock()
+
+
+def get_schema_catalog(db: Session, connection_id: int) -> SchemaCatalog:
+    """获取连接的表结构目录，未缓存时从元数据库加载"""
+    with _catalog_lock:
+        catalog = _catalog_cache.get(connection_id)
+        if catalog is not None:
+            return catalog
+        version = _catalog_versions.setdefault(connection_id, 1)
+
+    # 在锁外加载，避免慢查询阻塞其他连接
+    catalog = _build_catalog(db, connection_id, version)
+
+    with _catalog_lock:
+        # 加载期间若已失效，则本次结果只供当前请求使用，不写入缓存
+        if _catalog_versions.get(connection_id) == version:
+            cached = _catalog_cache.get(connection_id)
+            if cached is not None:
+                return cached
+            _catalog_cache[connection_id] = catalog
+            logger.info(
+                f"表结构目录已加载: connection_id={connection_id}, version={version}, "
+                f"tables={len(catalog.tables)}, columns={len(catalog.columns)}, "
+                f"relationships={len(catalog.relationships)}"
+            )
+    return catalog
+
+
+def invalidate_schema_catalog(connection_id: int) -> int:
+    """使连接的表结构目录失效，返回新的版本号"""
+    with _catalog_lock:
+        _catalog_cache.pop(connection_id, None)
+        version = _catalog_versions.get(connection_id, 0) + 1
+        _catalog_versions[connection_id] = version
+    logger.info(f"表结构目录已失效: connection_id={connection_id}, new_version={version}")
+    return version
+
+
+def get_schema_catalog_version(connection_id: int) -> int:
+    """获取连接当前的目录版本号"""
+    with _catalog_lock:
+        return _catalog_versions.get(connection_id, 0)
+
+
+def clear_schema_catalogs() -> None:
+    """清空所有连接的目录缓存"""
+    with _catalog_lock:
+        for connection_id in list(_catalog_cache):
+            _catalog_versions[connection_id] = _catalog_versions.get(connection_id, 0) + 1
+        _catalog_cache.clear()
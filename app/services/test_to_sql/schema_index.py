@@ -0,0 +1,234 @@
+"""
+表结构向量索引模块
+在进程内为表和列的描述建立向量索引，按查询召回少量候选表，避免把所有表塞进LLM提示
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.core.vectorization.embedding_cache import embed_documents_cached
+from app.core.vectorization.embeddings import get_embedding_provider
+from app.services.test_to_sql.schema_catalog import SchemaCatalog, get_schema_catalog
+from app.utils.vector_utils import as_float32_vector, normalize, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# 列相似度相对表相似度的折扣，避免宽表仅凭某一列压过描述完全匹配的表
+COLUMN_SCORE_DISCOUNT = 0.9
+# 向量化失败后重试构建的间隔（秒）
+REBUILD_RETRY_INTERVAL = 60
+
+
+@dataclass
+class SchemaVectorIndex:
+    """单个连接、单个表结构版本的向量索引"""
+    connection_id: int
+    fingerprint: str
+    table_ids: np.ndarray                       # (n_tables,)
+    table_vectors: Optional[np.ndarray]         # (n_tables, dim)，向量化失败时为None
+    column_vectors: Optional[np.ndarray]        # (n_columns, dim)
+    column_table_pos: np.ndarray                # (n_columns,) 列所属表在table_ids中的位置
+    table_search_text: List[str] = field(default_factory=list)
+    text_vectors: Dict[str, np.ndarray] = field(default_factory=dict)
+    built_at: float = field(default_factory=time.time)
+
+    @property
+    def has_vectors(self) -> bool:
+        return self.table_vectors is not None
+
+
+# connection_id -> SchemaVectorIndex
+_index_cache: Dict[int, SchemaVectorIndex] = {}
+_index_cache_lock = threading.Lock()
+# 每个连接一个构建锁，避免并发请求重复向量化
+_build_locks: Dict[int, threading.Lock] = {}
+
+
+def _get_embeddings():
+    """获取向量化模型（embedding.provider配置的共享实例）"""
+    return get_embedding_provider()
+
+
+def _embed_texts(texts: List[str]) -> List[np.ndarray]:
+    """批量向量化文本（经持久化向量缓存，重启或多进程时未变化的表/列描述不重复向量化）"""
+    if not texts:
+        return []
+    return list(embed_documents_cached(_get_embeddings(), texts))
+
+
+def embed_query(text: str) -> np.ndarray:
+    """向量化查询并归一化"""
+    return normalize(as_float32_vector(_get_embeddings().embed_query(text)))
+
+
+def _table_text(table: Dict[str, Any]) -> str:
+    return f"{table['name']}: {table['description']}" if table["description"] else table["name"]
+
+
+def _column_text(column: Dict[str, Any]) -> str:
+    text = f"{column['table_name']}.{column['name']}"
+    return f"{text}: {column['description']}" if column["description"] else text
+
+
+def _build_index(catalog: SchemaCatalog, previous: Optional[SchemaVectorIndex]) -> SchemaVectorIndex:
+    """构建索引，复用上一版本中文本未变化的向量"""
+    tables = catalog.table_list()
+    table_ids = np.array([t["id"] for t in tables], dtype=np.int64)
+    table_pos = {t["id"]: i for i, t in enumerate(tables)}
+    columns = catalog.columns_for_tables(table_ids.tolist())
+    column_table_pos = np.array([table_pos[c["table_id"]] for c in columns], dtype=np.int64)
+
+    table_search_text = []
+    for t in tables:
+        column_names = " ".join(c["name"] for c in catalog.columns_for_tables([t["id"]]))
+        table_search_text.append(f"{t['name']} {t['description']} {column_names}".lower())
+
+    table_texts = [_table_text(t) for t in tables]
+    column_texts = [_column_text(c) for c in columns]
+
+    text_vectors: Dict[str, np.ndarray] = dict(previous.text_vectors) if previous else {}
+    table_vectors = column_vectors = None
+    try:
+        missing = list(dict.fromkeys(t for t in table_texts + column_texts if t not in text_vectors))
+        if missing:
+            for text, vector in zip(missing, _embed_texts(missing)):
+                text_vectors[text] = vector
+        if table_texts:
+            table_vectors = normalize_rows(np.vstack([text_vectors[t] for t in table_texts]))
+            if column_texts:
+                column_vectors = normalize_rows(np.vstack([text_vectors[t] for t in column_texts]))
+        logger.info(
+            f"表结构向量索引已构建: connection_id={catalog.connection_id}, tables={len(table_texts)}, "
+            f"columns={len(column_texts)}, new_embeddings={len(missing)}"
+        )
+    except Exception as e:
+        # 向量化服务不可用时只使用关键词召回
+        logger.warning(f"表结构向量化失败，回退到关键词召回: {str(e)}")
+        table_vectors = column_vectors = None
+
+    # 只保留当前版本仍在使用的向量
+    live_texts = set(table_texts) | set(column_texts)
+    text_vectors = {k: v for k, v in text_vectors.items() if k in live_texts}
+
+    return SchemaVectorIndex(
+        connection_id=catalog.connection_id,
+        fingerprint=catalog.fingerprint,
+        table_ids=table_ids,
+        table_vectors=table_vectors,
+        column_vectors=column_vectors,
+        column_table_pos=column_table_pos,
+        table_search_text=table_search_text,
+        text_vectors=text_vectors
+    )
+
+
+def _is_current(index: Optional[SchemaVectorIndex], catalog: SchemaCatalog) -> bool:
+    """索引是否对应当前表结构版本（向量化失败的索引在重试间隔内仍视为可用）"""
+    if index is None or index.fingerprint != catalog.fingerprint:
+        return False
+    return index.has_vectors or time.time() - index.built_at < REBUILD_RETRY_INTERVAL
+
+
+def get_schema_index(catalog: SchemaCatalog) -> SchemaVectorIndex:
+    """获取与目录版本一致的向量索引，版本变化时增量重建"""
+    connection_id = catalog.connection_id
+    with _index_cache_lock:
+        index = _index_cache.get(connection_id)
+        if _is_current(index, catalog):
+            return index
+        build_lock = _build_locks.setdefault(connection_id, threading.Lock())
+
+    with build_lock:
+        with _index_cache_lock:
+            previous = _index_cache.get(connection_id)
+        if _is_current(previous, catalog):
+            return previous
+        index = _build_index(catalog, previous)
+        with _index_cache_lock:
+            _index_cache[connection_id] = index
+        return index
+
+
+def search_relevant_tables(catalog: SchemaCatalog, query: str,
+                           keywords: List[str], top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    通过向量检索加关键词加分召回候选表
+    返回按分数降序的(table_id, relevance_score)列表，分数范围0-10
+    """
+    if not catalog.tables:
+        return []
+    top_k = top_k or settings.SCHEMA_INDEX_TOP_K
+    index = get_schema_index(catalog)
+    n_tables = len(index.table_ids)
+
+    # 向量相似度：表本身与其最相似列的较大者
+    scores = np.zeros(n_tables, dtype=np.float32)
+    if index.has_vectors:
+        try:
+            query_vector = embed_query(query)
+            scores = index.table_vectors @ query_vector
+            if index.column_vectors is not None and len(index.column_table_pos):
+                column_scores = (index.column_vectors @ query_vector) * COLUMN_SCORE_DISCOUNT
+                best_column = np.full(n_tables, -1.0, dtype=np.float32)
+                np.maximum.at(best_column, index.column_table_pos, column_scores)
+                scores = np.maximum(scores, best_column)
+            scores = np.clip(scores, 0.0, 1.0)
+        except Exception as e:
+            logger.warning(f"查询向量化失败，仅使用关键词召回: {str(e)}")
+            scores = np.zeros(n_tables, dtype=np.float32)
+
+    # 关键词加分
+    terms = [k.lower() for k in dict.fromkeys(keywords) if k and len(k) > 1]
+    if terms:
+        keyword_weight = settings.SCHEMA_INDEX_KEYWORD_WEIGHT
+        hits = np.array(
+            [min(sum(1 for term in terms if term in text), 3) for text in index.table_search_text],
+            dtype=np.float32
+        )
+        scores = scores + keyword_weight * hits / 3.0
+
+    candidate_count = min(top_k, n_tables)
+    if candidate_count < n_tables:
+        candidate_pos = np.argpartition(-scores, candidate_count - 1)[:candidate_count]
+    else:
+        candidate_pos = np.arange(n_tables)
+    candidate_pos = candidate_pos[np.argsort(-scores[candidate_pos], kind="stable")]
+
+    max_score = 1.0 + (settings.SCHEMA_INDEX_KEYWORD_WEIGHT if terms else 0.0)
+    return [
+        (int(index.table_ids[pos]), round(float(scores[pos]) / max_score * 10, 2))
+        for pos in candidate_pos
+        if scores[pos] > 0
+    ]
+
+
+def refresh_schema_index(connection_id: int) -> None:
+    """在后台线程中按最新表结构预先构建向量索引"""
+    if not settings.SCHEMA_INDEX_ENABLED:
+        return
+
+    def _refresh():
+        from app.db.session import SessionLocal
+        db = SessionLocal()
+        try:
+            get_schema_index(get_schema_catalog(db, connection_id))
+        except Exception as e:
+            logger.error(f"刷新表结构向量索引失败: connection_id={connection_id}, error={str(e)}")
+        finally:
+            db.close()
+
+    threading.Thread(target=_refresh, name=f"schema-index-{connection_id}", daemon=True).start()
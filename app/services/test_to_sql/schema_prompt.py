@@ -0,0 +1,215 @@
+"""
+表结构提示渲染模块
+缓存每个表的渲染片段，在token预算内按相关性挑选表和列，并以确定的顺序拼装提示
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import logging
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 片段缓存容量
+MAX_CACHED_FRAGMENTS = 4096
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数
+    中日韩字符按1个token计，其余字符按约4个字符1个token计
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "⺀" <= ch <= "鿿" or "豈" <= ch <= "﫿" or "＀" <= ch <= "￯")
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@dataclass
+class TableFragment:
+    """单个表的渲染片段"""
+    table_id: Any
+    full_text: str
+    full_tokens: int
+    compact_text: str
+    compact_tokens: int
+    omitted_columns: int
+
+
+@dataclass
+class RenderedSchema:
+    """渲染结果"""
+    text: str
+    token_count: int
+    token_budget: int
+    table_names: List[str] = field(default_factory=list)
+    compacted_tables: List[str] = field(default_factory=list)
+    omitted_tables: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "token_count": self.token_count,
+            "token_budget": self.token_budget,
+            "tables": self.table_names,
+            "compacted_tables": self.compacted_tables,
+            "omitted_tables": self.omitted_tables
+        }
+
+
+# (connection_id, schema_version, table_id) -> TableFragment
+_fragment_cache: "OrderedDict[Tuple[Any, Any, Any], TableFragment]" = OrderedDict()
+_fragment_lock = threading.Lock()
+
+
+def _render_column(column: Dict[str, Any]) -> str:
+    col_desc = f" ({column['description']})" if column.get("description") else ""
+    pk_flag = " PK" if column.get("is_primary_key") else ""
+    fk_flag = " FK" if column.get("is_foreign_key") else ""
+    return f"--   {column['name']} {column['type']}{pk_flag}{fk_flag}{col_desc}\n"
+
+
+def _build_fragment(table: Dict[str, Any], columns: List[Dict[str, Any]]) -> TableFragment:
+    """渲染表的完整片段和只保留主外键的精简片段"""
+    table_desc = f" ({table['description']})" if table.get("description") else ""
+    header = f"-- 表: {table['name']}{table_desc}\n-- 列:\n"
+
+    full_text = header + "".join(_render_column(c) for c in columns) + "\n"
+
+    key_columns = [c for c in columns if c.get("is_primary_key") or c.get("is_foreign_key")]
+    omitted = len(columns) - len(key_columns)
+    compact_text = header + "".join(_render_column(c) for c in key_columns)
+    if omitted:
+        compact_text += f"--   ...（省略{omitted}列）\n"
+    compact_text += "\n"
+
+    return TableFragment(
+        table_id=table.get("id"),
+        full_text=full_text,
+        full_tokens=estimate_tokens(full_text),
+        compact_text=compact_text,
+        compact_tokens=estimate_tokens(compact_text),
+        omitted_columns=omitted
+    )
+
+
+def _get_fragment(connection_id: Any, schema_version: Any, table: Dict[str, Any],
+                  columns: List[Dict[str, Any]]) -> TableFragment:
+    """获取表片段，有连接和表结构版本时从缓存读取"""
+    if connection_id is None or schema_version is None or table.get("id") is None:
+        return _build_fragment(table, columns)
+
+    key = (connection_id, schema_version, table["id"])
+    with _fragment_lock:
+        fragment = _fragment_cache.get(key)
+        if fragment is not None:
+            _fragment_cache.move_to_end(key)
+            return fragment
+
+    fragment = _build_fragment(table, columns)
+    with _fragment_lock:
+        _fragment_cache[key] = fragment
+        while len(_fragment_cache) > MAX_CACHED_FRAGMENTS:
+            _fragment_cache.popitem(last=False)
+    return fragment
+
+
+def _render_relationships(relationships: List[Dict[str, Any]], table_names: set) -> str:
+    lines = []
+    for rel in sorted(relationships, key=lambda r: (r["source_table"], r["source_column"],
+                                                    r["target_table"], r["target_column"])):
+        if rel["source_table"] in table_names and rel["target_table"] in table_names:
+            rel_type = f" ({rel['relationship_type']})" if rel.get("relationship_type") else ""
+            lines.append(
+                f"-- {rel['source_table']}.{rel['source_column']} -> "
+                f"{rel['target_table']}.{rel['target_column']}{rel_type}\n"
+            )
+    return "-- 关系:\n" + "".join(lines) if lines else ""
+
+
+def render_schema_prompt(schema_context: Dict[str, Any], token_budget: Optional[int] = None) -> RenderedSchema:
+    """
+    在token预算内渲染表结构
+    按schema_context中的表顺序（相关性降序）依次放入完整片段，放不下时改用精简片段，
+    仍放不下则省略；最终按表名排序输出，使相同表集合的提示前缀保持一致
+    """
+    token_budget = token_budget or settings.SCHEMA_PROMPT_TOKEN_BUDGET
+    connection_id = schema_context.get("connection_id")
+    schema_version = schema_context.get("schema_version")
+
+    columns_by_table: Dict[Any, List[Dict[str, Any]]] = {}
+    for column in schema_context.get("columns", []):
+        columns_by_table.setdefault(column.get("table_id", column["table_name"]), []).append(column)
+
+    relationships = schema_context.get("relationships", [])
+    # 预留关系部分的预算（按全部关系估算上限）
+    relationship_reserve = estimate_tokens(
+        _render_relationships(relationships, {r["source_table"] for r in relationships} |
+                              {r["target_table"] for r in relationships})
+    )
+
+    used = 0
+    selected: List[Tuple[str, str]] = []
+    compacted: List[str] = []
+    omitted: List[str] = []
+    for table in schema_context.get("tables", []):
+        columns = columns_by_table.get(table.get("id"), columns_by_table.get(table["name"], []))
+        fragment = _get_fragment(connection_id, schema_version, table, columns)
+        remaining = token_budget - relationship_reserve - used
+        if fragment.full_tokens <= remaining:
+            selected.append((table["name"], fragment.full_text))
+            used += fragment.full_tokens
+        elif fragment.compact_tokens <= remaining:
+            selected.append((table["name"], fragment.compact_text))
+            used += fragment.compact_tokens
+            compacted.append(table["name"])
+        elif not selected:
+            # 至少保留最相关的一张表
+            selected.append((table["name"], fragment.compact_text))
+            used += fragment.compact_tokens
+            compacted.append(table["name"])
+        else:
+            omitted.append(table["name"])
+
+    selected.sort(key=lambda item: item[0])
+    table_names = [name for name, _ in selected]
+    text = "".join(fragment_text for _, fragment_text in selected)
+    text += _render_relationships(relationships, set(table_names))
+
+    rendered = RenderedSchema(
+        text=text,
+        token_count=estimate_tokens(text),
+        token_budget=token_budget,
+        table_names=table_names,
+        compacted_tables=compacted,
+        omitted_tables=omitted
+    )
+    if compacted or omitted:
+        logger.info(
+            f"表结构提示超出预算已裁剪: tokens={rendered.token_count}/{token_budget}, "
+            f"compacted={compacted}, omitted={omitted}"
+        )
+    return rendered
+
+
+def format_value_mappings_for_prompt(value_mappings: Optional[Dict[str, Dict[str, str]]]) -> str:
+    """按列名和术语排序渲染值映射"""
+    if not value_mappings:
+        return ""
+    mappings_str = "-- 值映射:\n"
+    for column in sorted(value_mappings):
+        mappings_str += f"-- 对于 {column}:\n"
+        for nl_term, db_value in sorted(value_mappings[column].items()):
+            mappings_str += f"--   自然语言中的'{nl_term}'指数据库中的'{db_value}'\n"
+    return mappings_str + "\n"
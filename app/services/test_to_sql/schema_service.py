@@ -16,6 +16,8 @@ from app.models.db_connection import DBConnection
 from app.services.test_to_sql.db_service import get_db_engine
 from app import crud, schemas
 from app.services.test_to_sql.schema_utils import determine_relationship_type
+from app.services.test_to_sql.schema_catalog import invalidate_schema_catalog
+from app.services.test_to_sql.schema_index import refresh_schema_index
 
 
 def discover_schema(connection: DBConnection) -> List[Dict[str, Any]]:
@@ -683,6 +685,10 @@ def save_discovered_schema(db: Session, connection_id: int, schema_info: List[Di
                     "description": rel_obj.description
                 })
 
+    # Invalidate cached schema catalog and rebuild the schema vector index
+    invalidate_schema_catalog(connection_id)
+    refresh_schema_index(connection_id)
+
     # Sync to graph database
     try:
         sync_schema_to_graph_db(connection_id)
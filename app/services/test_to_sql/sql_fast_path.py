@@ -0,0 +1,264 @@
+"""
+SQL快速路径模块
+问题与已验证的问答对几乎相同（同一连接、向量相似度超过阈值、SQL引用的表在当前schema中仍然存在）时，
+直接复用存储的SQL并跳过schema检索、LLM生成和校验；问题只在数值/日期/引号字符串上不同时，
+把SQL中对应的字面量替换为新值，无法确定替换位置时放弃快速路径
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.services.test_to_sql.hybrid_retrieval_service import (
+    MilvusService, VectorServiceFactory, extract_tables_from_sql
+)
+from app.services.test_to_sql.query_analysis_cache import normalize_question
+from app.services.test_to_sql.schema_catalog import get_schema_catalog
+from app.services.test_to_sql.text2sql_utils import validate_sql
+from app.utils.event_loop import run_coroutine_sync
+
+logger = logging.getLogger(__name__)
+
+# 问题中的字面量：引号字符串（含全角引号）、日期、数字（含小数）
+_LITERAL_PATTERN = re.compile(
+    r"'[^']*'|\"[^\"]*\"|“[^”]*”|‘[^’]*’|＇[^＇]*＇|＂[^＂]*＂|\d{4}-\d{1,2}-\d{1,2}|\d+(?:\.\d+)?"
+)
+_QUOTES = "'\"“”‘’＇＂"
+_PLACEHOLDER = "\x00"
+
+
+@dataclass
+class FastPathMatch:
+    """快速路径命中的问答对"""
+    qa_id: str
+    matched_question: str
+    sql: str
+    similarity: float
+    rebound_literals: Dict[str, str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def split_literals(question: str) -> Tuple[str, List[str]]:
+    """
+    把问题拆成 (字面量替换为占位符后规范化的模板, 字面量列表)
+    字面量取自原始问题，引号内的值保留大小写和全角字符（要原样写入SQL）；
+    只有数字/日期做全半角统一，规范化只用于比较模板
+    """
+    text = (question or "").strip()
+    literals = []
+    for match in _LITERAL_PATTERN.findall(text):
+        if match[0] in _QUOTES:
+            literals.append(match[1:-1])
+        else:
+            literals.append(unicodedata.normalize("NFKC", match))
+    return normalize_question(_LITERAL_PATTERN.sub(_PLACEHOLDER, text)), literals
+
+
+def _literal_pattern_in_sql(value: str) -> re.Pattern:
+    """字面量在SQL中的匹配模式：数字按完整数字匹配，其余只匹配引号/LIKE通配符内的值"""
+    if re.fullmatch(r"\d+(?:\.\d+)?", value):
+        return re.compile(r"(?<![\w.])" + re.escape(value) + r"(?![\w.])")
+    return re.compile(r"(?<=['%])" + re.escape(value) + r"(?=['%])")
+
+
+def rebind_literals(stored_question: str, question: str, sql: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    把存储SQL中的字面量替换为新问题中的值，返回 (新SQL, {旧值: 新值})
+    问题模板（去掉字面量后）不同、或旧值在SQL中不存在/出现多次时返回None。
+    未加引号的实体名（如"北京的销售额"与"上海的销售额"）不是字面量，向量相似度可能很高，
+    因此要求模板完全相同
+    """
+    stored_template, stored_literals = split_literals(stored_question)
+    template, literals = split_literals(question)
+    if stored_template != template or len(stored_literals) != len(literals):
+        return None
+    if stored_literals == literals:
+        return sql, {}
+
+    replacements: Dict[str, str] = {}
+    for old, new in zip(stored_literals, literals):
+        if old == new:
+            continue
+        # 同一个旧值在问题中对应不同新值时无法区分
+        if replacements.get(old, new) != new:
+            return None
+        replacements[old] = new
+
+    rebound = sql
+    for old, new in replacements.items():
+        pattern = _literal_pattern_in_sql(old)
+        if len(pattern.findall(rebound)) != 1:
+            return None
+        escaped = new.replace("'", "''")
+        rebound = pattern.sub(lambda _: escaped, rebound)
+    return rebound, replacements
+
+
+class FastPathStats:
+    """快速路径命中统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.rebound_hits = 0
+        self.misses: Counter = Counter()
+        self.lookup_ms = 0.0
+
+    def record(self, hit: bool, reason: str = None, rebound: bool = False, seconds: float = 0.0):
+        with self._lock:
+            self.attempts += 1
+            self.lookup_ms += seconds * 1000
+            if hit:
+                self.hits += 1
+                self.rebound_hits += int(rebound)
+            else:
+                self.misses[reason or "unknown"] += 1
+
+    def record_execution_failure(self):
+        """命中后执行失败、回退到完整流程"""
+        with self._lock:
+            self.hits -= 1
+            self.misses["execution_failed"] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": settings.SQL_FAST_PATH_ENABLED,
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "rebound_hits": self.rebound_hits,
+                "hit_rate": round(self.hits / self.attempts, 4) if self.attempts else 0.0,
+                "avg_lookup_ms": round(self.lookup_ms / self.attempts, 2) if self.attempts else 0.0,
+                "misses": dict(self.misses)
+            }
+
+
+_stats = FastPathStats()
+# connection_id -> MilvusService
+_milvus_services: Dict[int, MilvusService] = {}
+
+
+async def _get_milvus_service(connection_id: int, dimension: int) -> MilvusService:
+    service = _milvus_services.get(connection_id)
+    if service is None:
+        service = MilvusService(connection_id=connection_id)
+        await service.initialize(dimension)
+        _milvus_services[connection_id] = service
+    return service
+
+
+def _tables_exist(connection_id: int, sql: str) -> bool:
+    """
+    SQL引用的表在当前schema目录中都存在（schema变更后旧SQL可能失效）
+    在工作线程中执行并使用自己的会话：查找超时后线程仍可能在运行，不能借用调用方的会话
+    """
+    from app.db.session import SessionLocal
+
+    tables = extract_tables_from_sql(sql)
+    if not tables:
+        return False
+    db = SessionLocal()
+    try:
+        catalog = get_schema_catalog(db, connection_id)
+    finally:
+        db.close()
+    return all(catalog.get_table_by_name(name) for name in tables)
+
+
+async def _lookup(vector_service, milvus_service: MilvusService, connection_id: int,
+                  question: str) -> Tuple[Optional[FastPathMatch], str]:
+    query_vector = await vector_service.embed_question(question)
+    candidates = await milvus_service.search_similar(
+        query_vector, top_k=settings.SQL_FAST_PATH_CANDIDATES, connection_id=connection_id
+    )
+
+    reason = "no_candidate"
+    for candidate in candidates:
+        if candidate["similarity_score"] < settings.SQL_FAST_PATH_SIMILARITY_THRESHOLD:
+            break
+        if not candidate["verified"] or candidate["success_rate"] < settings.SQL_FAST_PATH_MIN_SUCCESS_RATE:
+            reason = "not_verified"
+            continue
+        rebound = rebind_literals(candidate["question"], question, candidate["sql"])
+        if rebound is None:
+            reason = "question_mismatch"
+            continue
+        sql, replacements = rebound
+        if not validate_sql(sql):
+            reason = "invalid_sql"
+            continue
+        if not await asyncio.to_thread(_tables_exist, connection_id, sql):
+            reason = "schema_changed"
+            continue
+        return FastPathMatch(
+            qa_id=candidate["id"],
+            matched_question=candidate["question"],
+            sql=sql,
+            similarity=float(candidate["similarity_score"]),
+            rebound_literals=replacements
+        ), "hit"
+    return None, reason
+
+
+async def afind_fast_path_sql(connection_id: int, question: str) -> Optional[FastPathMatch]:
+    """
+    查找可直接复用的已验证SQL，未命中时返回None
+    查找受sql_fast_path_timeout_ms限制，超时或出错按未命中处理，不影响正常流程；
+    服务首次初始化（加载模型、建集合）不计入时限，避免超时把初始化取消到一半
+    """
+    if not settings.SQL_FAST_PATH_ENABLED:
+        return None
+    start = time.perf_counter()
+    try:
+        vector_service = await VectorServiceFactory.get_default_service()
+        milvus_service = await _get_milvus_service(connection_id, vector_service.dimension)
+        match, reason = await asyncio.wait_for(
+            _lookup(vector_service, milvus_service, connection_id, question),
+            timeout=settings.SQL_FAST_PATH_TIMEOUT_MS / 1000
+        )
+    except asyncio.TimeoutError:
+        match, reason = None, "timeout"
+    except Exception as e:
+        logger.warning(f"SQL快速路径查找失败: {str(e)}")
+        match, reason = None, "error"
+
+    _stats.record(match is not None, reason, rebound=bool(match and match.rebound_literals),
+                  seconds=time.perf_counter() - start)
+    if match is not None:
+        logger.info(f"SQL快速路径命中: qa_id={match.qa_id}, similarity={match.similarity:.3f}, "
+                    f"rebound={match.rebound_literals}")
+    return match
+
+
+def find_fast_path_sql(connection_id: int, question: str) -> Optional[FastPathMatch]:
+    """afind_fast_path_sql的同步版本"""
+    if not settings.SQL_FAST_PATH_ENABLED:
+        return None
+    return run_coroutine_sync(afind_fast_path_sql(connection_id, question))
+
+
+def record_fast_path_execution_failure() -> None:
+    _stats.record_execution_failure()
+
+
+def get_fast_path_stats() -> Dict[str, Any]:
+    """获取快速路径命中统计"""
+    return _stats.to_dict()
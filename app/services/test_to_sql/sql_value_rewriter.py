@@ -0,0 +1,364 @@
+"""
+SQL值映射改写模块
+解析一次SQL，找到绑定在已映射列上的字面量比较和LIKE谓词，通过哈希查找一次性替换为数据库值
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, FrozenSet
+
+import sqlparse
+from sqlparse import tokens as T
+
+logger = logging.getLogger(__name__)
+
+# 每个连接缓存的已编译映射数量上限
+MAX_COMPILED_PER_CONNECTION = 64
+
+_EQUALITY_OPERATORS = {"=", "!=", "<>"}
+_LIKE_OPERATORS = {"LIKE", "NOT LIKE", "ILIKE", "NOT ILIKE"}
+# 结束FROM子句的关键字
+_FROM_TERMINATORS = {
+    "WHERE", "ON", "USING", "GROUP BY", "ORDER BY", "HAVING", "LIMIT", "UNION", "UNION ALL",
+    "EXCEPT", "INTERSECT", "WINDOW", "OFFSET", "FOR", "SET", "VALUES"
+}
+
+# 不能作为列名或表名的结构性关键字（其他关键字如status、type、user可能是标识符）
+_STRUCTURAL_KEYWORDS = {
+    "AND", "OR", "NOT", "WHERE", "ON", "HAVING", "WHEN", "THEN", "ELSE", "END", "CASE", "IN", "IS",
+    "BETWEEN", "AS", "FROM", "JOIN", "BY", "NULL", "DISTINCT", "ALL", "ANY", "SOME", "EXISTS", "LIKE"
+}
+
+
+@dataclass
+class CompiledValueMappings:
+    """编译后的值映射查找结构"""
+    # (表名小写, 列名小写) -> {术语: 数据库值}
+    by_column: Dict[Tuple[str, str], Dict[str, str]] = field(default_factory=dict)
+    # (表名小写, 列名小写) -> {术语小写: 数据库值}
+    by_column_ci: Dict[Tuple[str, str], Dict[str, str]] = field(default_factory=dict)
+    # 列名小写 -> [(表名小写, 列名小写)]
+    by_column_name: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)
+
+    def lookup(self, key: Tuple[str, str], term: str) -> Optional[str]:
+        terms = self.by_column.get(key)
+        if not terms:
+            return None
+        value = terms.get(term)
+        if value is None:
+            value = self.by_column_ci[key].get(term.lower())
+        return value
+
+
+def compile_value_mappings(value_mappings: Dict[str, Dict[str, str]]) -> CompiledValueMappings:
+    """把{"表.列": {术语: 值}}编译为按列哈希的查找结构"""
+    compiled = CompiledValueMappings()
+    for table_col, mappings in value_mappings.items():
+        if not mappings or "." not in table_col:
+            continue
+        table, col = table_col.rsplit(".", 1)
+        key = (table.lower(), col.lower())
+        compiled.by_column[key] = dict(mappings)
+        compiled.by_column_ci[key] = {str(term).lower(): value for term, value in mappings.items()}
+        compiled.by_column_name.setdefault(key[1], []).append(key)
+    return compiled
+
+
+# connection_id -> OrderedDict[(版本号, 映射列集合) -> CompiledValueMappings]
+_compiled_cache: Dict[int, "OrderedDict[Tuple[int, FrozenSet[str]], CompiledValueMappings]"] = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_value_mappings(connection_id: int, version: int,
+                                value_mappings: Dict[str, Dict[str, str]]) -> CompiledValueMappings:
+    """按连接缓存编译结果，值映射版本变化后旧结果自然失效"""
+    key = (version, frozenset(value_mappings))
+    with _compiled_lock:
+        per_connection = _compiled_cache.setdefault(connection_id, OrderedDict())
+        compiled = per_connection.get(key)
+        if compiled is not None:
+            per_connection.move_to_end(key)
+            return compiled
+
+    compiled = compile_value_mappings(value_mappings)
+
+    with _compiled_lock:
+        per_connection = _compiled_cache.setdefault(connection_id, OrderedDict())
+        # 丢弃旧版本的编译结果
+        for stale in [k for k in per_connection if k[0] != version]:
+            del per_connection[stale]
+        per_connection[key] = compiled
+        while len(per_connection) > MAX_COMPILED_PER_CONNECTION:
+            per_connection.popitem(last=False)
+    return compiled
+
+
+def _unquote_identifier(name: str) -> str:
+    if len(name) >= 2 and name[0] in "`\"[" and name[-1] in "`\"]":
+        name = name[1:-1]
+    return name.lower()
+
+
+def _unquote_string(literal: str) -> str:
+    quote = literal[0]
+    return literal[1:-1].replace(quote * 2, quote)
+
+
+def _quote_string(value: str, quote: str = "'") -> str:
+    """按原字面量的引号风格重新加引号"""
+    return quote + str(value).replace(quote, quote * 2) + quote
+
+
+def _is_string_literal(token) -> bool:
+    """
+    词法单元是否可能是字符串字面量
+    sqlparse把双引号内容识别为String.Symbol：MySQL中是字符串，标准SQL中是带引号的标识符，
+    调用方只在另一侧能解析为映射列时才把它当作字面量
+    """
+    return token.ttype in T.String.Single or token.ttype in T.String.Symbol
+
+
+def _is_significant(token) -> bool:
+    return not token.is_whitespace and token.ttype not in T.Comment
+
+
+def _is_name(token) -> bool:
+    """词法单元是否可以作为标识符"""
+    if token.ttype in T.Name or token.ttype in T.String.Symbol:
+        return True
+    if token.ttype in T.Keyword and token.ttype not in T.DML:
+        return " ".join(token.value.upper().split()) not in _STRUCTURAL_KEYWORDS \
+            and not token.value.upper().endswith("JOIN") \
+            and " ".join(token.value.upper().split()) not in _FROM_TERMINATORS
+    return False
+
+
+def _operator_of(token) -> Optional[str]:
+    """返回比较运算符（大写、合并空白），不是比较运算符时返回None"""
+    if token.ttype in T.Operator.Comparison or token.ttype in T.Keyword:
+        op = " ".join(token.value.upper().split())
+        if op in _EQUALITY_OPERATORS or op in _LIKE_OPERATORS:
+            return op
+    return None
+
+
+def _collect_table_aliases(tokens: list) -> Tuple[Dict[str, str], List[str]]:
+    """
+    扫描FROM/JOIN子句，返回(别名->表名, 查询中出现的表名列表)
+    """
+    aliases: Dict[str, str] = {}
+    tables: List[str] = []
+    in_from = False
+    expect_table = False
+    last_table: Optional[str] = None
+    expect_alias = False
+    i = 0
+    n = len(tokens)
+    while i < n:
+        token = tokens[i]
+        i += 1
+        if not _is_significant(token):
+            continue
+        upper = " ".join(token.value.upper().split())
+        if token.ttype in T.Keyword and not (in_from and (expect_table or expect_alias) and _is_name(token)):
+            if upper == "FROM" or upper.endswith("JOIN"):
+                in_from, expect_table, expect_alias, last_table = True, True, False, None
+            elif upper == "AS" and in_from:
+                expect_alias = last_table is not None
+            elif upper in _FROM_TERMINATORS or token.ttype in T.DML:
+                in_from = expect_table = expect_alias = False
+                last_table = None
+            continue
+        if not in_from:
+            continue
+        if token.ttype in T.Punctuation:
+            if token.value == ",":
+                expect_table, expect_alias, last_table = True, False, None
+            elif token.value == "(":
+                in_from = expect_table = expect_alias = False
+            continue
+        if _is_name(token):
+            if expect_table:
+                # 处理schema.table形式，取最后一段作为表名
+                name = _unquote_identifier(token.value)
+                while i + 1 < n and tokens[i].ttype in T.Punctuation and tokens[i].value == "." \
+                        and _is_name(tokens[i + 1]):
+                    name = _unquote_identifier(tokens[i + 1].value)
+                    i += 2
+                last_table = name
+                tables.append(name)
+                aliases[name] = name
+                expect_table = False
+                expect_alias = True
+            elif expect_alias and last_table is not None:
+                aliases[_unquote_identifier(token.value)] = last_table
+                expect_alias = False
+    return aliases, tables
+
+
+def _column_ref_before(tokens: list, pos: int) -> Tuple[Optional[str], Optional[str], int]:
+    """
+    从pos（不含）向前读取列引用
+    返回(限定名, 列名, 列引用起始位置)，读取失败时列名为None
+    """
+    j = pos - 1
+    while j >= 0 and not _is_significant(tokens[j]):
+        j -= 1
+    if j < 0 or not _is_name(tokens[j]):
+        return None, None, pos
+    column = _unquote_identifier(tokens[j].value)
+    if j >= 2 and tokens[j - 1].ttype in T.Punctuation and tokens[j - 1].value == "." \
+            and _is_name(tokens[j - 2]):
+        return _unquote_identifier(tokens[j - 2].value), column, j - 2
+    return None, column, j
+
+
+def _column_ref_after(tokens: list, pos: int) -> Tuple[Optional[str], Optional[str], int]:
+    """
+    从pos（不含）向后读取列引用
+    返回(限定名, 列名, 列引用结束位置)，读取失败时列名为None
+    """
+    n = len(tokens)
+    j = pos + 1
+    while j < n and not _is_significant(tokens[j]):
+        j += 1
+    if j >= n or not _is_name(tokens[j]):
+        return None, None, pos
+    if j + 2 < n and tokens[j + 1].ttype in T.Punctuation and tokens[j + 1].value == "." \
+            and _is_name(tokens[j + 2]):
+        return _unquote_identifier(tokens[j].value), _unquote_identifier(tokens[j + 2].value), j + 2
+    return None, _unquote_identifier(tokens[j].value), j
+
+
+def _resolve_column(compiled: CompiledValueMappings, qualifier: Optional[str], column: str,
+                    aliases: Dict[str, str], tables: List[str]) -> Optional[Tuple[str, str]]:
+    """把SQL中的列引用解析为映射中的(表, 列)键"""
+    if qualifier is not None:
+        key = (aliases.get(qualifier, qualifier), column)
+        return key if key in compiled.by_column else None
+    candidates = compiled.by_column_name.get(column)
+    if not candidates:
+        return None
+    if len(candidates) == 1:
+        return candidates[0]
+    in_query = [key for key in candidates if key[0] in tables]
+    return in_query[0] if len(in_query) == 1 else None
+
+
+def _rewrite_literal(compiled: CompiledValueMappings, key: Tuple[str, str], op: str, literal: str) -> Optional[str]:
+    """返回替换后的字面量，无映射时返回None"""
+    term = _unquote_string(literal)
+    quote = literal[0]
+    if op in _LIKE_OPERATORS:
+        core = term.strip("%")
+        if not core:
+            return None
+        value = compiled.lookup(key, core)
+        if value is None:
+            return None
+        prefix = term[:len(term) - len(term.lstrip("%"))]
+        suffix = term[len(term.rstrip("%")):]
+        return _quote_string(f"{prefix}{value}{suffix}", quote)
+    value = compiled.lookup(key, term)
+    return _quote_string(value, quote) if value is not None else None
+
+
+def rewrite_sql_values(sql: str, compiled: CompiledValueMappings) -> str:
+    """
+    单次遍历SQL词法单元，替换已映射列上的字面量
+    支持 列 =/!=/<> '术语'、'术语' =/!=/<> 列、列 [NOT] LIKE '%术语%'、列 [NOT] IN ('术语', ...)，
+    单引号与双引号字面量均保留原引号风格
+    """
+    if not compiled.by_column or not sql:
+        return sql
+
+    tokens = [t for statement in sqlparse.parse(sql) for t in statement.flatten()]
+    aliases, tables = _collect_table_aliases(tokens)
+    replaced = 0
+
+    i = 0
+    n = len(tokens)
+    while i < n:
+        token = tokens[i]
+        op = _operator_of(token)
+        upper = token.value.upper() if token.ttype in T.Keyword else ""
+
+        if op is not None:
+            # 列 运算符 '字面量'
+            j = i + 1
+            while j < n and not _is_significant(tokens[j]):
+                j += 1
+            qualifier, column, _ = _column_ref_before(tokens, i)
+            if j < n and _is_string_literal(tokens[j]) and not (
+                    tokens[j].ttype in T.String.Symbol and column is None):
+                # 兼容旧版sqlparse把NOT与LIKE拆开的情况
+                if column is None and op in _LIKE_OPERATORS:
+                    k = i - 1
+                    while k >= 0 and not _is_significant(tokens[k]):
+                        k -= 1
+                    if k >= 0 and tokens[k].value.upper() == "NOT":
+                        qualifier, column, _ = _column_ref_before(tokens, k)
+                if column is not None:
+                    key = _resolve_column(compiled, qualifier, column, aliases, tables)
+                    if key is not None:
+                        new_literal = _rewrite_literal(compiled, key, op, tokens[j].value)
+                        if new_literal is not None:
+                            tokens[j].value = new_literal
+                            replaced += 1
+                i = j + 1
+                continue
+            if op in _EQUALITY_OPERATORS:
+                # '字面量' 运算符 列
+                k = i - 1
+                while k >= 0 and not _is_significant(tokens[k]):
+                    k -= 1
+                qualifier, column, end = _column_ref_after(tokens, i)
+                if k >= 0 and _is_string_literal(tokens[k]) and column is not None:
+                    key = _resolve_column(compiled, qualifier, column, aliases, tables)
+                    if key is not None:
+                        new_literal = _rewrite_literal(compiled, key, op, tokens[k].value)
+                        if new_literal is not None:
+                            tokens[k].value = new_literal
+                            replaced += 1
+                    i = end + 1
+                    continue
+        elif upper == "IN":
+            # 列 [NOT] IN ('字面量', ...)
+            k = i - 1
+            while k >= 0 and not _is_significant(tokens[k]):
+                k -= 1
+            ref_end = k if k >= 0 and tokens[k].value.upper() == "NOT" else i
+            qualifier, column, _ = _column_ref_before(tokens, ref_end)
+            key = _resolve_column(compiled, qualifier, column, aliases, tables) if column else None
+            j = i + 1
+            while j < n and not _is_significant(tokens[j]):
+                j += 1
+            if key is not None and j < n and tokens[j].value == "(":
+                j += 1
+                while j < n and tokens[j].value != ")":
+                    if _is_string_literal(tokens[j]):
+                        new_literal = _rewrite_literal(compiled, key, "=", tokens[j].value)
+                        if new_literal is not None:
+                            tokens[j].value = new_literal
+                            replaced += 1
+                    elif tokens[j].ttype in T.DML:
+                        # 子查询，不处理
+                        break
+                    j += 1
+                i = j
+                continue
+        i += 1
+
+    if not replaced:
+        return sql
+    return "".join(t.value for t in tokens)
@@ -11,48 +11,49 @@ Text2SQL服务 - 重构后的版本
 授权商业应用请联系微信：huice666
 """
 
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, Tuple
 from sqlalchemy.orm import Session
 
 from app.models.db_connection import DBConnection
 from app.schemas.test_to_sql.query import QueryResponse
 from app.services.test_to_sql.db_service import execute_query
 from app.services.test_to_sql.text2sql_utils import (
-    retrieve_relevant_schema, get_value_mappings, format_schema_for_prompt,
+    retrieve_relevant_schema, get_value_mappings,
     process_sql_with_value_mappings, validate_sql, extract_sql_from_llm_response
 )
+from app.services.test_to_sql.schema_prompt import (
+    render_schema_prompt, format_value_mappings_for_prompt, estimate_tokens
+)
+from app.services.test_to_sql.sql_fast_path import find_fast_path_sql, record_fast_path_execution_failure
 from app.core.llms import get_default_model
 
+logger = logging.getLogger(__name__)
+
 
 def construct_prompt(schema_context: Dict[str, Any], query: str, value_mappings: Dict[str, Dict[str, str]]) -> str:
     """
     为LLM构建增强上下文和指令的提示
     """
-    # 格式化表结构信息
-    schema_str = format_schema_for_prompt(schema_context)
+    prompt, _ = construct_prompt_with_stats(schema_context, query, value_mappings)
+    return prompt
+
+
+def construct_prompt_with_stats(schema_context: Dict[str, Any], query: str,
+                                value_mappings: Dict[str, Dict[str, str]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    构建提示并返回token统计
+    固定指令在前、表结构居中、问题在最后，便于模型服务端命中前缀缓存
+    """
+    # 格式化表结构信息（受token预算约束）
+    rendered = render_schema_prompt(schema_context)
 
     # 如果有值映射，添加到提示中
-    mappings_str = ""
-    if value_mappings:
-        mappings_str = "-- 值映射:\n"
-        for column, mappings in value_mappings.items():
-            mappings_str += f"-- 对于 {column}:\n"
-            for nl_term, db_value in mappings.items():
-                mappings_str += f"--   自然语言中的'{nl_term}'指数据库中的'{db_value}'\n"
-        mappings_str += "\n"
+    mappings_str = format_value_mappings_for_prompt(value_mappings)
 
     prompt = f"""
 你是一名专业的SQL开发专家，专门将自然语言问题转换为精确的SQL查询。
 
-### 数据库结构:
-```sql
-{schema_str}
-{mappings_str}
-```
-
-### 自然语言问题:
-"{query}"
-
 ### 指令:
 1. 分析问题并识别相关的表和列。
 2. 考虑表之间的关系以确定必要的连接。
@@ -64,10 +65,25 @@ def construct_prompt(schema_context: Dict[str, Any], query: str, value_mappings:
 8. 如果查询与时间相关，适当处理日期/时间比较。
 9. 简要解释你的推理。
 
+### 数据库结构:
+```sql
+{rendered.text}
+{mappings_str}
+```
+
+### 自然语言问题:
+"{query}"
+
 ### SQL查询:
 """
 
-    return prompt
+    stats = rendered.to_dict()
+    stats["prompt_tokens"] = estimate_tokens(prompt)
+    logger.info(
+        f"提示构建完成: prompt_tokens={stats['prompt_tokens']}, schema_tokens={rendered.token_count}, "
+        f"tables={len(rendered.table_names)}"
+    )
+    return prompt, stats
 
 
 def call_llm_api(prompt: str) -> str:
@@ -103,6 +119,21 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
     处理自然语言查询并转换为SQL
     """
     try:
+        # 0. 快速路径：已验证问答对几乎相同时直接执行其SQL，执行失败则回退到完整流程
+        fast_path = find_fast_path_sql(connection.id, natural_language_query)
+        if fast_path is not None:
+            try:
+                results = execute_query(connection, fast_path.sql)
+                return QueryResponse(
+                    sql=fast_path.sql,
+                    results=results,
+                    error=None,
+                    context={"fast_path": fast_path.to_dict()}
+                )
+            except Exception as e:
+                record_fast_path_execution_failure()
+                logger.warning(f"快速路径SQL执行失败，回退到完整流程: {str(e)}")
+
         # 1. 检索相关表结构
         schema_context = retrieve_relevant_schema(db, connection.id, natural_language_query)
 
@@ -119,7 +150,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
         value_mappings = get_value_mappings(db, schema_context)
 
         # 3. 构建提示
-        prompt = construct_prompt(schema_context, natural_language_query, value_mappings)
+        prompt, prompt_stats = construct_prompt_with_stats(schema_context, natural_language_query, value_mappings)
 
         # 4. 调用LLM API
         llm_response = call_llm_api(prompt)
@@ -128,7 +159,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
         sql = extract_sql_from_llm_response(llm_response)
 
         # 6. 使用值映射处理SQL
-        processed_sql = process_sql_with_value_mappings(sql, value_mappings)
+        processed_sql = process_sql_with_value_mappings(sql, value_mappings, connection.id)
 
         # 7. 验证SQL
         if not validate_sql(processed_sql):
@@ -139,6 +170,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
                 context={
                     "schema_context": schema_context,
                     "prompt": prompt,
+                    "prompt_stats": prompt_stats,
                     "llm_response": llm_response
                 }
             )
@@ -154,6 +186,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
                 context={
                     "schema_context": schema_context,
                     "prompt": prompt,
+                    "prompt_stats": prompt_stats,
                     "llm_response": llm_response
                 }
             )
@@ -165,6 +198,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
                 context={
                     "schema_context": schema_context,
                     "prompt": prompt,
+                    "prompt_stats": prompt_stats,
                     "llm_response": llm_response
                 }
             )
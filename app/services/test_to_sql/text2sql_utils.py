@@ -13,30 +13,37 @@ Text2SQL工具模块
 
 import re
 import json
+import time
+import asyncio
+import logging
 import sqlparse
-from typing import Dict, Any, List, Tuple, Set
+from typing import Dict, Any, List, Tuple, Set, Optional
 from sqlalchemy.orm import Session
-from neo4j import GraphDatabase
 
 from app.config.settings import settings
 from app.core.llms import get_default_model
-from app import crud
+from app.services.test_to_sql.schema_catalog import get_schema_catalog
+from app.services.test_to_sql.schema_index import search_relevant_tables, embed_query
+from app.services.test_to_sql.query_analysis_cache import get_query_analysis_cache
+from app.services.test_to_sql.value_mapping_cache import (
+    get_connection_value_mappings, get_column_value_mappings, get_value_mapping_version
+)
+from app.services.test_to_sql.schema_prompt import render_schema_prompt
+from app.services.test_to_sql.sql_value_rewriter import (
+    compile_value_mappings, get_compiled_value_mappings, rewrite_sql_values
+)
+from app.utils.event_loop import run_coroutine_sync
 
-# 查询分析缓存，避免重复的LLM调用
-query_analysis_cache = {}
+logger = logging.getLogger(__name__)
 
 
-def analyze_query_with_llm(query: str) -> Dict[str, Any]:
-    """
-    使用LLM分析自然语言查询，提取关键实体和意图
-    返回包含实体、关系和查询意图的结构化分析
-    """
-    # 检查缓存
-    if query in query_analysis_cache:
-        return query_analysis_cache[query]
-    try:
-        # 为LLM准备提示
-        prompt = f"""
+ANALYSIS_SYSTEM_PROMPT = "你是一名数据库专家，擅长根据自然语言分析相关的数据库表及列"
+FILTER_SYSTEM_PROMPT = "你是一名数据库专家，擅长分析自然语言查询与相关的数据库表是否有关"
+
+
+def _build_analysis_messages(query: str) -> List[Dict[str, str]]:
+    """构建查询分析的LLM消息"""
+    prompt = f"""
         你是一名数据库专家，帮助分析自然语言查询以找到相关的数据库表和列。
         请分析以下查询并提取关键信息：
 
@@ -52,35 +59,70 @@ def analyze_query_with_llm(query: str) -> Dict[str, Any]:
             "comparison_related": 布尔值，表示查询是否涉及值比较
         }}
         """
-        # 调用LLM
-        model_client = get_default_model()
-        # 直接使用model_client以保持一致性
-        response = model_client.invoke(
-            [{"role": "system", "content": "你是一名数据库专家，擅长根据自然语言分析相关的数据库表及列"}, {"role": "user", "content": prompt}]
-        )
-
-        response_text = response.content
-
-        # 提取并解析JSON响应
-        json_match = re.search(r'\{[\s\S]*}', response_text)
-        if json_match:
-            json_str = json_match.group(0)
-            analysis = json.loads(json_str)
+    return [{"role": "system", "content": ANALYSIS_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def _parse_analysis_response(response_text: str) -> Optional[Dict[str, Any]]:
+    """解析查询分析响应，缺少必需字段或无法解析时返回None"""
+    json_match = re.search(r'\{[\s\S]*}', response_text)
+    if not json_match:
+        return None
+    analysis = json.loads(json_match.group(0))
+    # 验证必需字段
+    if not all(k in analysis for k in ["entities", "relationships", "query_intent"]):
+        return None
+    return analysis
+
+
+def _lookup_cached_analysis(query: str, connection_id: Optional[int]) -> Tuple[Optional[Dict[str, Any]], Any]:
+    """检查缓存（按规范化问题和连接ID，可选相似问题命中），返回(缓存结果, 查询向量)"""
+    cache = get_query_analysis_cache()
+    query_vector = None
+    if cache.semantic_enabled:
+        try:
+            query_vector = embed_query(query)
+        except Exception as e:
+            logger.warning(f"查询向量化失败，跳过相似问题缓存: {str(e)}")
+    return cache.get(query, connection_id, query_vector), query_vector
+
+
+def _finish_analysis(query: str, connection_id: Optional[int], response_text: str, query_vector: Any) -> Dict[str, Any]:
+    """解析LLM响应并写入缓存（回退分析不缓存，LLM恢复后可重新分析）"""
+    analysis = _parse_analysis_response(response_text)
+    if analysis is None:
+        return _create_fallback_analysis(query)
+    get_query_analysis_cache().set(query, analysis, connection_id, query_vector)
+    return analysis
+
+
+def analyze_query_with_llm(query: str, connection_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    使用LLM分析自然语言查询，提取关键实体和意图
+    返回包含实体、关系和查询意图的结构化分析
+    """
+    cached, query_vector = _lookup_cached_analysis(query, connection_id)
+    if cached is not None:
+        return cached
+    try:
+        response = get_default_model().invoke(_build_analysis_messages(query))
+        return _finish_analysis(query, connection_id, response.content, query_vector)
+    except Exception as e:
+        # 如果发生任何错误，回退到关键词提取
+        logger.warning(f"LLM查询分析失败，使用关键词回退: {str(e)}")
+        return _create_fallback_analysis(query)
 
-            # 验证必需字段
-            if not all(k in analysis for k in ["entities", "relationships", "query_intent"]):
-                analysis = _create_fallback_analysis(query)
-        else:
-            analysis = _create_fallback_analysis(query)
 
-        # 缓存结果
-        query_analysis_cache[query] = analysis
-        return analysis
+async def aanalyze_query_with_llm(query: str, connection_id: Optional[int] = None) -> Dict[str, Any]:
+    """analyze_query_with_llm的异步版本"""
+    cached, query_vector = await asyncio.to_thread(_lookup_cached_analysis, query, connection_id)
+    if cached is not None:
+        return cached
+    try:
+        response = await get_default_model().ainvoke(_build_analysis_messages(query))
+        return _finish_analysis(query, connection_id, response.content, query_vector)
     except Exception as e:
-        # 如果发生任何错误，回退到关键词提取
-        analysis = _create_fallback_analysis(query)
-        query_analysis_cache[query] = analysis
-        return analysis
+        logger.warning(f"LLM查询分析失败，使用关键词回退: {str(e)}")
+        return _create_fallback_analysis(query)
 
 
 def _create_fallback_analysis(query: str) -> Dict[str, Any]:
@@ -108,27 +150,22 @@ def extract_keywords(query: str) -> List[str]:
 # pylint: disable  MC80OmFIVnBZMlhrdUp2bG43bmx2TG82YnpCSFZ3PT06MDNiYmExMjM=
 
 
-def find_relevant_tables_semantic(query: str, query_analysis: Dict[str, Any],
-                                       all_tables: List[Dict[str, Any]]) -> List[Tuple[int, float]]:
-    """
-    使用LLM进行语义匹配找到相关表
-    返回(table_id, relevance_score)元组列表
-    """
-    try:
-        # 为LLM准备表信息
-        tables_info = "\n".join([
-            f"表ID: {t['id']} - 名称: {t['name']} - 描述: {t['description'] or '无描述'}"
-            for t in all_tables
-        ])
-
-        # 准备提示
-        prompt = f"""
+def _build_ranking_messages(query: str, query_analysis: Optional[Dict[str, Any]],
+                            all_tables: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """构建表相关性排序的LLM消息，query_analysis为空时只根据原始查询排序"""
+    # 为LLM准备表信息
+    tables_info = "\n".join([
+        f"表ID: {t['id']} - 名称: {t['name']} - 描述: {t['description'] or '无描述'}"
+        for t in all_tables
+    ])
+    analysis_info = f"\n        查询分析: {json.dumps(query_analysis, ensure_ascii=False)}\n" if query_analysis else ""
+
+    # 准备提示
+    prompt = f"""
         你是一名数据库专家，帮助为自然语言查询找到相关表。
 
         查询: "{query}"
-
-        查询分析: {json.dumps(query_analysis, ensure_ascii=False)}
-
+        {analysis_info}
         可用表:
         {tables_info}
 
@@ -144,37 +181,52 @@ def find_relevant_tables_semantic(query: str, query_analysis: Dict[str, Any],
             ...
         ]
         """
+    return [{"role": "system", "content": ANALYSIS_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def _parse_ranking_response(response_text: str) -> Optional[List[Tuple[int, float]]]:
+    """解析表排序响应，无法解析时返回None"""
+    json_match = re.search(r'\[[\s\S]*\]', response_text)
+    if not json_match:
+        return None
+    ranked_tables = json.loads(json_match.group(0))
+
+    # 确保每个表都有所需字段且table_id是整数
+    valid_tables = []
+    for t in ranked_tables:
+        if "table_id" in t and "relevance_score" in t:
+            if t["relevance_score"] > 3:
+                table_id = t["table_id"]
+                if not isinstance(table_id, int):
+                    try:
+                        table_id = int(table_id)
+                    except (ValueError, TypeError):
+                        continue
+                valid_tables.append((table_id, t["relevance_score"]))
+    return valid_tables
+
+
+def find_relevant_tables_semantic(query: str, query_analysis: Optional[Dict[str, Any]],
+                                       all_tables: List[Dict[str, Any]]) -> List[Tuple[int, float]]:
+    """
+    使用LLM进行语义匹配找到相关表
+    返回(table_id, relevance_score)元组列表
+    """
+    try:
+        response = get_default_model().invoke(_build_ranking_messages(query, query_analysis, all_tables))
+        ranked = _parse_ranking_response(response.content)
+        return ranked if ranked is not None else basic_table_matching(query, all_tables)
+    except Exception as e:
+        return basic_table_matching(query, all_tables)
 
-        # 调用LLM
-        model_client = get_default_model()
-        # 直接使用model_client以保持一致性
-        response = model_client.invoke(
-            [{"role": "system", "content": "你是一名数据库专家，擅长根据自然语言分析相关的数据库表及列"},
-             {"role": "user", "content": prompt}]
-        )
-        response_text = response.content
-        # 提取并解析JSON响应
-        json_match = re.search(r'\[[\s\S]*\]', response_text)
-        if json_match:
-            json_str = json_match.group(0)
-            ranked_tables = json.loads(json_str)
-
-            # 确保每个表都有所需字段且table_id是整数
-            valid_tables = []
-            for t in ranked_tables:
-                if "table_id" in t and "relevance_score" in t:
-                    if t["relevance_score"] > 3:
-                        table_id = t["table_id"]
-                        if not isinstance(table_id, int):
-                            try:
-                                table_id = int(table_id)
-                            except (ValueError, TypeError):
-                                continue
-                        valid_tables.append((table_id, t["relevance_score"]))
-
-            return valid_tables
-        else:
-            return basic_table_matching(query, all_tables)
+
+async def afind_relevant_tables_semantic(query: str, query_analysis: Optional[Dict[str, Any]],
+                                         all_tables: List[Dict[str, Any]]) -> List[Tuple[int, float]]:
+    """find_relevant_tables_semantic的异步版本"""
+    try:
+        response = await get_default_model().ainvoke(_build_ranking_messages(query, query_analysis, all_tables))
+        ranked = _parse_ranking_response(response.content)
+        return ranked if ranked is not None else basic_table_matching(query, all_tables)
     except Exception as e:
         return basic_table_matching(query, all_tables)
 
@@ -202,21 +254,18 @@ def basic_table_matching(query: str, all_tables: List[Dict[str, Any]]) -> List[T
 
     return sorted(relevant_tables, key=lambda x: x[1], reverse=True)
 
-def filter_expanded_tables_with_llm(query: str, query_analysis: Dict[str, Any],
-                                        expanded_tables: List[Tuple[int, str, str]],
-                                        relevance_scores: Dict[int, float]) -> Set[Tuple[int, str, str]]:
-    """
-    使用LLM根据实际相关性过滤扩展表
-    """
-    try:
-        # 准备扩展表信息
-        tables_info = "\n".join([
-            f"表ID: {t[0]}, 名称: {t[1]}, 描述: {t[2] or '无描述'}, 分数: {relevance_scores.get(t[0], 0)}"
-            for t in expanded_tables
-        ])
-
-        # 准备提示
-        prompt = f"""
+def _build_filter_messages(query: str, query_analysis: Dict[str, Any],
+                           expanded_tables: List[Tuple[int, str, str]],
+                           relevance_scores: Dict[int, float]) -> List[Dict[str, str]]:
+    """构建扩展表过滤的LLM消息"""
+    # 准备扩展表信息
+    tables_info = "\n".join([
+        f"表ID: {t[0]}, 名称: {t[1]}, 描述: {t[2] or '无描述'}, 分数: {relevance_scores.get(t[0], 0)}"
+        for t in expanded_tables
+    ])
+
+    # 准备提示
+    prompt = f"""
         你是一名数据库专家，帮助确定相关表是否真正与查询相关。
 
         查询: "{query}"
@@ -237,127 +286,104 @@ def filter_expanded_tables_with_llm(query: str, query_analysis: Dict[str, Any],
             ...
         ]
         """
+    return [{"role": "system", "content": FILTER_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
 
-        # 调用LLM
-        model_client = get_default_model()
-        # 直接使用model_client以保持一致性
-        response = model_client.invoke(
-            [{"role": "system", "content": "你是一名数据库专家，擅长分析自然语言查询与相关的数据库表是否有关"},
-             {"role": "user", "content": prompt}]
-        )
-        response_text = response.content
 
-        # 提取并解析JSON响应
-        json_match = re.search(r'\[[\s\S]*\]', response_text)
-        if json_match:
-            json_str = json_match.group(0)
-            filtered_tables = json.loads(json_str)
+def _parse_filter_response(response_text: str,
+                           expanded_tables: List[Tuple[int, str, str]]) -> Set[Tuple[int, str, str]]:
+    """解析扩展表过滤响应，解析失败时包含所有扩展表"""
+    json_match = re.search(r'\[[\s\S]*\]', response_text)
+    if not json_match:
+        return set(expanded_tables)
+    filtered_tables = json.loads(json_match.group(0))
 
-            # 获取应包含的表的ID
-            include_ids = [t["table_id"] for t in filtered_tables if t.get("include", False)]
+    # 获取应包含的表的ID
+    include_ids = [t["table_id"] for t in filtered_tables if t.get("include", False)]
 
-            # 返回应包含的原始表元组
-            return set(t for t in expanded_tables if t[0] in include_ids)
-        else:
-            # 如果解析失败，包含所有扩展表
-            return set(expanded_tables)
+    # 返回应包含的原始表元组
+    return set(t for t in expanded_tables if t[0] in include_ids)
+
+
+def filter_expanded_tables_with_llm(query: str, query_analysis: Dict[str, Any],
+                                        expanded_tables: List[Tuple[int, str, str]],
+                                        relevance_scores: Dict[int, float]) -> Set[Tuple[int, str, str]]:
+    """
+    使用LLM根据实际相关性过滤扩展表
+    """
+    try:
+        response = get_default_model().invoke(
+            _build_filter_messages(query, query_analysis, expanded_tables, relevance_scores)
+        )
+        return _parse_filter_response(response.content, expanded_tables)
     except Exception as e:
         # 如果发生任何错误，包含所有扩展表
         return set(expanded_tables)
 
+
+async def afilter_expanded_tables_with_llm(query: str, query_analysis: Dict[str, Any],
+                                           expanded_tables: List[Tuple[int, str, str]],
+                                           relevance_scores: Dict[int, float]) -> Set[Tuple[int, str, str]]:
+    """filter_expanded_tables_with_llm的异步版本"""
+    try:
+        response = await get_default_model().ainvoke(
+            _build_filter_messages(query, query_analysis, expanded_tables, relevance_scores)
+        )
+        return _parse_filter_response(response.content, expanded_tables)
+    except Exception as e:
+        return set(expanded_tables)
+
+
 def format_schema_for_prompt(schema_context: Dict[str, Any]) -> str:
     """
     将表结构上下文格式化为LLM提示的字符串
+    使用缓存的表片段并受token预算约束
     """
-    tables = schema_context["tables"]
-    columns = schema_context["columns"]
-    relationships = schema_context["relationships"]
-
-    # 按表分组列
-    columns_by_table = {}
-    for column in columns:
-        table_name = column["table_name"]
-        if table_name not in columns_by_table:
-            columns_by_table[table_name] = []
-        columns_by_table[table_name].append(column)
-
-    # 格式化表结构
-    schema_str = ""
-
-    for table in tables:
-        table_name = table["name"]
-        table_desc = f" ({table['description']})" if table["description"] else ""
-
-        schema_str += f"-- 表: {table_name}{table_desc}\n"
-        schema_str += "-- 列:\n"
-
-        if table_name in columns_by_table:
-            for column in columns_by_table[table_name]:
-                col_name = column["name"]
-                col_type = column["type"]
-                col_desc = f" ({column['description']})" if column["description"] else ""
-                pk_flag = " PK" if column["is_primary_key"] else ""
-                fk_flag = " FK" if column["is_foreign_key"] else ""
-
-                schema_str += f"--   {col_name} {col_type}{pk_flag}{fk_flag}{col_desc}\n"
-
-        schema_str += "\n"
-
-    if relationships:
-        schema_str += "-- 关系:\n"
-        for rel in relationships:
-            rel_type = f" ({rel['relationship_type']})" if rel["relationship_type"] else ""
-            schema_str += f"-- {rel['source_table']}.{rel['source_column']} -> {rel['target_table']}.{rel['target_column']}{rel_type}\n"
-
-    return schema_str
+    return render_schema_prompt(schema_context).text
 
 
 def get_value_mappings(db: Session, schema_context: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
     """
     获取表结构上下文中列的值映射
+    有connection_id时读取按连接预加载的缓存，否则对上下文中的列执行一次IN查询
     """
-    mappings = {}
-
-    for column in schema_context["columns"]:
-        column_id = column["id"]
-        column_mappings = crud.value_mapping.get_by_column(db=db, column_id=column_id)
+    columns = schema_context["columns"]
+    connection_id = schema_context.get("connection_id")
+    if connection_id is not None:
+        column_mappings = get_connection_value_mappings(db, connection_id)
+    else:
+        column_mappings = get_column_value_mappings(db, [column["id"] for column in columns])
 
-        if column_mappings:
+    mappings = {}
+    for column in columns:
+        terms = column_mappings.get(column["id"])
+        if terms:
             table_col = f"{column['table_name']}.{column['name']}"
-            mappings[table_col] = {m.nl_term: m.db_value for m in column_mappings}
+            mappings[table_col] = dict(terms)
 
     return mappings
 
 
-def process_sql_with_value_mappings(sql: str, value_mappings: Dict[str, Dict[str, str]]) -> str:
+def process_sql_with_value_mappings(sql: str, value_mappings: Dict[str, Dict[str, str]],
+                                    connection_id: Optional[int] = None) -> str:
     """
     处理SQL查询，将自然语言术语替换为数据库值
+    解析一次SQL，对已映射列上的比较、LIKE和IN字面量做哈希查找替换
     """
     if not value_mappings:
         return sql
 
-    # 这是一个简化的方法 - 更健壮的实现会使用适当的SQL解析器
-    for column, mappings in value_mappings.items():
-        table, col = column.split('.')
-
-        # 查找类似"table.column = 'value'"或"column = 'value'"的模式
-        for nl_term, db_value in mappings.items():
-            # 尝试匹配带表名的模式
-            pattern1 = rf"({table}\.{col}\s*=\s*['\"])({nl_term})(['\"])"
-            sql = re.sub(pattern1, f"\\1{db_value}\\3", sql, flags=re.IGNORECASE)
-
-            # 尝试匹配不带表名的模式
-            pattern2 = rf"({col}\s*=\s*['\"])({nl_term})(['\"])"
-            sql = re.sub(pattern2, f"\\1{db_value}\\3", sql, flags=re.IGNORECASE)
-
-            # 也处理LIKE模式
-            pattern3 = rf"({table}\.{col}\s+LIKE\s+['\"])%?({nl_term})%?(['\"])"
-            sql = re.sub(pattern3, f"\\1%{db_value}%\\3", sql, flags=re.IGNORECASE)
-
-            pattern4 = rf"({col}\s+LIKE\s+['\"])%?({nl_term})%?(['\"])"
-            sql = re.sub(pattern4, f"\\1%{db_value}%\\3", sql, flags=re.IGNORECASE)
+    if connection_id is not None:
+        compiled = get_compiled_value_mappings(
+            connection_id, get_value_mapping_version(connection_id), value_mappings
+        )
+    else:
+        compiled = compile_value_mappings(value_mappings)
 
-    return sql
+    try:
+        return rewrite_sql_values(sql, compiled)
+    except Exception:
+        # 解析失败时保持原SQL不变
+        return sql
 
 
 def validate_sql(sql: str) -> bool:
@@ -412,222 +438,155 @@ def extract_sql_from_llm_response(response: str) -> str:
     return response
 
 
-def retrieve_relevant_schema(db: Session, connection_id: int, query: str) -> Dict[str, Any]:
+def get_candidate_tables(catalog, query: str, query_analysis: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
-    基于自然语言查询检索相关的表结构信息
-    使用Neo4j图数据库和LLM找到相关表和列
+    获取交给LLM排序的候选表
+    表数量不超过候选数量时直接返回全部表，否则使用向量检索加关键词加分召回
     """
-    try:
-        # 1. 使用LLM分析查询并提取关键实体和意图
-        query_analysis = analyze_query_with_llm(query)
+    top_k = settings.SCHEMA_INDEX_TOP_K
+    if not settings.SCHEMA_INDEX_ENABLED or catalog.table_count <= top_k:
+        return catalog.table_list()
+
+    query_analysis = query_analysis or {}
+    keywords = [str(e) for e in query_analysis.get("entities", [])] + extract_keywords(query)
+    search_text = f"{query} {query_analysis.get('query_intent', '')}".strip()
+    candidates = search_relevant_tables(catalog, search_text, keywords, top_k)
+    if not candidates:
+        return catalog.table_list()[:top_k]
+    return [catalog.tables[table_id] for table_id, _ in candidates]
+
+
+def _match_entity_columns(catalog, query_analysis: Dict[str, Any],
+                          relevant_table_ids: Dict[int, None], table_relevance_scores: Dict[int, float]) -> None:
+    """找到名称或描述匹配实体的列，为其所在表增加相关性分数"""
+    for entity in query_analysis.get("entities", []):
+        for column in catalog.search_columns(str(entity)):
+            table_id = column["table_id"]
+            relevant_table_ids[table_id] = None
+            table_relevance_scores[table_id] = table_relevance_scores.get(table_id, 0) + 0.5
+
+
+def _expand_related_tables(catalog, relevant_table_ids: Dict[int, None],
+                           table_relevance_scores: Dict[int, float]) -> List[Tuple[int, str, str]]:
+    """通过外键扩展1跳，返回新增的(表ID, 表名, 描述)列表"""
+    expanded_ids: Dict[int, None] = {}
+    for target_table_id, source_table_id in catalog.expand_foreign_keys(list(relevant_table_ids)):
+        # 相关表基于源表的分数获得相关性分数
+        source_score = table_relevance_scores.get(source_table_id, 0)
+        table_relevance_scores[target_table_id] = source_score * 0.7  # 相关表分数降低
+        expanded_ids[target_table_id] = None
+    return [
+        (tid, catalog.tables[tid]["name"], catalog.tables[tid]["description"])
+        for tid in expanded_ids
+    ]
+
+
+def _assemble_schema_context(catalog, connection_id: int, relevant_table_ids: Dict[int, None],
+                             table_relevance_scores: Dict[int, float]) -> Dict[str, Any]:
+    """按相关性排序表，并从目录中取出列和表之间的关系"""
+    sorted_table_ids = sorted(
+        relevant_table_ids,
+        key=lambda tid: table_relevance_scores.get(tid, 0),
+        reverse=True
+    )
+    tables_list = [dict(catalog.tables[tid]) for tid in sorted_table_ids]
+
+    # 如果没有找到相关表，返回所有表
+    if not tables_list:
+        tables_list = [dict(t) for t in catalog.table_list()]
+
+    table_ids = [t["id"] for t in tables_list]
+    columns_list = [dict(c) for c in catalog.columns_for_tables(table_ids)]
+    relationships_list = [
+        {
+            "id": rel["id"],
+            "source_table": rel["source_table"],
+            "source_column": rel["source_column"],
+            "target_table": rel["target_table"],
+            "target_column": rel["target_column"],
+            "relationship_type": rel["relationship_type"]
+        }
+        for rel in catalog.relationships_between(table_ids)
+    ]
 
-        # 连接到Neo4j
-        driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
+    return {
+        "tables": tables_list,
+        "columns": columns_list,
+        "relationships": relationships_list,
+        "connection_id": connection_id,
+        "schema_version": catalog.fingerprint
+    }
 
-        # 使用字典按ID跟踪表以防止重复
-        relevant_tables_dict = {}
-        relevant_columns = set()
-        table_relevance_scores = {}
-
-        with driver.session() as session:
-            # 2. 首先，获取此连接的所有表及其描述
-            # 这将用于语义匹配
-            all_tables = session.run(
-                """
-                MATCH (t:Table {connection_id: $connection_id})
-                RETURN t.id AS id, t.name AS name, t.description AS description
-                """,
-                connection_id=connection_id
-            ).data()
-
-            # 3. 使用语义搜索基于查询分析找到相关表
-            relevant_table_ids = find_relevant_tables_semantic(query, query_analysis, all_tables)
-
-            # 4. 按ID获取表并设置相关性分数
-            for table_id, relevance_score in relevant_table_ids:
-
-                # 查找表信息 - next() + 生成器表达式: 高效遍历列表，找到第一个匹配项即停止,None: 如果没有找到匹配项，返回None而不是抛出异常
-                table_info = next((t for t in all_tables if t["id"] == table_id), None)
-                if table_info:
-                    # 在字典中存储表，以ID为键
-                    relevant_tables_dict[table_info["id"]] = (
-                        table_info["id"], table_info["name"], table_info["description"]
-                    )
-                    table_relevance_scores[table_info["id"]] = relevance_score
-
-            # 5. 找到与查询相关的列
-            for entity in query_analysis["entities"]:
-                # 搜索匹配实体名称或描述的列
-                result = session.run(
-                    """
-                    MATCH (c:Column {connection_id: $connection_id})
-                    WHERE toLower(c.name) CONTAINS $entity OR toLower(c.description) CONTAINS $entity
-                    MATCH (t:Table)-[:HAS_COLUMN]->(c)
-                    RETURN c.id AS id, c.name AS name, c.type AS type, c.description AS description,
-                           c.is_pk AS is_pk, c.is_fk AS is_fk, t.id AS table_id, t.name AS table_name
-                    """,
-                    connection_id=connection_id,
-                    entity=entity.lower()
-                )
-
-                for record in result:
-                    relevant_columns.add((
-                        record["id"], record["name"], record["type"], record["description"],
-                        record["is_pk"], record["is_fk"], record["table_id"], record["table_name"]
-                    ))
-                    # 添加表或更新（如果已存在且有更好的描述）
-                    if record["table_id"] not in relevant_tables_dict or not relevant_tables_dict[record["table_id"]][2]:
-                        relevant_tables_dict[record["table_id"]] = (
-                            record["table_id"], record["table_name"], ""
-                        )
-                    # 为有匹配列的表增加相关性分数
-                    table_relevance_scores[record["table_id"]] = table_relevance_scores.get(record["table_id"], 0) + 0.5
-
-            # 6. 如果找到了一些相关表/列，扩展以包含相关表
-            if relevant_tables_dict or relevant_columns:
-                table_ids = list(relevant_tables_dict.keys())
-
-                # 通过外键找到连接的表（1跳）
-                if table_ids:
-                    result = session.run(
-                        """
-                        MATCH (t1:Table {connection_id: $connection_id})-[:HAS_COLUMN]->
-                              (c1:Column)-[:REFERENCES]->
-                              (c2:Column)<-[:HAS_COLUMN]-(t2:Table {connection_id: $connection_id})
-                        WHERE t1.id IN $table_ids AND NOT t2.id IN $table_ids
-                        RETURN t2.id AS id, t2.name AS name, t2.description AS description,
-                               c1.id AS source_column_id, c1.name AS source_column_name,
-                               c2.id AS target_column_id, c2.name AS target_column_name,
-                               t1.id AS source_table_id
-                        """,
-                        connection_id=connection_id,
-                        table_ids=table_ids
-                    )
-
-                    for record in result:
-                        # 添加表或更新（如果已存在且有更好的描述）
-                        if record["id"] not in relevant_tables_dict or (
-                            not relevant_tables_dict[record["id"]][2] and record["description"]
-                        ):
-                            relevant_tables_dict[record["id"]] = (
-                                record["id"], record["name"], record["description"]
-                            )
-                        # 相关表基于源表的分数获得相关性分数
-                        source_score = table_relevance_scores.get(record["source_table_id"], 0)
-                        table_relevance_scores[record["id"]] = source_score * 0.7  # 相关表分数降低
-
-                # 7. 使用LLM评估扩展表是否真正与查询相关
-                expanded_tables = [t for t in relevant_tables_dict.values() if t[0] not in table_ids]
-                if expanded_tables:
-                    filtered_expanded_tables = filter_expanded_tables_with_llm(
-                        query, query_analysis, expanded_tables, table_relevance_scores
-                    )
-                    # 移除LLM认为不相关的表
-                    # 只保留相关表
-                    filtered_table_ids = set(table_ids).union({t[0] for t in filtered_expanded_tables})
-                    relevant_tables_dict = {
-                        tid: t for tid, t in relevant_tables_dict.items() if tid in filtered_table_ids
-                    }
-
-        driver.close()
-
-        # 8. 按相关性分数排序表
-        sorted_tables = sorted(
-            relevant_tables_dict.values(),
-            key=lambda t: table_relevance_scores.get(t[0], 0),
-            reverse=True
+
+async def aretrieve_relevant_schema(db: Session, connection_id: int, query: str) -> Dict[str, Any]:
+    """
+    基于自然语言查询检索相关的表结构信息（异步DAG）
+    LLM查询分析与"加载目录 -> 候选表召回 -> LLM排序"并发执行，
+    外键扩展出的表很少时跳过LLM过滤，结果中附带各阶段耗时（毫秒）
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    skip_threshold = settings.SCHEMA_LLM_SKIP_THRESHOLD
+
+    async def timed(stage: str, awaitable):
+        stage_started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timings[stage] = round((time.perf_counter() - stage_started) * 1000, 1)
+
+    async def rank_tables():
+        # 目录加载和候选召回不依赖LLM分析结果，只使用原始查询
+        catalog = await timed("catalog", asyncio.to_thread(get_schema_catalog, db, connection_id))
+        candidates = await timed("candidates", asyncio.to_thread(get_candidate_tables, catalog, query))
+        ranked = await timed("ranking", afind_relevant_tables_semantic(query, None, candidates))
+        return catalog, ranked
+
+    try:
+        # 1. 并发执行LLM查询分析和表排序
+        query_analysis, (catalog, ranked_tables) = await asyncio.gather(
+            timed("analysis", aanalyze_query_with_llm(query, connection_id)),
+            rank_tables()
         )
 
-        # 转换为字典列表
-        tables_list = [{"id": t[0], "name": t[1], "description": t[2]} for t in sorted_tables]
-
-        # 如果没有找到相关表，返回所有表
-        if not tables_list:
-            all_tables_from_db = crud.schema_table.get_by_connection(db=db, connection_id=connection_id)
-            tables_list = [
-                {
-                    "id": table.id,
-                    "name": table.table_name,
-                    "description": table.description or ""
-                }
-                for table in all_tables_from_db
-            ]
-
-        columns_list = []
-
-        # 获取表的所有列
-        for table in tables_list:
-            table_columns = crud.schema_column.get_by_table(db=db, table_id=table["id"])
-            for column in table_columns:
-                columns_list.append({
-                    "id": column.id,
-                    "name": column.column_name,
-                    "type": column.data_type,
-                    "description": column.description,
-                    "is_primary_key": column.is_primary_key,
-                    "is_foreign_key": column.is_foreign_key,
-                    "table_id": table["id"],
-                    "table_name": table["name"]
-                })
-
-        # 获取表之间的关系
-        relationships_list = []
-        table_ids = [t["id"] for t in tables_list]
-
-        # 如果返回所有表，则获取所有关系
-        all_tables_count = len(crud.schema_table.get_by_connection(db=db, connection_id=connection_id))
-        if len(tables_list) == all_tables_count:
-            all_relationships = crud.schema_relationship.get_by_connection(db=db, connection_id=connection_id)
-
-            for rel in all_relationships:
-                source_table = next((t for t in tables_list if t["id"] == rel.source_table_id), None)
-                target_table = next((t for t in tables_list if t["id"] == rel.target_table_id), None)
-                source_column = next((c for c in columns_list if c["id"] == rel.source_column_id), None)
-                target_column = next((c for c in columns_list if c["id"] == rel.target_column_id), None)
-
-                if source_table and target_table and source_column and target_column:
-                    relationships_list.append({
-                        "id": rel.id,
-                        "source_table": source_table["name"],
-                        "source_column": source_column["name"],
-                        "target_table": target_table["name"],
-                        "target_column": target_column["name"],
-                        "relationship_type": rel.relationship_type
-                    })
+        stage_started = time.perf_counter()
+        # 使用字典按ID跟踪表以防止重复
+        relevant_table_ids: Dict[int, None] = {}
+        table_relevance_scores: Dict[int, float] = {}
+        for table_id, relevance_score in ranked_tables:
+            if catalog.get_table(table_id):
+                relevant_table_ids[table_id] = None
+                table_relevance_scores[table_id] = relevance_score
+
+        # 2. 匹配实体列并通过外键扩展相关表
+        _match_entity_columns(catalog, query_analysis, relevant_table_ids, table_relevance_scores)
+        expanded_tables = _expand_related_tables(catalog, relevant_table_ids, table_relevance_scores) \
+            if relevant_table_ids else []
+        timings["expansion"] = round((time.perf_counter() - stage_started) * 1000, 1)
+
+        # 3. 扩展表较多时才使用LLM评估其是否真正相关（LLM排序始终执行，不相关的候选表不进入提示词）
+        if len(expanded_tables) > skip_threshold:
+            filtered_expanded_tables = await timed("filter", afilter_expanded_tables_with_llm(
+                query, query_analysis, expanded_tables, table_relevance_scores
+            ))
         else:
-            # 如果只返回相关表，则获取这些表之间的关系
-            for table in tables_list:
-                source_rels = crud.schema_relationship.get_by_source_table(db=db, source_table_id=table["id"])
-                target_rels = crud.schema_relationship.get_by_target_table(db=db, target_table_id=table["id"])
-
-                for rel in source_rels + target_rels:
-                    # 只包含相关表集中的表之间的关系
-                    if rel.source_table_id in table_ids and rel.target_table_id in table_ids:
-                        source_table = next((t for t in tables_list if t["id"] == rel.source_table_id), None)
-                        target_table = next((t for t in tables_list if t["id"] == rel.target_table_id), None)
-                        source_column = next((c for c in columns_list if c["id"] == rel.source_column_id), None)
-                        target_column = next((c for c in columns_list if c["id"] == rel.target_column_id), None)
-
-                        if source_table and target_table and source_column and target_column:
-                            # 确保不重复添加关系
-                            rel_dict = {
-                                "id": rel.id,
-                                "source_table": source_table["name"],
-                                "source_column": source_column["name"],
-                                "target_table": target_table["name"],
-                                "target_column": target_column["name"],
-                                "relationship_type": rel.relationship_type
-                            }
-                            if rel_dict not in relationships_list:
-                                relationships_list.append(rel_dict)
-
-        return {
-            "tables": tables_list,
-            "columns": columns_list,
-            "relationships": relationships_list
-        }
+            filtered_expanded_tables = expanded_tables
+        for t in filtered_expanded_tables:
+            relevant_table_ids[t[0]] = None
+
+        # 4. 组装表结构上下文
+        schema_context = _assemble_schema_context(catalog, connection_id, relevant_table_ids, table_relevance_scores)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        schema_context["timings"] = timings
+        logger.info(f"表结构检索完成: connection_id={connection_id}, timings={timings}")
+        return schema_context
     except Exception as e:
         raise Exception(f"检索表结构上下文时出错: {str(e)}")
+
+
+def retrieve_relevant_schema(db: Session, connection_id: int, query: str) -> Dict[str, Any]:
+    """
+    基于自然语言查询检索相关的表结构信息
+    使用进程内表结构目录和LLM找到相关表和列
+    """
+    return run_coroutine_sync(aretrieve_relevant_schema(db, connection_id, query))
@@ -0,0 +1,79 @@
+"""
+值映射缓存模块
+按连接预加载自然语言术语到数据库值的映射，值映射增删改时失效
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import logging
+import threading
+from typing import Dict, List, Iterable
+
+from sqlalchemy.orm import Session
+
+from app import crud
+
+logger = logging.getLogger(__name__)
+
+# connection_id -> {column_id: {nl_term: db_value}}
+_mapping_cache: Dict[int, Dict[int, Dict[str, str]]] = {}
+# 每个连接的版本号，失效时单调递增
+_mapping_versions: Dict[int, int] = {}
+_mapping_lock = threading.Lock()
+
+
+def _group_by_column(mappings: Iterable) -> Dict[int, Dict[str, str]]:
+    """把值映射记录按列分组"""
+    grouped: Dict[int, Dict[str, str]] = {}
+    for m in mappings:
+        grouped.setdefault(m.column_id, {})[m.nl_term] = m.db_value
+    return grouped
+
+
+def get_connection_value_mappings(db: Session, connection_id: int) -> Dict[int, Dict[str, str]]:
+    """获取连接下所有列的值映射，未缓存时一次查询预加载"""
+    with _mapping_lock:
+        cached = _mapping_cache.get(connection_id)
+        if cached is not None:
+            return cached
+        version = _mapping_versions.setdefault(connection_id, 1)
+
+    grouped = _group_by_column(crud.value_mapping.get_by_connection(db=db, connection_id=connection_id))
+
+    with _mapping_lock:
+        # 加载期间若已失效，则本次结果不写入缓存
+        if _mapping_versions.get(connection_id) == version:
+            _mapping_cache[connection_id] = grouped
+            logger.info(
+                f"值映射已加载: connection_id={connection_id}, columns={len(grouped)}, "
+                f"terms={sum(len(v) for v in grouped.values())}"
+            )
+    return grouped
+
+
+def get_column_value_mappings(db: Session, column_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """不经缓存，一次IN查询获取指定列的值映射"""
+    return _group_by_column(crud.value_mapping.get_by_column_ids(db=db, column_ids=column_ids))
+
+
+def invalidate_value_mappings(connection_id: int) -> int:
+    """使连接的值映射缓存失效，返回新的版本号"""
+    with _mapping_lock:
+        _mapping_cache.pop(connection_id, None)
+        version = _mapping_versions.get(connection_id, 0) + 1
+        _mapping_versions[connection_id] = version
+    logger.info(f"值映射缓存已失效: connection_id={connection_id}, new_version={version}")
+    return version
+
+
+def get_value_mapping_version(connection_id: int) -> int:
+    """获取连接当前的值映射版本号"""
+    with _mapping_lock:
+        return _mapping_versions.get(connection_id, 0)
+
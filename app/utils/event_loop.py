@@ -0,0 +1,79 @@
+"""
+事件循环注册
+记录服务主事件循环（应用启动时注册），供绑定事件循环的资源（如AsyncMilvusClient）判断当前是否在主循环上；
+同步代码中运行协程时提交到主循环或一个常驻后台循环，不为每次调用创建并关闭新循环
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+
+
+def set_main_loop(loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """注册服务主事件循环（lifespan启动时调用，关闭时传None）"""
+    global _main_loop
+    _main_loop = loop
+
+
+def get_main_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """获取仍在运行的主事件循环，未注册或已关闭时返回None"""
+    loop = _main_loop
+    if loop is None or loop.is_closed():
+        return None
+    return loop
+
+
+def on_main_loop() -> bool:
+    """当前线程是否正运行在主事件循环上"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return loop is get_main_loop()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取常驻后台事件循环（守护线程，首次使用时启动）"""
+    global _background_loop
+    if _background_loop is None:
+        with _background_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="sync-bridge-loop", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+def run_coroutine_sync(coro):
+    """
+    在同步代码中运行协程并等待结果
+    普通线程（如FastAPI同步端点的线程池）提交到主事件循环；当前线程正运行事件循环（阻塞等待会卡住它）
+    或主循环不可用时提交到常驻后台循环。循环都是长期存在的，循环内创建的任务和客户端不会随调用结束被取消或泄漏
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    main = get_main_loop()
+    if running is None and main is not None and main.is_running():
+        loop = main
+    else:
+        loop = _get_background_loop()
+    if running is loop:
+        # 后台循环上的同步代码再次调用，无法提交给自己，退化为独立线程中的临时循环
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
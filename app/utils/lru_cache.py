@@ -0,0 +1,145 @@
+"""
+带TTL和容量上限的线程安全LRU缓存
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """
+    LRU缓存，条目超过ttl秒后过期，超过max_size条时淘汰最久未使用的条目
+    ttl为None或0表示不过期；指定max_bytes和sizeof时同时按占用内存淘汰
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl or None
+        self.max_bytes = max_bytes or None
+        self._sizeof = sizeof if self.max_bytes else None
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _remove(self, key: Hashable) -> Any:
+        """删除条目并更新内存统计，调用方需持有锁"""
+        value, _ = self._data.pop(key)
+        self._bytes -= self._sizes.pop(key, 0)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取条目，命中时刷新其LRU位置"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, stored_at = item
+            if self._expired(stored_at, now):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """读取条目但不影响统计和LRU顺序"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or self._expired(item[1], now):
+                return default
+            return item[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入条目，必要时淘汰最久未使用的条目"""
+        size = self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.time())
+            if self._sizeof:
+                self._sizes[key] = size
+                self._bytes += size
+            while len(self._data) > self.max_size or (self.max_bytes and self._bytes > self.max_bytes
+                                                      and len(self._data) > 1):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def purge_expired(self) -> int:
+        """清理已过期条目，返回清理数量"""
+        if self.ttl is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (_, stored_at) in self._data.items() if self._expired(stored_at, now)]
+            for k in expired:
+                self._remove(k)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """未过期条目的 (键, 值) 快照，按LRU顺序（最久未使用在前），不影响统计和LRU顺序"""
+        now = time.time()
+        with self._lock:
+            return [(k, value) for k, (value, stored_at) in self._data.items() if not self._expired(stored_at, now)]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率等统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
@@ -0,0 +1,94 @@
+"""
+向量工具函数
+嵌入向量在服务内部统一使用连续的float32 numpy数组（批量为二维数组），只在API边界转换为列表
+"""
+"""
+版权所有 (c) 2023-2026 北京慧测信息技术有限公司(但问智能) 保留所有权利。
+
+本代码版权归北京慧测信息技术有限公司(但问智能)所有，仅用于学习交流目的，未经公司商业授权，
+不得用于任何商业用途，包括但不限于商业环境部署、售卖或以任何形式进行商业获利。违者必究。
+
+授权商业应用请联系微信：huice666
+"""
+
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+def as_float32_vector(vector: Any) -> np.ndarray:
+    """转换为一维连续float32数组，已是float32数组时不复制"""
+    return np.ascontiguousarray(np.asarray(vector, dtype=np.float32).reshape(-1))
+
+
+def as_float32_matrix(vectors: Any, dim: Optional[int] = None) -> np.ndarray:
+    """转换为二维连续float32数组，空输入返回(0, dim)形状"""
+    if isinstance(vectors, np.ndarray):
+        matrix = vectors.astype(np.float32, copy=False)
+    elif len(vectors) == 0:
+        return np.empty((0, dim or 0), dtype=np.float32)
+    else:
+        matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return np.ascontiguousarray(matrix)
+
+
+def frozen_copy(vector: np.ndarray) -> np.ndarray:
+    """复制为只读float32数组，用于缓存中共享的向量，避免调用方原地修改"""
+    copied = np.array(vector, dtype=np.float32)
+    copied.setflags(write=False)
+    return copied
+
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    """L2归一化单个向量，零向量原样返回"""
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行L2归一化，零向量保持为零"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_select(embeddings: np.ndarray, relevance: np.ndarray, k: int, lambda_mult: float = 0.7,
+               duplicate_threshold: Optional[float] = None) -> np.ndarray:
+    """
+    最大边际相关性(MMR)选择，返回选中行的下标（按选择顺序）
+    每步选择 lambda*相关性 - (1-lambda)*与已选集合的最大余弦相似度 最大的候选；
+    与已选集合相似度达到duplicate_threshold的候选视为重复直接丢弃，因此可能少于k个
+    """
+    n = len(embeddings)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    vectors = normalize_rows(as_float32_matrix(embeddings))
+    similarity = vectors @ vectors.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+    idx = int(np.argmax(relevance))
+    while True:
+        selected.append(idx)
+        available[idx] = False
+        np.maximum(max_similarity, similarity[idx], out=max_similarity)
+        if duplicate_threshold is not None:
+            available &= max_similarity < duplicate_threshold
+        if len(selected) >= k or not available.any():
+            break
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        idx = int(np.argmax(np.where(available, scores, -np.inf)))
+    return np.asarray(selected, dtype=np.int64)
+
+
+def to_list(vector: Optional[Sequence[float]]) -> Optional[List[float]]:
+    """API边界处把向量转换为JSON可序列化的列表"""
+    if vector is None:
+        return None
+    if isinstance(vector, np.ndarray):
+        return vector.tolist()
+    return [float(v) for v in vector]
@@ -1,5 +1,6 @@
 # FastAPI应用入口
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,6 +9,11 @@ from fastapi.exceptions import RequestValidationError
 
 from app.api.v1.api import api_router
 from app.config.settings import get_settings
+from app.core.milvus_processor.client_pool import aclose_milvus_clients
+from app.core.milvus_processor.load_manager import get_load_manager
+from app.core.vectorization.embedding_cache import close_embedding_cache
+from app.services.test_to_sql.qa_local_index import save_local_qa_indexes
+from app.utils.event_loop import set_main_loop
 from app.utils.logger import setup_logging
 from app.utils.exceptions import ExceptionHandlers, AppException
 
@@ -30,7 +36,20 @@ async def lifespan(app: FastAPI):
     logger.info(f"🚀 {app.title} v{app.version} 启动中...")
     logger.info("=" * 60)
 
+    background_tasks = []
+    # 绑定事件循环的共享资源（异步Milvus客户端等）只在主循环上使用
+    set_main_loop(asyncio.get_running_loop())
     try:
+        # Milvus集合预热（后台执行，完成前 /api/v1/ready 返回503）与空闲集合释放
+        load_manager = get_load_manager()
+        if settings.MILVUS_WARMUP_ENABLED:
+            background_tasks.append(asyncio.create_task(load_manager.warmup(settings.MILVUS_WARMUP_COLLECTIONS)))
+        else:
+            load_manager.mark_ready()
+        background_tasks.append(asyncio.create_task(
+            load_manager.run_idle_releaser(settings.MILVUS_LOAD_CHECK_INTERVAL)
+        ))
+
         # 其他启动逻辑
         logger.info("✅ 应用启动完成")
         logger.info(f"📍 访问地址: http://{settings.HOST}:{settings.PORT}")
@@ -49,6 +68,13 @@ async def lifespan(app: FastAPI):
 
     try:
         # 清理资源
+        for task in background_tasks:
+            task.cancel()
+        get_load_manager().save_state()
+        save_local_qa_indexes()
+        close_embedding_cache()
+        await aclose_milvus_clients()
+        set_main_loop(None)
         logger.info("✅ 应用关闭完成")
     except Exception as e:
         logger.error(f"❌ 应用关闭失败: {str(e)}")
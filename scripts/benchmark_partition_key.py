@@ -0,0 +1,122 @@
+# 分区键多租户检索基准脚本
+# 在Milvus中分别创建 标量过滤(共享集合) 与 connection_id分区键 两个临时集合，写入相同的多连接合成数据，
+# 按随机连接检索并比较p50/p95延迟与QPS，结束后删除临时集合
+#
+# 用法:
+#   python scripts/benchmark_partition_key.py --connections 128 --per-connection 500
+#   python scripts/benchmark_partition_key.py --connections 512 --per-connection 200 --partitions 128
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pymilvus import DataType
+
+from app.core.milvus_processor.client_pool import close_milvus_clients, get_milvus_client
+from app.core.milvus_processor.index_config import add_vector_fields, add_vector_indexes, get_index_profile
+from app.utils.vector_utils import normalize_rows
+
+
+def create_collection(client, name: str, dim: int, partition_key: bool, num_partitions: int, profile):
+    if client.has_collection(collection_name=name):
+        client.drop_collection(collection_name=name)
+    schema = client.create_schema(auto_id=False, enable_dynamic_field=False)
+    schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
+    schema.add_field(field_name="connection_id", datatype=DataType.INT64, is_partition_key=partition_key)
+    add_vector_fields(schema, DataType, "vector", dim, profile)
+    index_params = client.prepare_index_params()
+    add_vector_indexes(index_params, "vector", profile)
+    if not partition_key:
+        # 标量过滤方案给connection_id建倒排索引，作为公平的对照
+        index_params.add_index(field_name="connection_id", index_type="INVERTED")
+    kwargs = {"num_partitions": num_partitions} if partition_key else {}
+    client.create_collection(collection_name=name, schema=schema, index_params=index_params, **kwargs)
+
+
+def load_data(client, name: str, vectors: np.ndarray, connection_ids: np.ndarray, batch_size: int = 5000):
+    for start in range(0, len(vectors), batch_size):
+        end = min(start + batch_size, len(vectors))
+        client.insert(collection_name=name, data=[
+            {"id": i, "connection_id": int(connection_ids[i]), "vector": vectors[i]}
+            for i in range(start, end)
+        ])
+    client.flush(collection_name=name)
+    client.load_collection(collection_name=name)
+
+
+def run_queries(client, name: str, queries: np.ndarray, query_connections: np.ndarray, top_k: int, profile):
+    latencies = []
+    for query, connection_id in zip(queries, query_connections):
+        start = time.perf_counter()
+        client.search(
+            collection_name=name,
+            data=[query],
+            anns_field="vector",
+            limit=top_k,
+            filter=f"connection_id == {int(connection_id)}",
+            search_params=profile.search_params(top_k),
+            output_fields=["connection_id"]
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+    total_seconds = sum(latencies) / 1000
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "qps": len(latencies) / total_seconds if total_seconds else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分区键多租户检索基准")
+    parser.add_argument("--uri", default=None, help="Milvus地址，默认取配置")
+    parser.add_argument("--connections", type=int, default=128)
+    parser.add_argument("--per-connection", type=int, default=500)
+    parser.add_argument("--partitions", type=int, default=64)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="保留临时集合")
+    args = parser.parse_args()
+
+    client = get_milvus_client(args.uri)
+    profile = get_index_profile("qa_pairs").without_binary()
+    rng = np.random.default_rng(args.seed)
+    total = args.connections * args.per_connection
+    vectors = normalize_rows(rng.standard_normal((total, args.dim)).astype(np.float32)).astype(np.float32)
+    connection_ids = np.repeat(np.arange(1, args.connections + 1), args.per_connection)
+    queries = normalize_rows(rng.standard_normal((args.queries, args.dim)).astype(np.float32)).astype(np.float32)
+    query_connections = rng.integers(1, args.connections + 1, args.queries)
+
+    print(f"数据: {args.connections} 个连接 x {args.per_connection} 条 = {total} 条, dim={args.dim}, "
+          f"索引={profile.index_type}, 分区数={args.partitions}")
+    setups = [("标量过滤", "bench_qa_filter", False), ("分区键", "bench_qa_partition_key", True)]
+    try:
+        for label, name, partition_key in setups:
+            create_collection(client, name, args.dim, partition_key, args.partitions, profile)
+            start = time.perf_counter()
+            load_data(client, name, vectors, connection_ids)
+            print(f"{label}: 写入并加载耗时 {time.perf_counter() - start:.1f}s")
+            # 预热
+            run_queries(client, name, queries[:20], query_connections[:20], args.top_k, profile)
+
+        print(f"{'方案':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'QPS':>10}")
+        for label, name, _ in setups:
+            stats = run_queries(client, name, queries, query_connections, args.top_k, profile)
+            print(f"{label:<10}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['qps']:>10.1f}")
+    finally:
+        if not args.keep:
+            for _, name, _ in setups:
+                if client.has_collection(collection_name=name):
+                    client.drop_collection(collection_name=name)
+        close_milvus_clients()
+
+
+if __name__ == "__main__":
+    main()
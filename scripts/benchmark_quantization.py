@@ -0,0 +1,167 @@
+# 向量量化召回率/内存基准脚本
+# 离线比较 float32 / SQ8 / PQ / 二值 量化在有无精确重排时的 recall@k、单向量内存和查询耗时，
+# 用于为 milvus_index 配置选择量化方式和 rerank_factor
+#
+# 用法:
+#   python scripts/benchmark_quantization.py                      # 合成的聚簇向量
+#   python scripts/benchmark_quantization.py --vectors emb.npy   # 使用导出的真实向量 (n, dim)
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.vector_utils import normalize_rows
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def make_dataset(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """生成带簇结构的归一化向量，近似真实语义向量的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    data = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(data).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """每行取得分最高的k个下标（按得分降序）"""
+    idx = np.argpartition(-scores, kth=min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def rerank(base: np.ndarray, queries: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """用原始float向量对候选精确重排"""
+    exact = np.einsum("qd,qcd->qc", queries, base[candidates])
+    order = np.argsort(-exact, axis=1)[:, :k]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+class SQ8:
+    """按维度最小/最大值的int8标量量化"""
+    name = "sq8"
+
+    def __init__(self, base: np.ndarray):
+        self.low = base.min(axis=0)
+        self.scale = (base.max(axis=0) - self.low) / 255.0
+        self.scale[self.scale == 0] = 1.0
+        self.codes = np.round((base - self.low) / self.scale).astype(np.uint8)
+
+    def bytes_per_vector(self) -> float:
+        return self.codes.shape[1]
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        decoded = self.codes.astype(np.float32) * self.scale + self.low
+        return queries @ decoded.T
+
+
+class PQ:
+    """乘积量化：m个子空间各256个中心，查询时查表计算内积"""
+    name = "pq"
+
+    def __init__(self, base: np.ndarray, m: int, iterations: int, seed: int):
+        n, dim = base.shape
+        if dim % m:
+            raise ValueError(f"维度 {dim} 不能被 pq_m={m} 整除")
+        self.m, self.sub = m, dim // m
+        rng = np.random.default_rng(seed)
+        self.centroids = np.empty((m, 256, self.sub), dtype=np.float32)
+        self.codes = np.empty((n, m), dtype=np.uint8)
+        for j in range(m):
+            part = base[:, j * self.sub:(j + 1) * self.sub]
+            centers = part[rng.choice(n, 256, replace=n < 256)].copy()
+            for _ in range(iterations):
+                assign = self._assign(part, centers)
+                for c in range(256):
+                    members = part[assign == c]
+                    if len(members):
+                        centers[c] = members.mean(axis=0)
+            self.centroids[j] = centers
+            self.codes[:, j] = self._assign(part, centers)
+
+    @staticmethod
+    def _assign(part: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        """最近中心：||x-c||^2 = ||c||^2 - 2x·c + 常数"""
+        return np.argmin((centers ** 2).sum(axis=1) - 2 * part @ centers.T, axis=1)
+
+    def bytes_per_vector(self) -> float:
+        return self.m
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        q = queries.reshape(len(queries), self.m, self.sub)
+        tables = np.einsum("qms,mcs->qmc", q, self.centroids)
+        return sum(tables[:, j, self.codes[:, j]] for j in range(self.m))
+
+
+class Binary:
+    """符号位二值量化，汉明距离越小越相似"""
+    name = "binary"
+
+    def __init__(self, base: np.ndarray):
+        self.codes = np.packbits(base > 0, axis=1)
+
+    def bytes_per_vector(self) -> float:
+        return self.codes.shape[1]
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        q_codes = np.packbits(queries > 0, axis=1)
+        return -np.stack([_POPCOUNT[np.bitwise_xor(self.codes, code)].sum(axis=1) for code in q_codes])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量量化召回率/内存基准")
+    parser.add_argument("--vectors", help="真实向量文件(.npy, 形状为(n, dim))")
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factors", default="1,2,4,8")
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--pq-iterations", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.vectors:
+        data = normalize_rows(np.load(args.vectors).astype(np.float32)).astype(np.float32)
+    else:
+        data = make_dataset(args.n + args.queries, args.dim, args.clusters, args.seed)
+    queries, base = data[:args.queries], data[args.queries:]
+    k = args.k
+    factors = [int(f) for f in args.rerank_factors.split(",")]
+
+    start = time.perf_counter()
+    truth = top_k(queries @ base.T, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"数据: n={len(base)}, dim={base.shape[1]}, queries={len(queries)}, k={k}")
+    print(f"{'方法':<10}{'字节/向量':>10}{'压缩比':>8}{'重排倍数':>10}{'recall@k':>10}{'ms/查询':>10}")
+    print(f"{'float32':<10}{base.shape[1] * 4:>10}{1.0:>8.1f}{'-':>10}{1.0:>10.3f}{flat_ms:>10.2f}")
+
+    quantizers = [SQ8(base), PQ(base, args.pq_m, args.pq_iterations, args.seed), Binary(base)]
+    for quantizer in quantizers:
+        start = time.perf_counter()
+        scores = quantizer.scores(queries)
+        search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        ratio = base.shape[1] * 4 / quantizer.bytes_per_vector()
+        for factor in factors:
+            start = time.perf_counter()
+            candidates = top_k(scores, k * factor)
+            found = rerank(base, queries, candidates, k) if factor > 1 else candidates[:, :k]
+            elapsed = search_ms + (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{quantizer.name:<10}{quantizer.bytes_per_vector():>10.0f}{ratio:>8.1f}"
+                  f"{factor:>10}{recall(found, truth):>10.3f}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
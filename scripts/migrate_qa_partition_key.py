@@ -0,0 +1,60 @@
+# 问答对集合分区键迁移脚本
+# 把未启用分区键的问答对集合迁移为以connection_id为分区键的新集合：复制数据、核对行数后改名切换，
+# 原集合保留为 <集合名>_bak_<时间戳>（--drop-old 时删除）。迁移期间请暂停问答对写入
+#
+# 用法:
+#   python scripts/migrate_qa_partition_key.py --database-name sales       # 迁移 sales_qa_pairs
+#   python scripts/migrate_qa_partition_key.py --all                       # 迁移所有 *_qa_pairs 集合
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.milvus_processor.client_pool import close_milvus_clients
+from app.services.test_to_sql.hybrid_retrieval_service import MilvusService
+
+
+def find_qa_collections(service: MilvusService):
+    """列出所有问答对集合（排除迁移产生的临时和备份集合）"""
+    return [name for name in service.client.list_collections()
+            if name.endswith("_qa_pairs") and "_bak_" not in name]
+
+
+async def migrate(args):
+    service = MilvusService(database_name=args.database_name)
+    collections = find_qa_collections(service) if args.all else [service.collection_name]
+    print(f"待迁移集合: {collections}")
+
+    for name in collections:
+        service.collection_name = name
+        try:
+            result = await service.migrate_to_partition_key(batch_size=args.batch_size, drop_old=args.drop_old)
+        except Exception as e:
+            print(f"❌ {name} 迁移失败: {e}")
+            continue
+        if result["migrated"]:
+            print(f"✅ {name}: {result['rows']} 条, 耗时 {result['seconds']}s, 备份: {result['backup']}")
+        else:
+            print(f"⏭️ {name}: 已启用分区键，跳过")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="问答对集合分区键迁移")
+    parser.add_argument("--database-name", default=None, help="业务数据库名称，对应 <名称>_qa_pairs 集合")
+    parser.add_argument("--all", action="store_true", help="迁移所有问答对集合")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-old", action="store_true", help="迁移成功后删除原集合")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(migrate(args))
+    finally:
+        close_milvus_clients()
+
+
+if __name__ == "__main__":
+    main()
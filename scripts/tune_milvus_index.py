@@ -0,0 +1,71 @@
+# Milvus向量索引搜索参数调优脚本
+# 抽样查询，对比暴力检索的真实top-k测量各组搜索参数(ef / nprobe / rerank_factor)的recall@k与p95延迟，
+# 输出满足目标召回率且延迟最低的参数，可直接写入config.yaml的milvus_index配置
+#
+# 用法:
+#   python scripts/tune_milvus_index.py --collection mydb_qa_pairs --profile qa_pairs --field vector
+#   python scripts/tune_milvus_index.py --collection documents --profile documents --field content_dense \
+#       --db milvus_database --target-recall 0.9
+
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config.settings import settings
+from app.core.milvus_processor.client_pool import close_milvus_clients, get_milvus_client
+from app.core.milvus_processor.index_config import get_index_profile
+from app.core.milvus_processor.index_tuner import IndexTuner, recommended_nlist
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Milvus向量索引搜索参数调优")
+    parser.add_argument("--collection", required=True, help="集合名称")
+    parser.add_argument("--profile", default="qa_pairs", help="milvus_index中的配置名(qa_pairs/documents)")
+    parser.add_argument("--field", default="vector", help="float向量字段名")
+    parser.add_argument("--id-field", default="id", help="主键字段名")
+    parser.add_argument("--db", default=None, help="数据库名称")
+    parser.add_argument("--uri", default=None, help="Milvus地址，默认取配置")
+    parser.add_argument("--filter", default=None, help="过滤表达式，如 connection_id == 1")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    client = get_milvus_client(args.uri or settings.MILVUS_URI, args.db)
+    profile = get_index_profile(args.profile)
+    try:
+        index_info = client.describe_index(collection_name=args.collection, index_name=args.field)
+        profile = profile.for_existing_index((index_info or {}).get("index_type"))
+        row_count = int(client.get_collection_stats(args.collection).get("row_count", 0))
+        print(f"集合: {args.collection}, 行数: {row_count}, 索引: {profile.index_type} {profile.index_params()}")
+
+        tuner = IndexTuner(client, args.collection, args.field, profile,
+                           id_field=args.id_field, filter_expr=args.filter)
+        best, results = tuner.tune(args.target_recall, args.k, args.queries, args.seed)
+
+        print(f"{'搜索参数':<32}{'recall@k':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+        for result in results:
+            print(f"{str(result.search_settings):<32}{result.recall:>10.3f}"
+                  f"{result.p50_ms:>10.2f}{result.p95_ms:>10.2f}")
+
+        if best is None:
+            print("没有可测试的搜索参数")
+            return
+        if best.recall < args.target_recall:
+            print(f"\n没有参数达到目标召回率 {args.target_recall}，以下为召回率最高的参数，"
+                  f"可考虑提高hnsw_m/ef_construction或nlist后重建索引")
+        print(f"\n推荐配置 (milvus_index.{args.profile}):")
+        for key, value in best.search_settings.items():
+            print(f"    {key}: {value}")
+        if not profile.is_hnsw and profile.quantization != "auto":
+            print(f"按当前数据量建议的nlist(需重建索引): {recommended_nlist(row_count)}，当前: {profile.nlist}")
+    finally:
+        close_milvus_clients()
+
+
+if __name__ == "__main__":
+    main()
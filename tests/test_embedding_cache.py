@@ -0,0 +1,125 @@
+"""
+持久化向量缓存单元测试
+
+SQLite存储后端（过期过滤、分批IN查询）、后台批量写入与关闭时落盘、文档向量的缓存命中合并
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.vectorization import embedding_cache
+from app.core.vectorization.embedding_cache import (
+    PersistentEmbeddingCache, SqliteEmbeddingStore, document_cache_key, embed_documents_cached
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteEmbeddingStore(str(tmp_path / "cache" / "embeddings.db"), mmap_size=0)
+    yield store
+    store.close()
+
+
+def blob(*values) -> bytes:
+    return np.asarray(values, dtype=np.float32).tobytes()
+
+
+def test_sqlite_store_filters_expired(store, monkeypatch):
+    """测试过期条目不再返回，ttl为None的条目不过期"""
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    store.mset({"short": blob(1.0)}, ttl=10)
+    store.mset({"forever": blob(2.0)}, ttl=None)
+
+    assert store.mget(["short", "forever"]) == [blob(1.0), blob(2.0)]
+    now[0] += 11
+    assert store.mget(["short", "forever"]) == [None, blob(2.0)]
+
+
+def test_sqlite_store_batches_large_reads(store):
+    """测试键数超过单条语句参数上限时分批查询，结果按请求顺序返回"""
+    count = embedding_cache._SQLITE_BATCH * 2 + 7
+    store.mset({f"k{i}": blob(float(i)) for i in range(0, count, 2)}, ttl=None)
+
+    values = store.mget([f"k{i}" for i in range(count)])
+
+    assert len(values) == count
+    assert values[4] == blob(4.0)
+    assert values[count - 1] == blob(float(count - 1))
+    assert values[3] is None
+    assert sum(value is not None for value in values) == (count + 1) // 2
+
+
+def test_write_behind_flushes_in_background(store):
+    """测试put_many只入队，后台线程按flush_interval批量写入"""
+    cache = PersistentEmbeddingCache(store, namespace="emb:v1", flush_interval=0.01)
+    try:
+        cache.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+        deadline = time.time() + 2
+        while cache.stats()["writes"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert cache.stats()["writes"] == 2
+        found = cache.get_many(["a", "b", "c"])
+        assert found["a"].tolist() == [1.0, 2.0]
+        assert set(found) == {"a", "b"}
+        assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 1)
+    finally:
+        cache.close()
+
+
+def test_close_drains_pending_writes(tmp_path):
+    """测试关闭时写完队列中剩余的向量，重新打开后可以读到"""
+    path = str(tmp_path / "embeddings.db")
+    cache = PersistentEmbeddingCache(SqliteEmbeddingStore(path, mmap_size=0), namespace="emb:v1",
+                                     flush_interval=60)
+    cache.put_many({f"q{i}": [float(i)] for i in range(300)})
+    cache.close()
+
+    reopened = SqliteEmbeddingStore(path, mmap_size=0)
+    try:
+        assert reopened.mget(["emb:v1:q0", "emb:v1:q299"]) == [blob(0.0), blob(299.0)]
+    finally:
+        reopened.close()
+
+
+class CountingProvider:
+    name = "hashing"
+    model_name = "hashing-2"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_embed_documents_cached_merges_hits_and_misses(tmp_path, monkeypatch):
+    """测试命中的文本不再调用提供者，未命中的文本去重后只计算一次，结果按输入顺序合并并写回缓存"""
+    path = str(tmp_path / "embeddings.db")
+    cache = PersistentEmbeddingCache(SqliteEmbeddingStore(path, mmap_size=0), namespace="emb:v1",
+                                     flush_interval=60)
+    monkeypatch.setattr(embedding_cache, "get_embedding_cache", lambda: cache)
+    provider = CountingProvider()
+    cache.store.mset({cache._full_key(document_cache_key(provider, "cached")): blob(9.0, 9.0)}, ttl=None)
+    try:
+        result = embed_documents_cached(provider, ["new", "cached", "new", "longer"])
+    finally:
+        cache.close()
+
+    assert provider.calls == [["new", "longer"]]
+    assert result.tolist() == [[3.0, 1.0], [9.0, 9.0], [3.0, 1.0], [6.0, 1.0]]
+    reopened = SqliteEmbeddingStore(path, mmap_size=0)
+    try:
+        assert reopened.mget([cache._full_key(document_cache_key(provider, "longer"))]) == [blob(6.0, 1.0)]
+    finally:
+        reopened.close()
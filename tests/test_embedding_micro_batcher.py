@@ -0,0 +1,105 @@
+"""
+问题向量化微批处理单元测试
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql.hybrid_retrieval_service import EmbeddingMicroBatcher
+
+
+def make_embedder(calls):
+    async def embed_batch(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0)
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+    return embed_batch
+
+
+def test_concurrent_requests_share_one_batch():
+    """测试等待窗口内的并发请求合并为一次批量嵌入，相同文本只计算一次"""
+    calls = []
+
+    async def run():
+        batcher = EmbeddingMicroBatcher(make_embedder(calls), max_batch_size=32, max_wait_ms=5)
+        results = await asyncio.gather(*[batcher.submit(text) for text in ["a", "bb", "a", "ccc"]])
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert calls == [["a", "bb", "ccc"]]
+    assert [r[0] for r in results] == [1.0, 2.0, 1.0, 3.0]
+    assert batcher.stats() == {"requests": 4, "coalesced": 1, "batches": 1, "average_batch_size": 3.0}
+
+
+def test_full_batch_flushes_without_waiting():
+    """测试凑够max_batch_size时立即发起批量嵌入"""
+    calls = []
+
+    async def run():
+        batcher = EmbeddingMicroBatcher(make_embedder(calls), max_batch_size=2, max_wait_ms=10000)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.submit("a"), batcher.submit("bb")), timeout=1
+        )
+
+    asyncio.run(run())
+    assert calls == [["a", "bb"]]
+
+
+def test_batch_failure_propagates_to_all_waiters():
+    """测试批量嵌入失败时同批次所有等待者都收到异常，之后可重新提交"""
+    attempts = []
+
+    async def flaky(texts):
+        attempts.append(list(texts))
+        if len(attempts) == 1:
+            raise ConnectionError("embedding service down")
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    async def run():
+        batcher = EmbeddingMicroBatcher(flaky, max_batch_size=32, max_wait_ms=1)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        retry = await batcher.submit("a")
+        return results, retry
+
+    results, retry = asyncio.run(run())
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert retry.tolist() == [1.0, 1.0]
+    assert attempts == [["a", "b"], ["a"]]
+
+
+def test_cancelled_caller_does_not_cancel_batch():
+    """测试单个调用方取消不影响同批次的其他等待者"""
+    async def run():
+        batcher = EmbeddingMicroBatcher(make_embedder([]), max_batch_size=32, max_wait_ms=5)
+        cancelled = asyncio.ensure_future(batcher.submit("a"))
+        other = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return await other
+
+    assert asyncio.run(run()).tolist() == [1.0, 1.0]
+
+
+def test_short_batch_response_fails_all_waiters():
+    """测试批量嵌入返回的向量数少于文本数时所有等待者都收到异常而不是永远挂起"""
+    async def short(texts):
+        return np.ones((len(texts) - 1, 2), dtype=np.float32)
+
+    async def run():
+        batcher = EmbeddingMicroBatcher(short, max_batch_size=32, max_wait_ms=1)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True), timeout=1
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
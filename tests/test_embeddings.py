@@ -0,0 +1,88 @@
+"""
+嵌入提供者单元测试
+
+确定性哈希嵌入（离线回归测试检索用），以及VectorService使用哈希嵌入的端到端向量化
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.vectorization.embeddings import HASHING, HashingEmbeddingProvider, get_embedding_provider
+from app.services.test_to_sql import hybrid_retrieval_service
+from app.services.test_to_sql.hybrid_retrieval_service import VectorService
+
+
+def test_hashing_is_deterministic_across_instances():
+    """测试同一文本在不同实例中的向量完全一致"""
+    texts = ["统计每个城市的订单数", "Top 10 customers by revenue"]
+
+    first = HashingEmbeddingProvider(dimension=256).embed_documents(texts)
+    second = HashingEmbeddingProvider(dimension=256).embed_documents(texts)
+
+    assert np.array_equal(first, second)
+
+
+def test_hashing_dimension_dtype_and_unit_norm():
+    """测试输出维度、float32类型和单位范数，空输入返回 (0, dim)"""
+    provider = HashingEmbeddingProvider(dimension=128)
+
+    matrix = provider.embed_documents(["查询销售额", "select count(*) from orders", "客户"])
+
+    assert matrix.shape == (3, 128)
+    assert matrix.dtype == np.float32
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-6)
+    assert provider.embed_documents([]).shape == (0, 128)
+
+
+def test_hashing_query_equals_document():
+    """测试同一文本的embed_query与embed_documents结果相同（同步与异步接口一致）"""
+    provider = HashingEmbeddingProvider(dimension=64)
+    text = "查询2024年北京的销售额"
+
+    document = provider.embed_documents([text])[0]
+
+    assert np.array_equal(provider.embed_query(text), document)
+    assert np.array_equal(asyncio.run(provider.aembed_query(text)), document)
+
+
+def test_hashing_similarity_follows_word_overlap():
+    """测试词面重叠越多余弦相似度越高"""
+    provider = HashingEmbeddingProvider(dimension=1024)
+    query, similar, unrelated = provider.embed_documents(["统计每个城市的订单数", "统计每个城市的订单金额", "员工请假记录"])
+
+    assert query @ similar > query @ unrelated
+
+
+def test_get_embedding_provider_shares_hashing_instance():
+    """测试get_embedding_provider按提供者和模型名返回共享实例"""
+    provider = get_embedding_provider(HASHING)
+
+    assert isinstance(provider, HashingEmbeddingProvider)
+    assert get_embedding_provider(HASHING) is provider
+
+
+def test_vector_service_with_hashing_runs_offline(monkeypatch):
+    """测试VectorService使用hashing提供者无需任何模型服务即可完成单条和批量向量化"""
+    # 不读写持久化二级缓存（Redis/SQLite）
+    monkeypatch.setattr(hybrid_retrieval_service, "get_embedding_cache", lambda: None)
+
+    async def run():
+        service = VectorService(service_type=HASHING)
+        single = await service.embed_question("统计每个城市的订单数")
+        batch = await service.batch_embed(["统计每个城市的订单数", "员工请假记录"])
+        return service, single, batch
+
+    service, single, batch = asyncio.run(run())
+
+    assert isinstance(service.model, HashingEmbeddingProvider)
+    assert service.dimension == service.model.dimension == len(single)
+    assert batch.shape == (2, service.dimension)
+    assert np.allclose(batch[0], single)
+    assert np.isclose(np.linalg.norm(single), 1.0, atol=1e-6)
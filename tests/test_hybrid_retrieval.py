@@ -0,0 +1,178 @@
+"""
+混合检索引擎单元测试
+
+分支失败时的部分结果处理与结果缓存，多路结果融合排序
+"""
+
+import sys
+import asyncio
+import pytest
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql.hybrid_retrieval_service import (
+    HybridRetrievalEngine, FusionRanker, QAPairWithContext, RetrievalBranchMetrics, RetrievalResult
+)
+from app.services.test_to_sql.retrieval_cache import RetrievalResultCache
+
+
+def make_result(qa_id: str, semantic: float = 0.0, structural: float = 0.0, pattern: float = 0.0,
+                success_rate: float = 0.9, verified: bool = True) -> RetrievalResult:
+    qa_pair = QAPairWithContext(
+        id=qa_id, question=f"问题{qa_id}", sql=f"SELECT {qa_id}", connection_id=1, difficulty_level=1,
+        query_type="SELECT", success_rate=success_rate, verified=verified, created_at=datetime.now(),
+        used_tables=[], used_columns=[], query_pattern="SELECT", mentioned_entities=[]
+    )
+    return RetrievalResult(qa_pair=qa_pair, semantic_score=semantic, structural_score=structural,
+                           pattern_score=pattern)
+
+
+def make_engine() -> HybridRetrievalEngine:
+    """不连接Milvus/Neo4j的引擎，各分支由测试替换"""
+    engine = HybridRetrievalEngine.__new__(HybridRetrievalEngine)
+    engine.fusion_ranker = FusionRanker(mode="weighted")
+    engine.branch_metrics = RetrievalBranchMetrics()
+    engine.result_cache = RetrievalResultCache(max_size=16, ttl=3600)
+    engine._initialized = True
+
+    async def diversify(results, top_k):
+        return results[:top_k]
+    engine._diversify = diversify
+    return engine
+
+
+def test_failed_branch_is_partial_and_not_cached():
+    """测试Milvus检索抛异常时语义分支计入错误、结果标记为部分结果且不写入缓存"""
+    engine = make_engine()
+
+    class DownMilvus:
+        async def search_similar(self, query_vector, top_k=5, connection_id=None):
+            raise ConnectionError("milvus down")
+
+    class Vectors:
+        async def embed_question(self, question):
+            return [0.1, 0.2]
+
+    async def milvus_for_connection(connection_id):
+        return DownMilvus()
+
+    engine.monitor = None
+    engine.vector_service = Vectors()
+    engine.get_milvus_service_for_connection = milvus_for_connection
+
+    async def structural(schema_context, connection_id, timeout=None):
+        return [make_result("a", structural=0.8)]
+
+    async def pattern(query, connection_id, timeout=None):
+        return [make_result("b", pattern=0.5)]
+
+    engine._structural_search = structural
+    engine._pattern_search = pattern
+
+    results = asyncio.run(engine.hybrid_retrieve("统计订单数", {"tables": []}, connection_id=1, top_k=5))
+
+    assert {r.qa_pair.id for r in results} == {"a", "b"}
+    metrics = engine.branch_metrics.get_metrics()
+    assert metrics["branches"]["semantic"]["errors"] == 1
+    assert metrics["partial_requests"] == 1
+    assert engine.result_cache.get("统计订单数", 1, {"tables": []}, 5)[1] is None
+
+
+def test_complete_result_is_cached():
+    """测试所有分支成功时结果写入缓存"""
+    engine = make_engine()
+
+    async def branch(*args, **kwargs):
+        return [make_result("a", semantic=0.9)]
+
+    engine._semantic_search = engine._structural_search = engine._pattern_search = branch
+
+    asyncio.run(engine.hybrid_retrieve("统计订单数", {"tables": []}, connection_id=1, top_k=5))
+
+    assert engine.branch_metrics.get_metrics()["partial_requests"] == 0
+    _, cached = engine.result_cache.get("统计订单数", 1, {"tables": []}, 5)
+    assert [r.qa_pair.id for r in cached] == ["a"]
+
+
+def test_invalidation_during_retrieval_is_not_masked():
+    """测试检索期间问答对发生增删时，旧结果不会写入新版本的缓存键，下一次检索重新执行"""
+    engine = make_engine()
+    calls = []
+
+    async def branch(*args, **kwargs):
+        return [make_result("a", semantic=0.9)]
+
+    async def semantic(query, connection_id):
+        calls.append(query)
+        # 模拟检索进行中另一个请求保存了问答对
+        engine.result_cache.invalidate_connection(connection_id)
+        return [make_result("a", semantic=0.9)]
+
+    engine._semantic_search = semantic
+    engine._structural_search = engine._pattern_search = branch
+
+    asyncio.run(engine.hybrid_retrieve("统计订单数", {"tables": []}, connection_id=1, top_k=5))
+    assert engine.result_cache.get("统计订单数", 1, {"tables": []}, 5)[1] is None
+
+    asyncio.run(engine.hybrid_retrieve("统计订单数", {"tables": []}, connection_id=1, top_k=5))
+    assert len(calls) == 2
+
+
+def test_fusion_dedups_by_id_with_max_scores():
+    """测试同一问答对出现在多路结果中时只保留一条，各路分数取最大值"""
+    ranker = FusionRanker(mode="weighted")
+    ranked = ranker.fuse_and_rank(
+        [make_result("a", semantic=0.8), make_result("b", semantic=0.6)],
+        [make_result("a", structural=0.6), make_result("a", structural=0.4)],
+        [make_result("a", pattern=0.5)]
+    )
+
+    assert [r.qa_pair.id for r in ranked] == ["a", "b"]
+    assert (ranked[0].semantic_score, ranked[0].structural_score, ranked[0].pattern_score) == (0.8, 0.6, 0.5)
+    assert ranked[0].final_score > ranked[1].final_score
+
+
+def test_fusion_weighted_uses_semantic_band_weights():
+    """测试weighted模式按语义分区间选择权重，并按top_k截断"""
+    ranker = FusionRanker(mode="weighted")
+    ranked = ranker.fuse_and_rank(
+        [make_result("low", semantic=0.3), make_result("high", semantic=0.95), make_result("mid", semantic=0.6)],
+        [], [], top_k=2
+    )
+
+    assert [r.qa_pair.id for r in ranked] == ["high", "mid"]
+    # 已验证+0.3，成功率0.9*0.5，难度1不加分
+    quality = 0.3 + 0.5 * 0.9
+    assert ranked[0].quality_score == pytest.approx(quality)
+    assert ranked[0].final_score == pytest.approx(0.80 * 0.95 + 0.05 * quality)
+    assert ranked[1].final_score == pytest.approx(
+        ranker.weights["semantic"] * 0.6 + ranker.weights["quality"] * quality
+    )
+
+
+def test_fusion_rrf_rewards_multi_branch_candidates():
+    """测试rrf模式按各路排名融合，出现在多路结果中的候选排在前面"""
+    ranker = FusionRanker(mode="rrf", rrf_k=60)
+    ranked = ranker.fuse_and_rank(
+        [make_result("only_semantic", semantic=0.99), make_result("both", semantic=0.5)],
+        [make_result("both", structural=0.2)],
+        []
+    )
+
+    assert [r.qa_pair.id for r in ranked] == ["both", "only_semantic"]
+    weights = ranker._base_weights
+    # 两者质量分相同，质量路按原顺序排名：only_semantic第1，both第2
+    assert ranked[0].final_score == pytest.approx(weights[0] / 62 + weights[1] / 61 + weights[3] / 62)
+    assert ranked[1].final_score == pytest.approx(weights[0] / 61 + weights[3] / 61)
+
+
+def test_fusion_empty_and_invalid_mode():
+    """测试无候选时返回空列表，不支持的融合模式抛出ValueError"""
+    assert FusionRanker(mode="weighted").fuse_and_rank([], [], []) == []
+    assert FusionRanker(mode="rrf").fuse_and_rank([make_result("a", semantic=0.9)], [], [], top_k=0) == []
+    with pytest.raises(ValueError):
+        FusionRanker(mode="linear")
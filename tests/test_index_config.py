@@ -0,0 +1,52 @@
+"""
+向量索引配置：精确得分与量化候选精确重排单元测试
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.milvus_processor.index_config import exact_scores, rerank_exact
+
+
+def make_hits():
+    return [
+        {"id": "a", "distance": 0.99, "entity": {"id": "a", "vector": [0.0, 1.0]}},
+        {"id": "b", "distance": 0.50, "entity": {"id": "b", "vector": [1.0, 0.0]}},
+        {"id": "c", "distance": 0.70, "entity": {"id": "c", "vector": [2.0, 0.2]}},
+    ]
+
+
+def test_exact_scores_by_metric():
+    """测试COSINE/IP/L2三种度量的精确得分"""
+    candidates = np.array([[3.0, 4.0], [0.0, 0.0]], dtype=np.float32)
+    query = np.array([3.0, 4.0], dtype=np.float32)
+    np.testing.assert_allclose(exact_scores(query, candidates, "COSINE"), [1.0, 0.0], atol=1e-6)
+    np.testing.assert_allclose(exact_scores(query, candidates, "IP"), [25.0, 0.0])
+    np.testing.assert_allclose(exact_scores(query, candidates, "L2"), [0.0, 5.0])
+
+
+def test_rerank_exact_orders_by_exact_score_and_drops_vectors():
+    """测试按原始向量精确重排、distance替换为精确得分、移除向量字段"""
+    reranked = rerank_exact(np.array([1.0, 0.0]), make_hits(), "vector", top_k=2, metric_type="COSINE")
+    assert [hit["id"] for hit in reranked] == ["b", "c"]
+    assert reranked[0]["distance"] == 1.0
+    assert all("vector" not in hit["entity"] for hit in reranked)
+
+
+def test_rerank_exact_l2_ascending():
+    """测试L2按距离升序"""
+    reranked = rerank_exact(np.array([2.0, 0.0]), make_hits(), "vector", top_k=3, metric_type="L2")
+    assert [hit["id"] for hit in reranked] == ["c", "b", "a"]
+
+
+def test_rerank_exact_without_vectors_keeps_ann_order():
+    """测试候选中没有向量字段时保持ANN顺序截断"""
+    hits = [{"id": "x", "distance": 0.9, "entity": {"id": "x"}},
+            {"id": "y", "distance": 0.8, "entity": {"id": "y"}}]
+    assert rerank_exact(np.array([1.0, 0.0]), hits, "vector", top_k=1) == hits[:1]
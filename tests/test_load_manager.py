@@ -0,0 +1,177 @@
+"""
+Milvus集合加载管理器单元测试
+
+按集合数/内存预算的LRU释放、使用中集合不释放、空闲释放、"未加载"重试与预热（call_milvus由测试替换）
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.milvus_processor import load_manager
+from app.core.milvus_processor.load_manager import CollectionLoadManager
+
+URI = "http://milvus:19530"
+
+
+class FakeMilvus:
+    """记录调用并模拟服务端加载状态；每个集合1000行、FLOAT_VECTOR dim=4"""
+
+    def __init__(self, existing=("a", "b", "c")):
+        self.existing = set(existing)
+        self.loaded = set()
+        self.calls = []
+        self.fail_not_loaded = 0
+
+    async def __call__(self, method, **kwargs):
+        name = kwargs.get("collection_name")
+        self.calls.append((method, kwargs.get("db_name"), name))
+        if method == "get_load_state":
+            return {"state": "Loaded" if name in self.loaded else "NotLoad"}
+        if method == "load_collection":
+            self.loaded.add(name)
+        elif method == "release_collection":
+            self.loaded.discard(name)
+        elif method == "describe_collection":
+            return {"fields": [{"type": "FLOAT_VECTOR", "params": {"dim": 4}}]}
+        elif method == "get_collection_stats":
+            return {"row_count": 1000}
+        elif method == "has_collection":
+            return name in self.existing
+        elif method == "search":
+            if self.fail_not_loaded:
+                self.fail_not_loaded -= 1
+                raise RuntimeError("collection not loaded")
+            return [["hit"]]
+        return None
+
+    def count(self, method):
+        return sum(1 for call in self.calls if call[0] == method)
+
+
+# 每个集合估算 (64 + 4*4) * 1000 字节
+COLLECTION_BYTES = 80 * 1000
+
+
+@pytest.fixture
+def milvus(monkeypatch):
+    fake = FakeMilvus()
+    monkeypatch.setattr(load_manager, "call_milvus", fake)
+    return fake
+
+
+def test_lru_releases_least_recently_used(milvus):
+    """测试超过max_loaded时释放最久未访问的集合"""
+    manager = CollectionLoadManager(max_loaded=2, memory_budget_bytes=1 << 30)
+
+    async def run():
+        await manager.ensure_loaded("a", URI)
+        await manager.ensure_loaded("b", URI)
+        await manager.ensure_loaded("a", URI)
+        await manager.ensure_loaded("c", URI)
+
+    asyncio.run(run())
+    assert milvus.loaded == {"a", "c"}
+    assert manager.releases == 1
+    assert manager.loaded_bytes == 2 * COLLECTION_BYTES
+
+
+def test_memory_budget_releases_and_keeps_pinned(milvus):
+    """测试超过内存预算时释放未固定的集合，固定集合常驻"""
+    manager = CollectionLoadManager(max_loaded=10, memory_budget_bytes=2 * COLLECTION_BYTES)
+
+    async def run():
+        await manager.ensure_loaded("a", URI, pinned=True)
+        await manager.ensure_loaded("b", URI)
+        await manager.ensure_loaded("c", URI)
+
+    asyncio.run(run())
+    assert milvus.loaded == {"a", "c"}
+    assert [item["collection"] for item in manager.stats()["loaded"]] == ["a", "c"]
+
+
+def test_in_use_collection_is_not_released(milvus):
+    """测试使用中的集合不会被预算释放或手动释放，使用结束后可以释放"""
+    manager = CollectionLoadManager(max_loaded=1, memory_budget_bytes=1 << 30)
+
+    async def run():
+        async with manager.using("a", URI):
+            await manager.ensure_loaded("b", URI)
+            await manager.release("a", uri=URI)
+            assert manager.stats()["loaded"][0]["in_use"] == 1
+            in_use_loaded = set(milvus.loaded)
+        await manager.release("a", uri=URI)
+        return in_use_loaded
+
+    assert asyncio.run(run()) == {"a", "b"}
+    assert milvus.loaded == {"b"}
+
+
+def test_release_idle(milvus, monkeypatch):
+    """测试只释放空闲超过idle_ttl且未固定的集合"""
+    clock = [1000.0]
+    monkeypatch.setattr(load_manager.time, "monotonic", lambda: clock[0])
+    manager = CollectionLoadManager(max_loaded=10, memory_budget_bytes=1 << 30, idle_ttl=60)
+
+    async def run():
+        await manager.ensure_loaded("a", URI)
+        await manager.ensure_loaded("b", URI, pinned=True)
+        clock[0] += 30
+        await manager.ensure_loaded("c", URI)
+        clock[0] += 40
+        return await manager.release_idle()
+
+    assert asyncio.run(run()) == 1
+    assert milvus.loaded == {"b", "c"}
+
+
+def test_call_loaded_reloads_after_external_release(milvus):
+    """测试集合被其他进程释放导致"未加载"错误时重新加载并重试一次"""
+    manager = CollectionLoadManager()
+
+    async def run():
+        await manager.ensure_loaded("a", URI)
+        # 其他进程释放了集合
+        milvus.loaded.discard("a")
+        milvus.fail_not_loaded = 1
+        return await manager.call_loaded("search", "a", uri=URI, data=[[0.1]])
+
+    assert asyncio.run(run()) == [["hit"]]
+    assert milvus.count("search") == 2
+    assert milvus.count("load_collection") == 2
+    assert "a" in milvus.loaded
+
+
+def test_call_loaded_does_not_retry_other_errors(milvus, monkeypatch):
+    """测试其他错误直接抛出，不重试"""
+    manager = CollectionLoadManager()
+
+    async def failing(method, **kwargs):
+        if method == "search":
+            raise ConnectionError("milvus down")
+        return await milvus(method, **kwargs)
+
+    monkeypatch.setattr(load_manager, "call_milvus", failing)
+    with pytest.raises(ConnectionError):
+        asyncio.run(manager.call_loaded("search", "a", uri=URI))
+
+
+def test_warmup_unprefixed_names_use_default_database(milvus):
+    """测试预热时不带前缀的集合名在default库中查找，不存在的集合跳过并仍置为就绪"""
+    manager = CollectionLoadManager()
+
+    asyncio.run(manager.warmup(["a", "docs_db/b", "missing"]))
+
+    assert ("has_collection", "default", "a") in milvus.calls
+    assert ("has_collection", "docs_db", "b") in milvus.calls
+    assert ("has_collection", "default", "missing") in milvus.calls
+    assert manager.ready
+    assert {(item["db_name"], item["collection"], item["pinned"]) for item in manager.stats()["loaded"]} == {
+        ("default", "a", True), ("docs_db", "b", True)
+    }
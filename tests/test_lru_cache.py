@@ -0,0 +1,75 @@
+"""
+LRUTTLCache 与查询分析缓存单元测试
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils import lru_cache
+from app.utils.lru_cache import LRUTTLCache
+from app.services.test_to_sql.query_analysis_cache import QueryAnalysisCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def test_lru_eviction_order():
+    """测试超过容量时淘汰最久未使用的条目，get会刷新LRU位置"""
+    cache = LRUTTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(monkeypatch):
+    """测试条目超过ttl后过期并计入未命中"""
+    clock = FakeClock()
+    monkeypatch.setattr(lru_cache, "time", clock)
+    cache = LRUTTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    clock.now += 30
+    assert cache.get("a") == 1
+    clock.now += 31
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_max_bytes_eviction():
+    """测试按占用内存淘汰，且至少保留最新写入的条目"""
+    cache = LRUTTLCache(max_size=10, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+    assert "a" not in cache and len(cache) == 2
+    cache.set("big", "x" * 20)
+    assert len(cache) == 1 and cache.get("big") == "x" * 20
+
+
+def test_query_analysis_cache_normalized_and_semantic_hit():
+    """测试规范化后的精确命中与同连接内的相似问题命中"""
+    cache = QueryAnalysisCache(max_size=10, ttl=60, semantic_enabled=True, similarity_threshold=0.95)
+    vector = np.array([1.0, 0.0], dtype=np.float32)
+    cache.set("统计订单数量？", {"intent": "count"}, connection_id=1, query_vector=vector)
+
+    assert cache.get("  统计订单数量  ", connection_id=1) == {"intent": "count"}
+    similar = np.array([0.99, 0.141], dtype=np.float32)
+    similar /= np.linalg.norm(similar)
+    assert cache.get("订单一共有多少", connection_id=1, query_vector=similar) == {"intent": "count"}
+    assert cache.get("订单一共有多少", connection_id=2, query_vector=similar) is None
+    assert cache.stats()["semantic_hits"] == 1
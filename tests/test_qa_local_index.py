@@ -0,0 +1,152 @@
+"""
+问答对本地向量索引单元测试
+
+索引的写入/覆盖/删除/压缩/检索/快照，注册表的核对新鲜度、小租户判断与内存上限淘汰
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql import qa_local_index
+from app.services.test_to_sql.qa_local_index import LocalQAIndex, LocalQAIndexRegistry
+
+DIM = 4
+
+
+def make_row(qa_id: str, connection_id: int = 1) -> dict:
+    return {"id": qa_id, "question": f"问题{qa_id}", "sql": f"SELECT {qa_id}", "connection_id": connection_id,
+            "difficulty_level": 1, "query_type": "SELECT", "success_rate": 0.9, "verified": True}
+
+
+def basis(i: int) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[i % DIM] = 1.0
+    return vector
+
+
+def make_index(count: int) -> LocalQAIndex:
+    index = LocalQAIndex(DIM, hnsw_threshold=10 ** 9)
+    index.add([make_row(f"q{i}") for i in range(count)], np.stack([basis(i) for i in range(count)]))
+    return index
+
+
+def test_add_and_search_returns_nearest_rows():
+    """测试写入后按余弦相似度检索，结果格式与Milvus检索一致"""
+    index = make_index(3)
+
+    results = index.search(np.array([0.0, 2.0, 0.0, 0.0]), top_k=2)
+
+    assert len(index) == 3
+    assert results[0]["id"] == "q1"
+    assert results[0]["similarity_score"] == 1.0
+    assert results[0]["sql"] == "SELECT q1"
+    assert results[1]["similarity_score"] == 0.0
+    assert index.search(basis(0), top_k=10)[0]["id"] == "q0"
+    assert len(index.search(basis(0), top_k=10)) == 3
+
+
+def test_add_existing_id_overwrites():
+    """测试写入已存在的id时覆盖旧向量和字段，不产生重复结果"""
+    index = make_index(2)
+
+    index.add([dict(make_row("q0"), sql="SELECT new")], basis(3))
+
+    assert len(index) == 2
+    results = index.search(basis(3), top_k=2)
+    assert results[0]["id"] == "q0"
+    assert results[0]["sql"] == "SELECT new"
+    assert [r["id"] for r in results].count("q0") == 1
+
+
+def test_remove_and_compaction():
+    """测试删除后不再返回，删除过半时压缩存储且剩余行仍可检索"""
+    index = make_index(100)
+
+    assert index.remove("q1") is True
+    assert index.remove("q1") is False
+    assert "q1" not in {r["id"] for r in index.search(basis(1), top_k=100)}
+
+    for i in range(2, 52):
+        index.remove(f"q{i}")
+
+    # 剩余49行，不足100个存储位置的一半，触发压缩
+    assert len(index) == 49
+    assert len(index._rows) == 49
+    assert index.ids() == {"q0"} | {f"q{i}" for i in range(52, 100)}
+    assert index.search(basis(0), top_k=1)[0]["id"] in index.ids()
+
+
+def test_save_and_load_snapshot(tmp_path):
+    """测试快照只保存未删除的行，加载后检索结果一致"""
+    index = make_index(3)
+    index.remove("q2")
+    path = tmp_path / "qa_pairs_1"
+
+    index.save(path)
+    loaded = LocalQAIndex.load(path, hnsw_threshold=10 ** 9)
+
+    assert loaded.ids() == {"q0", "q1"}
+    assert loaded.search(basis(1), top_k=1)[0]["id"] == "q1"
+    assert LocalQAIndex.load(tmp_path / "missing") is None
+
+
+def make_registry(monkeypatch, clock, **kwargs) -> LocalQAIndexRegistry:
+    """核对时直接按请求的行数生成索引，不访问Milvus"""
+    monkeypatch.setattr(qa_local_index.time, "monotonic", lambda: clock[0])
+    registry = LocalQAIndexRegistry(None, small_tenant_threshold=2, refresh_interval=30, **kwargs)
+    sizes = {}
+
+    def sync(uri, collection_name, connection_id, dimension, index):
+        return make_index(sizes[connection_id])
+
+    registry._sync_with_milvus = sync
+    registry.sizes = sizes
+    return registry
+
+
+def test_registry_fresh_and_small_gating(monkeypatch):
+    """测试核对后的索引在refresh_interval内视为新鲜，超过间隔后不再用于本地检索；只有小租户可本地检索"""
+    clock = [100.0]
+    registry = make_registry(monkeypatch, clock)
+    registry.sizes.update({1: 2, 2: 3})
+
+    assert registry.is_small(None) is False
+    assert registry.is_fresh("qa_pairs", 1) is False
+
+    small = asyncio.run(registry.ensure_loaded("qa_pairs", 1, "uri", DIM))
+    large = asyncio.run(registry.ensure_loaded("qa_pairs", 2, "uri", DIM))
+
+    assert registry.is_small(small) and not registry.is_small(large)
+    assert registry.is_fresh("qa_pairs", 1)
+    assert registry.get("qa_pairs", 1) is small
+
+    clock[0] += 31
+    assert registry.is_fresh("qa_pairs", 1) is False
+    assert registry.stats()["stale_indexes"] == 2
+    # 过期后仍保留索引用于降级
+    assert registry.get("qa_pairs", 1) is small
+
+
+def test_registry_evicts_least_recently_used_over_budget(monkeypatch):
+    """测试超过内存上限时淘汰最久未使用的索引，被淘汰的索引不再视为新鲜"""
+    clock = [100.0]
+    budget = make_index(3).nbytes * 2
+    registry = make_registry(monkeypatch, clock, max_bytes=budget)
+    registry.sizes.update({1: 3, 2: 3, 3: 3})
+
+    asyncio.run(registry.ensure_loaded("qa_pairs", 1, "uri", DIM))
+    asyncio.run(registry.ensure_loaded("qa_pairs", 2, "uri", DIM))
+    registry.get("qa_pairs", 1)
+    asyncio.run(registry.ensure_loaded("qa_pairs", 3, "uri", DIM))
+
+    assert registry.get("qa_pairs", 2) is None
+    assert registry.is_fresh("qa_pairs", 2) is False
+    assert registry.get("qa_pairs", 1) is not None and registry.get("qa_pairs", 3) is not None
+    assert registry.stats()["memory"]["evictions"] == 1
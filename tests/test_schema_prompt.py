@@ -0,0 +1,76 @@
+"""
+表结构提示预算渲染单元测试
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql.schema_prompt import estimate_tokens, render_schema_prompt
+
+
+def make_context(order=("orders", "users", "logs")):
+    """orders(3列含外键) / users(2列) / logs(20列无键)，tables顺序即相关性顺序"""
+    tables = {
+        "orders": {"id": 1, "name": "orders", "description": "订单"},
+        "users": {"id": 2, "name": "users", "description": "用户"},
+        "logs": {"id": 3, "name": "logs", "description": ""},
+    }
+    columns = [
+        {"table_id": 1, "table_name": "orders", "name": "id", "type": "INT", "is_primary_key": True},
+        {"table_id": 1, "table_name": "orders", "name": "user_id", "type": "INT", "is_foreign_key": True},
+        {"table_id": 1, "table_name": "orders", "name": "status", "type": "VARCHAR", "description": "订单状态"},
+        {"table_id": 2, "table_name": "users", "name": "id", "type": "INT", "is_primary_key": True},
+        {"table_id": 2, "table_name": "users", "name": "name", "type": "VARCHAR"},
+    ] + [
+        {"table_id": 3, "table_name": "logs", "name": f"field_{i}", "type": "TEXT"} for i in range(20)
+    ]
+    relationships = [{"source_table": "orders", "source_column": "user_id",
+                      "target_table": "users", "target_column": "id"}]
+    return {"tables": [tables[name] for name in order], "columns": columns, "relationships": relationships}
+
+
+def test_estimate_tokens():
+    """测试中日韩字符按1个token、其他字符约4个字符1个token估算"""
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("订单") == 2
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("订单abcde") == 4
+
+
+def test_large_budget_renders_everything_sorted():
+    """测试预算充足时全部完整渲染，并按表名排序输出"""
+    rendered = render_schema_prompt(make_context(), token_budget=10000)
+    assert rendered.table_names == ["logs", "orders", "users"]
+    assert not rendered.compacted_tables and not rendered.omitted_tables
+    assert "orders.user_id -> users.id" in rendered.text
+    assert rendered.token_count <= rendered.token_budget
+
+
+def test_tight_budget_compacts_then_omits_least_relevant():
+    """测试预算不足时先精简、再省略相关性最低的表，且至少保留一张表"""
+    full = render_schema_prompt(make_context(("orders", "users")), token_budget=10000)
+    omitted = render_schema_prompt(make_context(), token_budget=full.token_count + 5)
+    assert omitted.table_names == ["orders", "users"]
+    assert omitted.omitted_tables == ["logs"] and not omitted.compacted_tables
+
+    compacted = render_schema_prompt(make_context(), token_budget=full.token_count + 30)
+    assert compacted.table_names == ["logs", "orders", "users"]
+    assert compacted.compacted_tables == ["logs"] and "省略20列" in compacted.text
+    assert compacted.token_count <= compacted.token_budget
+
+    tiny = render_schema_prompt(make_context(), token_budget=1)
+    assert tiny.table_names == ["orders"]
+    assert tiny.compacted_tables == ["orders"]
+    assert tiny.omitted_tables == ["users", "logs"]
+    assert "status" not in tiny.text and "省略1列" in tiny.text
+
+
+def test_same_tables_render_identically_regardless_of_order():
+    """测试相同表集合的输出与相关性顺序无关（提示前缀稳定）"""
+    a = render_schema_prompt(make_context(("orders", "users", "logs")), token_budget=10000)
+    b = render_schema_prompt(make_context(("logs", "users", "orders")), token_budget=10000)
+    assert a.text == b.text
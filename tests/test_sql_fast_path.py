@@ -0,0 +1,44 @@
+"""
+SQL快速路径字面量重绑定单元测试
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql.sql_fast_path import split_literals, rebind_literals
+
+
+def test_split_literals_keeps_raw_values():
+    """测试字面量保留原始大小写，模板按规范化形式比较"""
+    template, literals = split_literals("  状态为'Shipped'且金额大于１００的订单？")
+    assert literals == ["Shipped", "100"]
+    assert template == split_literals("状态为'PENDING'且金额大于200的订单")[0]
+
+
+def test_rebind_mixed_case_literal():
+    """测试大小写混合的存储值能被找到，新值按原样写入"""
+    sql = "SELECT * FROM orders WHERE status = 'Shipped'"
+    rebound = rebind_literals("状态为'Shipped'的订单", "状态为'PENDING'的订单", sql)
+    assert rebound == ("SELECT * FROM orders WHERE status = 'PENDING'", {"Shipped": "PENDING"})
+
+
+def test_rebind_cjk_literal():
+    """测试中文引号内的中文字面量"""
+    sql = "SELECT SUM(amount) FROM sales WHERE city LIKE '%北京%' AND year = 2024"
+    rebound = rebind_literals("“北京”2024年的销售额", "“上海”2025年的销售额", sql)
+    assert rebound == (
+        "SELECT SUM(amount) FROM sales WHERE city LIKE '%上海%' AND year = 2025",
+        {"北京": "上海", "2024": "2025"}
+    )
+
+
+def test_rebind_rejects_different_template():
+    """测试模板不同或旧值在SQL中不唯一时放弃"""
+    sql = "SELECT * FROM orders WHERE status = 'Shipped' OR note = 'Shipped'"
+    assert rebind_literals("状态为'Shipped'的订单", "状态为'PENDING'的订单", sql) is None
+    assert rebind_literals("状态为'Shipped'的订单", "备注为'PENDING'的订单",
+                           "SELECT * FROM orders WHERE status = 'Shipped'") is None
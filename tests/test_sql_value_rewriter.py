@@ -0,0 +1,59 @@
+"""
+SQL值映射改写单元测试
+
+覆盖等值/LIKE/IN谓词、双引号字面量与字面量在左侧的比较
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql.sql_value_rewriter import compile_value_mappings, rewrite_sql_values
+
+COMPILED = compile_value_mappings({
+    "orders.status": {"待处理": "pending", "已发货": "Shipped"},
+    "customers.city": {"北京": "Beijing"}
+})
+
+
+def test_equality_single_quoted():
+    """测试列 = '术语'"""
+    sql = "SELECT * FROM orders WHERE status = '待处理'"
+    assert rewrite_sql_values(sql, COMPILED) == "SELECT * FROM orders WHERE status = 'pending'"
+
+
+def test_equality_double_quoted():
+    """测试列 = "术语"（MySQL风格双引号字符串），保留原引号"""
+    sql = 'SELECT * FROM orders o WHERE o.status = "已发货"'
+    assert rewrite_sql_values(sql, COMPILED) == 'SELECT * FROM orders o WHERE o.status = "Shipped"'
+
+
+def test_reversed_comparison():
+    """测试'术语' = 列 与 '术语' <> 表.列"""
+    sql = "SELECT * FROM orders o WHERE '待处理' = status OR '已发货' <> o.status"
+    assert rewrite_sql_values(sql, COMPILED) == \
+        "SELECT * FROM orders o WHERE 'pending' = status OR 'Shipped' <> o.status"
+
+
+def test_like_and_in():
+    """测试LIKE保留通配符、IN列表逐项替换"""
+    sql = ("SELECT * FROM orders o JOIN customers c ON o.cid = c.id "
+           "WHERE c.city LIKE '%北京%' AND o.status IN ('待处理', \"已发货\")")
+    assert rewrite_sql_values(sql, COMPILED) == (
+        "SELECT * FROM orders o JOIN customers c ON o.cid = c.id "
+        "WHERE c.city LIKE '%Beijing%' AND o.status IN ('pending', \"Shipped\")"
+    )
+
+
+def test_unmapped_and_identifier_untouched():
+    """测试未映射列、双引号标识符比较与未知术语保持不变"""
+    sqls = [
+        "SELECT * FROM orders WHERE note = '待处理'",
+        'SELECT * FROM orders WHERE "status" = "other_col"',
+        "SELECT * FROM orders WHERE status = '未知'",
+    ]
+    for sql in sqls:
+        assert rewrite_sql_values(sql, COMPILED) == sql
@@ -0,0 +1,87 @@
+"""
+表结构检索单元测试
+
+候选表很少时仍执行LLM排序，外键扩展表很少时才跳过LLM过滤（目录与LLM调用由测试替换）
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.test_to_sql import text2sql_utils
+
+
+class FakeCatalog:
+    """orders(1) 外键关联 users(2)，另有无关的 logs(3)；extra指定额外被orders关联的表"""
+
+    def __init__(self, extra: int = 0):
+        names = ["orders", "users", "logs"] + [f"dim_{i}" for i in range(extra)]
+        self.tables = {i + 1: {"id": i + 1, "name": name, "description": ""} for i, name in enumerate(names)}
+        self.foreign_keys = [(2, 1)] + [(4 + i, 1) for i in range(extra)]
+
+    def get_table(self, table_id):
+        return self.tables.get(table_id)
+
+    def search_columns(self, text):
+        return []
+
+    def expand_foreign_keys(self, table_ids):
+        return [(target, source) for target, source in self.foreign_keys
+                if source in table_ids and target not in table_ids]
+
+
+def run_retrieval(monkeypatch, catalog):
+    calls = {"ranking": [], "filter": []}
+
+    async def analyze(query, connection_id=None):
+        return {"entities": []}
+
+    async def rank(query, query_analysis, tables):
+        calls["ranking"].append([t["name"] for t in tables])
+        # LLM只认为orders相关
+        return [(1, 9.0)]
+
+    async def filter_tables(query, query_analysis, expanded_tables, relevance_scores):
+        calls["filter"].append([t[1] for t in expanded_tables])
+        return set(expanded_tables[:1])
+
+    def assemble(catalog, connection_id, relevant_table_ids, table_relevance_scores):
+        return {"tables": [catalog.tables[tid]["name"] for tid in relevant_table_ids]}
+
+    monkeypatch.setattr(text2sql_utils, "get_schema_catalog", lambda db, connection_id: catalog)
+    monkeypatch.setattr(text2sql_utils, "get_candidate_tables",
+                        lambda catalog, query: [catalog.tables[tid] for tid in (1, 2, 3)])
+    monkeypatch.setattr(text2sql_utils, "aanalyze_query_with_llm", analyze)
+    monkeypatch.setattr(text2sql_utils, "afind_relevant_tables_semantic", rank)
+    monkeypatch.setattr(text2sql_utils, "afilter_expanded_tables_with_llm", filter_tables)
+    monkeypatch.setattr(text2sql_utils, "_assemble_schema_context", assemble)
+
+    context = asyncio.run(text2sql_utils.aretrieve_relevant_schema(None, 1, "统计订单数"))
+    return context, calls
+
+
+def test_small_candidate_set_is_still_ranked(monkeypatch):
+    """测试候选表不超过阈值时仍由LLM排序，不相关的表不进入上下文；扩展表很少时跳过LLM过滤"""
+    monkeypatch.setattr(type(text2sql_utils.settings), "SCHEMA_LLM_SKIP_THRESHOLD", property(lambda self: 3))
+
+    context, calls = run_retrieval(monkeypatch, FakeCatalog())
+
+    assert calls["ranking"] == [["orders", "users", "logs"]]
+    assert calls["filter"] == []
+    assert context["tables"] == ["orders", "users"]
+    assert "ranking" in context["timings"] and "filter" not in context["timings"]
+
+
+def test_many_expanded_tables_use_llm_filter(monkeypatch):
+    """测试外键扩展表超过阈值时调用LLM过滤，只保留过滤后的扩展表"""
+    monkeypatch.setattr(type(text2sql_utils.settings), "SCHEMA_LLM_SKIP_THRESHOLD", property(lambda self: 3))
+
+    context, calls = run_retrieval(monkeypatch, FakeCatalog(extra=3))
+
+    assert calls["filter"] == [["users", "dim_0", "dim_1", "dim_2"]]
+    assert context["tables"] == ["orders", "users"]
+    assert "filter" in context["timings"]
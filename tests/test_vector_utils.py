@@ -0,0 +1,58 @@
+"""
+向量工具函数单元测试
+
+最大边际相关性(MMR)选择
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.vector_utils import mmr_select
+
+# a与a_dup几乎相同，b与a正交，c介于两者之间
+EMBEDDINGS = np.array([
+    [1.0, 0.0, 0.0],
+    [0.99, 0.01, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.7, 0.7, 0.0],
+], dtype=np.float32)
+RELEVANCE = np.array([0.9, 0.85, 0.5, 0.6], dtype=np.float32)
+
+
+def test_mmr_lambda_one_is_relevance_order():
+    """测试lambda=1时只看相关性，按相关性从高到低选择"""
+    selected = mmr_select(EMBEDDINGS, RELEVANCE, k=4, lambda_mult=1.0)
+
+    assert selected.tolist() == [0, 1, 3, 2]
+    assert selected.dtype == np.int64
+
+
+def test_mmr_prefers_diverse_candidates():
+    """测试lambda较小时与已选结果相似的候选被降权，正交的候选优先"""
+    selected = mmr_select(EMBEDDINGS, RELEVANCE, k=2, lambda_mult=0.3)
+
+    assert selected.tolist() == [0, 2]
+
+
+def test_mmr_drops_near_duplicates():
+    """测试与已选结果相似度达到阈值的候选直接丢弃，结果可能少于k个"""
+    selected = mmr_select(EMBEDDINGS, RELEVANCE, k=4, lambda_mult=1.0, duplicate_threshold=0.95)
+
+    assert 1 not in selected.tolist()
+    assert selected.tolist() == [0, 3, 2]
+
+    selected = mmr_select(EMBEDDINGS, RELEVANCE, k=4, lambda_mult=1.0, duplicate_threshold=0.5)
+    assert selected.tolist() == [0, 2]
+
+
+def test_mmr_k_bounds():
+    """测试k超过候选数时最多返回全部候选，k为0或无候选时返回空数组"""
+    assert len(mmr_select(EMBEDDINGS, RELEVANCE, k=10)) == len(EMBEDDINGS)
+    assert mmr_select(EMBEDDINGS, RELEVANCE, k=0).size == 0
+    assert mmr_select(np.empty((0, 3), dtype=np.float32), np.empty(0), k=3).size == 0